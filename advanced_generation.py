@@ -1,13 +1,20 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import requests
 import asyncio
 import os
 import io
 import base64
-from PIL import Image
-import tempfile
+import time
+import json
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from job_queue import BACKEND_HUGGINGFACE, PRIORITY_HIGH, QueueFullError
+from image_cache import ImageCache
+from http_client import PayloadRejected, sniff_image_format
+from model_health import ModelHealthTracker
+from variants import MAX_VARIANTS, send_variants
 
 class AdvancedGenerationCommands(commands.Cog):
     def __init__(self, bot):
@@ -15,8 +22,9 @@ class AdvancedGenerationCommands(commands.Cog):
         self.hf_token = os.getenv('HUGGINGFACE_TOKEN')
         
         # API endpoints
-        self.image_api_url = "https://api-inference.huggingface.co/models/black-forest-labs/FLUX.1-dev"
-        self.video_api_url = "https://api-inference.huggingface.co/models/ali-vilab/text-to-video-ms-1.7b"
+        self.api_base_url = os.getenv('HUGGINGFACE_BASE_URL', "https://api-inference.huggingface.co").rstrip("/")
+        self.image_api_url = f"{self.api_base_url}/models/black-forest-labs/FLUX.1-dev"
+        self.video_api_url = f"{self.api_base_url}/models/ali-vilab/text-to-video-ms-1.7b"
         
         # Headers for API requests
         self.headers = {"Authorization": f"Bearer {self.hf_token}"} if self.hf_token else {}
@@ -32,36 +40,174 @@ class AdvancedGenerationCommands(commands.Cog):
             "damo-vilab/text-to-video-ms-1.7b",
             "modelscope/text-to-video-synthesis"
         ]
+        
+        # Hedging: start the next model if the current one hasn't answered within the delay.
+        # A delay of 0 races the top models at once; a negative delay disables hedging.
+        self.hedge_delay = float(os.getenv('HF_HEDGE_DELAY', '15'))
+        self.hedge_max_parallel = max(1, int(os.getenv('HF_HEDGE_MAX_PARALLEL', '2')))
+        
+        # Retry scheduling for loading (503) and rate limited (429) models
+        self.max_retries = int(os.getenv('HF_MAX_RETRIES', '3'))
+        self.retry_budget = float(os.getenv('HF_RETRY_BUDGET', '120'))
+        self.retry_base_delay = float(os.getenv('HF_RETRY_BASE_DELAY', '2'))
+        self.retry_max_delay = float(os.getenv('HF_RETRY_MAX_DELAY', '30'))
+        
+        # Per-endpoint health used to route around slow or failing models
+        self.model_health = ModelHealthTracker()
+
+    def image_model_urls(self):
+        """Primary image model followed by fallbacks, in configured order"""
+        return [self.image_api_url] + [
+            f"{self.api_base_url}/models/{fallback_model}"
+            for fallback_model in self.fallback_image_models
+        ]
+
+    def video_model_urls(self):
+        """Primary video model followed by fallbacks, in configured order"""
+        return [self.video_api_url] + [
+            f"{self.api_base_url}/models/{fallback_model}"
+            for fallback_model in self.fallback_video_models
+        ]
+
+    @staticmethod
+    def model_name(api_url):
+        """Short model id used as a metrics label"""
+        return api_url.rsplit("/models/", 1)[-1]
+
+    def retry_delay(self, response, attempt):
+        """Seconds to wait before retrying, from the server's hints or exponential backoff"""
+        hint = None
+        
+        # Loading models report how long they expect to take
+        if response.status_code == 503:
+            try:
+                hint = float(json.loads(response.content).get("estimated_time"))
+            except (ValueError, TypeError, AttributeError):
+                hint = None
+        
+        retry_after = response.headers.get("Retry-After")
+        if hint is None and retry_after:
+            try:
+                hint = float(retry_after)
+            except ValueError:
+                try:
+                    hint = (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds()
+                except (TypeError, ValueError):
+                    hint = None
+        
+        if hint is not None and hint >= 0:
+            # Small jitter so parked jobs don't all retry in lockstep
+            return hint + random.uniform(0, self.retry_base_delay)
+        
+        backoff = min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt)
+        return backoff / 2 + random.uniform(0, backoff / 2)
 
     async def query_huggingface_api(self, api_url, payload, timeout=60):
         """Query Hugging Face API with error handling and retries"""
-        try:
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None, 
-                lambda: requests.post(api_url, headers=self.headers, json=payload, timeout=timeout)
+        deadline = time.monotonic() + self.retry_budget
+        attempt = 0
+        
+        while True:
+            started = None
+            try:
+                async with self.bot.generation_queue.attempt():
+                    started = time.perf_counter()
+                    with self.bot.tracer.span(
+                        "huggingface.request", model=self.model_name(api_url), attempt=attempt
+                    ) as span:
+                        # Streamed with a size cap; oversized or non-image bodies raise PayloadRejected
+                        response = await self.bot.http_client.fetch_image(
+                            "POST", api_url, headers=self.headers, json=payload,
+                            timeout=max(1, min(timeout, deadline - time.monotonic()))
+                        )
+                        span.set_attribute("status", response.status_code)
+                        span.set_attribute("bytes", len(response.content))
+            except Exception as e:
+                print(f"API request error: {e}")
+                if started is None:
+                    # Never sent (the worker slot couldn't be reacquired), so the model isn't to blame
+                    return None
+                self.bot.metrics.upstream_latency.observe(
+                    time.perf_counter() - started, backend=BACKEND_HUGGINGFACE,
+                    model=self.model_name(api_url), outcome="rejected" if isinstance(e, PayloadRejected) else "error"
+                )
+                self.model_health.record_failure(api_url)
+                return None
+            
+            latency = time.perf_counter() - started
+            self.bot.metrics.upstream_latency.observe(
+                latency, backend=BACKEND_HUGGINGFACE,
+                model=self.model_name(api_url), outcome=str(response.status_code)
             )
             
             if response.status_code == 200:
+                self.model_health.record_success(api_url, latency)
                 return response.content
-            elif response.status_code == 503:
-                # Model is loading, wait and retry
-                await asyncio.sleep(10)
-                response = await loop.run_in_executor(
-                    None, 
-                    lambda: requests.post(api_url, headers=self.headers, json=payload, timeout=timeout)
-                )
-                if response.status_code == 200:
-                    return response.content
             
+            # Only loading (503) and rate limited (429) responses are worth retrying
+            if response.status_code not in (429, 503) or attempt >= self.max_retries:
+                self.model_health.record_failure(api_url)
+                return None
+            
+            delay = self.retry_delay(response, attempt)
+            self.model_health.record_failure(
+                api_url, loading_for=delay if response.status_code == 503 else None
+            )
+            
+            if time.monotonic() + delay >= deadline:
+                # Not enough budget left to wait for this model
+                return None
+            
+            # Wait without holding a queue worker, then retry
+            with self.bot.tracer.span("huggingface.retry_wait", model=self.model_name(api_url), delay=delay):
+                await self.bot.generation_queue.park(delay)
+            attempt += 1
+
+    async def query_first_success(self, api_urls, payload, timeout=60):
+        """Query candidate models with hedging and return the first successful result"""
+        if self.hedge_delay < 0:
+            # Sequential fallback
+            for api_url in api_urls:
+                result = await self.query_huggingface_api(api_url, payload, timeout)
+                if result:
+                    return result
             return None
+        
+        remaining = list(api_urls)
+        pending = set()
+        
+        def launch_next():
+            api_url = remaining.pop(0)
+            pending.add(asyncio.create_task(self.query_huggingface_api(api_url, payload, timeout)))
+        
+        try:
+            launch_next()
+            while pending:
+                can_hedge = remaining and len(pending) < self.hedge_max_parallel
+                done, _ = await asyncio.wait(
+                    pending,
+                    timeout=self.hedge_delay if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                
+                for task in done:
+                    pending.discard(task)
+                    if task.result():
+                        return task.result()
+                
+                # A model failed or is slow: bring in the next candidate
+                while remaining and len(pending) < self.hedge_max_parallel:
+                    launch_next()
+                    if not done:
+                        break
             
-        except Exception as e:
-            print(f"API request error: {e}")
             return None
+        finally:
+            for task in pending:
+                task.cancel()
 
-    async def generate_advanced_image(self, prompt, negative_prompt=None, width=1024, height=1024):
-        """Generate image using Hugging Face API"""
+    async def generate_advanced_image(self, prompt, negative_prompt=None, width=1024, height=1024, seed=None):
+        """Generate image using Hugging Face API (a fixed seed gives a repeatable variant)"""
         payload = {
             "inputs": prompt,
             "parameters": {
@@ -74,19 +220,11 @@ class AdvancedGenerationCommands(commands.Cog):
         
         if negative_prompt:
             payload["parameters"]["negative_prompt"] = negative_prompt
+        if seed is not None:
+            payload["parameters"]["seed"] = seed
         
-        # Try primary model first
-        image_bytes = await self.query_huggingface_api(self.image_api_url, payload)
-        
-        # Try fallback models if primary fails
-        if not image_bytes:
-            for fallback_model in self.fallback_image_models:
-                fallback_url = f"https://api-inference.huggingface.co/models/{fallback_model}"
-                image_bytes = await self.query_huggingface_api(fallback_url, payload)
-                if image_bytes:
-                    break
-        
-        return image_bytes
+        # Healthiest models first (hedged when enabled)
+        return await self.query_first_success(self.model_health.rank(self.image_model_urls()), payload)
 
     async def generate_advanced_video(self, prompt, num_frames=16):
         """Generate video using Hugging Face API"""
@@ -98,24 +236,17 @@ class AdvancedGenerationCommands(commands.Cog):
             }
         }
         
-        # Try primary model first
-        video_bytes = await self.query_huggingface_api(self.video_api_url, payload, timeout=120)
-        
-        # Try fallback models if primary fails
-        if not video_bytes:
-            for fallback_model in self.fallback_video_models:
-                fallback_url = f"https://api-inference.huggingface.co/models/{fallback_model}"
-                video_bytes = await self.query_huggingface_api(fallback_url, payload, timeout=120)
-                if video_bytes:
-                    break
-        
-        return video_bytes
+        # Healthiest models first (hedged when enabled)
+        return await self.query_first_success(
+            self.model_health.rank(self.video_model_urls()), payload, timeout=120
+        )
 
     @app_commands.command(name="imgen", description="Generate high-quality images using advanced AI models")
     @app_commands.describe(
         prompt="The text prompt to generate an image from",
         negative_prompt="What to avoid in the image (optional)",
-        size="Image size preset"
+        size="Image size preset",
+        count="How many variations to generate (shown as a grid)"
     )
     @app_commands.choices(size=[
         app_commands.Choice(name="Square (1024x1024)", value="1024x1024"),
@@ -123,9 +254,11 @@ class AdvancedGenerationCommands(commands.Cog):
         app_commands.Choice(name="Landscape (1024x768)", value="1024x768"),
         app_commands.Choice(name="Wide (1280x720)", value="1280x720")
     ])
-    async def slash_imgen(self, interaction: discord.Interaction, prompt: str, negative_prompt: str = None, size: str = "1024x1024"):
+    async def slash_imgen(self, interaction: discord.Interaction, prompt: str, negative_prompt: str = None, size: str = "1024x1024",
+                          count: app_commands.Range[int, 1, MAX_VARIANTS] = 1):
         """Advanced image generation slash command"""
-        await interaction.response.defer()
+        with self.bot.track_discord("defer"):
+            await interaction.response.defer()
         
         # Log command usage
         if self.bot.discord_logger:
@@ -144,29 +277,68 @@ class AdvancedGenerationCommands(commands.Cog):
         # Parse size
         width, height = map(int, size.split('x'))
         
+        if count > 1:
+            def submit_variant(seed):
+                return self.bot.generation_queue.submit(
+                    BACKEND_HUGGINGFACE,
+                    lambda: self.bot.postprocess_image(
+                        self.generate_advanced_image(prompt, negative_prompt, width, height, seed)
+                    ),
+                    PRIORITY_HIGH,
+                    cache_key=ImageCache.make_key(
+                        prompt, negative_prompt, width, height, model=self.image_api_url, seed=seed
+                    ),
+                    guild_id=interaction.guild_id
+                )
+            
+            await send_variants(
+                self.bot, interaction, "imgen", BACKEND_HUGGINGFACE, prompt, count, submit_variant,
+                details=f"**Size:** {size}\n**Negative Prompt:** {negative_prompt or 'None'}\n"
+            )
+            return
+        
+        # Queue the generation so upstream load stays bounded
+        started = time.perf_counter()
+        try:
+            job = await self.bot.generation_queue.submit(
+                BACKEND_HUGGINGFACE,
+                lambda: self.bot.postprocess_image(
+                    self.generate_advanced_image(prompt, negative_prompt, width, height)
+                ),
+                PRIORITY_HIGH,
+                cache_key=ImageCache.make_key(prompt, negative_prompt, width, height, model=self.image_api_url),
+                guild_id=interaction.guild_id
+            )
+        except QueueFullError:
+            busy_embed = discord.Embed(
+                title="⏳ I'm Busy!",
+                description="Too many images are being generated right now. Please try again in a moment!",
+                color=0xFF6B6B
+            )
+            busy_embed.set_footer(text="©️ 2025 Hinata. All rights reserved")
+            await interaction.followup.send(embed=busy_embed)
+            return
+        
         # Create loading embed
         loading_embed = discord.Embed(
             title="🎨 Generating Advanced Image...",
             description=f"**Prompt:** {prompt}\n"
                        f"**Size:** {size}\n"
-                       f"**Negative Prompt:** {negative_prompt or 'None'}\n\n"
+                       f"**Negative Prompt:** {negative_prompt or 'None'}\n"
+                       f"**Queue Position:** {self.bot.generation_queue.position_label(job)}\n\n"
                        "Using advanced AI models... This may take a moment.",
             color=0x9B59B6
         )
         loading_embed.set_footer(text="©️ 2025 Hinata. All rights reserved")
         
-        await interaction.followup.send(embed=loading_embed)
+        with self.bot.track_discord("followup"):
+            await interaction.followup.send(embed=loading_embed)
         
         try:
-            # Generate image
-            image_bytes = await self.generate_advanced_image(prompt, negative_prompt, width, height)
+            # Wait for the queued generation
+            image_bytes = await job
             
             if image_bytes:
-                # Save image to temporary file
-                with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_file:
-                    temp_file.write(image_bytes)
-                    temp_file_path = temp_file.name
-                
                 # Create success embed
                 success_embed = discord.Embed(
                     title="✨ Advanced Image Generated!",
@@ -175,18 +347,25 @@ class AdvancedGenerationCommands(commands.Cog):
                 )
                 success_embed.set_footer(text="©️ 2025 Hinata. All rights reserved")
                 
-                # Send image as file
-                with open(temp_file_path, 'rb') as f:
-                    file = discord.File(f, filename=f"hinata_imgen_{interaction.id}.png")
+                # Send image straight from memory (BytesIO shares the bytes buffer, no copy)
+                file = discord.File(
+                    io.BytesIO(image_bytes),
+                    filename=f"hinata_imgen_{interaction.id}.{sniff_image_format(image_bytes) or 'png'}"
+                )
+                with self.bot.track_discord("upload"):
                     await interaction.edit_original_response(embed=success_embed, attachments=[file])
-                
-                # Clean up temp file
-                os.unlink(temp_file_path)
+                latency = time.perf_counter() - started
+                self.bot.metrics.generation_latency.observe(
+                    latency, command="imgen", backend=BACKEND_HUGGINGFACE,
+                    outcome="cached" if job.cached else "success"
+                )
                 
                 # Log successful generation
                 if self.bot.discord_logger:
                     await self.bot.discord_logger.log_image_generation(
-                        interaction.user, interaction.guild, interaction.channel, prompt, True
+                        interaction.user, interaction.guild, interaction.channel, prompt, True,
+                        latency=latency, backend=BACKEND_HUGGINGFACE,
+                        cache_hit=job.cached, size_bytes=len(image_bytes)
                     )
             else:
                 raise Exception("Failed to generate image")
@@ -200,12 +379,18 @@ class AdvancedGenerationCommands(commands.Cog):
             )
             error_embed.set_footer(text="©️ 2025 Hinata. All rights reserved")
             
-            await interaction.edit_original_response(embed=error_embed)
+            with self.bot.track_discord("edit"):
+                await interaction.edit_original_response(embed=error_embed)
+            latency = time.perf_counter() - started
+            self.bot.metrics.generation_latency.observe(
+                latency, command="imgen", backend=BACKEND_HUGGINGFACE, outcome="failure"
+            )
             
             # Log failed generation
             if self.bot.discord_logger:
                 await self.bot.discord_logger.log_image_generation(
-                    interaction.user, interaction.guild, interaction.channel, prompt, False
+                    interaction.user, interaction.guild, interaction.channel, prompt, False,
+                    latency=latency, backend=BACKEND_HUGGINGFACE
                 )
 
     @app_commands.command(name="vidgen", description="Generate videos from text using AI")
@@ -220,7 +405,8 @@ class AdvancedGenerationCommands(commands.Cog):
     ])
     async def slash_vidgen(self, interaction: discord.Interaction, prompt: str, duration: str = "16"):
         """Video generation slash command"""
-        await interaction.response.defer()
+        with self.bot.track_discord("defer"):
+            await interaction.response.defer()
         
         # Check if user has video generation access
         embed = discord.Embed(
@@ -274,27 +460,42 @@ class AdvancedGenerationCommands(commands.Cog):
             await ctx.send(embed=embed)
             return
         
+        # Queue the generation with default settings
+        started = time.perf_counter()
+        try:
+            job = await self.bot.generation_queue.submit(
+                BACKEND_HUGGINGFACE, lambda: self.bot.postprocess_image(self.generate_advanced_image(prompt)),
+                cache_key=ImageCache.make_key(prompt, None, 1024, 1024, model=self.image_api_url),
+                guild_id=ctx.guild.id if ctx.guild else None
+            )
+        except QueueFullError:
+            busy_embed = discord.Embed(
+                title="⏳ I'm Busy!",
+                description="Too many images are being generated right now. Please try again in a moment!",
+                color=0xFF6B6B
+            )
+            busy_embed.set_footer(text="©️ 2025 Hinata. All rights reserved")
+            await ctx.send(embed=busy_embed)
+            return
+        
         # Create loading embed
         loading_embed = discord.Embed(
             title="🎨 Generating Advanced Image...",
-            description=f"**Prompt:** {prompt}\n\n"
+            description=f"**Prompt:** {prompt}\n"
+                       f"**Queue Position:** {self.bot.generation_queue.position_label(job)}\n\n"
                        "Using advanced AI models... This may take a moment.",
             color=0x9B59B6
         )
         loading_embed.set_footer(text="©️ 2025 Hinata. All rights reserved")
         
-        loading_message = await ctx.send(embed=loading_embed)
+        with self.bot.track_discord("send"):
+            loading_message = await ctx.send(embed=loading_embed)
         
         try:
-            # Generate image with default settings
-            image_bytes = await self.generate_advanced_image(prompt)
+            # Wait for the queued generation
+            image_bytes = await job
             
             if image_bytes:
-                # Save image to temporary file
-                with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_file:
-                    temp_file.write(image_bytes)
-                    temp_file_path = temp_file.name
-                
                 # Create success embed
                 success_embed = discord.Embed(
                     title="✨ Advanced Image Generated!",
@@ -303,18 +504,25 @@ class AdvancedGenerationCommands(commands.Cog):
                 )
                 success_embed.set_footer(text="©️ 2025 Hinata. All rights reserved")
                 
-                # Send image as file
-                with open(temp_file_path, 'rb') as f:
-                    file = discord.File(f, filename=f"hinata_imgen_{ctx.message.id}.png")
+                # Send image straight from memory (BytesIO shares the bytes buffer, no copy)
+                file = discord.File(
+                    io.BytesIO(image_bytes),
+                    filename=f"hinata_imgen_{ctx.message.id}.{sniff_image_format(image_bytes) or 'png'}"
+                )
+                with self.bot.track_discord("upload"):
                     await loading_message.edit(embed=success_embed, attachments=[file])
-                
-                # Clean up temp file
-                os.unlink(temp_file_path)
+                latency = time.perf_counter() - started
+                self.bot.metrics.generation_latency.observe(
+                    latency, command="imgen", backend=BACKEND_HUGGINGFACE,
+                    outcome="cached" if job.cached else "success"
+                )
                 
                 # Log successful generation
                 if self.bot.discord_logger:
                     await self.bot.discord_logger.log_image_generation(
-                        ctx.author, ctx.guild, ctx.channel, prompt, True
+                        ctx.author, ctx.guild, ctx.channel, prompt, True,
+                        latency=latency, backend=BACKEND_HUGGINGFACE,
+                        cache_hit=job.cached, size_bytes=len(image_bytes)
                     )
             else:
                 raise Exception("Failed to generate image")
@@ -328,12 +536,18 @@ class AdvancedGenerationCommands(commands.Cog):
             )
             error_embed.set_footer(text="©️ 2025 Hinata. All rights reserved")
             
-            await loading_message.edit(embed=error_embed)
+            with self.bot.track_discord("edit"):
+                await loading_message.edit(embed=error_embed)
+            latency = time.perf_counter() - started
+            self.bot.metrics.generation_latency.observe(
+                latency, command="imgen", backend=BACKEND_HUGGINGFACE, outcome="failure"
+            )
             
             # Log failed generation
             if self.bot.discord_logger:
                 await self.bot.discord_logger.log_image_generation(
-                    ctx.author, ctx.guild, ctx.channel, prompt, False
+                    ctx.author, ctx.guild, ctx.channel, prompt, False,
+                    latency=latency, backend=BACKEND_HUGGINGFACE
                 )
 
     @commands.command(name="vidgen", aliases=["video", "genvid"])
@@ -378,6 +592,43 @@ class AdvancedGenerationCommands(commands.Cog):
         
         await ctx.send(embed=embed)
 
+    @commands.command(name="models", aliases=["routing"])
+    async def model_status(self, ctx):
+        """Show the current Hugging Face model routing table"""
+        # Log command usage
+        if self.bot.discord_logger:
+            await self.bot.discord_logger.log_command_used(ctx, "models", True)
+        
+        embed = discord.Embed(
+            title="🧭 Model Routing",
+            description="Image models in the order they will be tried next.",
+            color=0x9B59B6
+        )
+        
+        for row in self.model_health.routing_table(self.image_model_urls()):
+            if not row["available"]:
+                state = "🔴 Circuit open"
+            elif row["loading"]:
+                state = "🟡 Loading"
+            else:
+                state = "🟢 Healthy"
+            
+            success_rate = f"{row['success_rate'] * 100:.0f}%" if row["success_rate"] is not None else "n/a"
+            p50 = f"{row['p50_latency']:.1f}s" if row["p50_latency"] is not None else "n/a"
+            p95 = f"{row['p95_latency']:.1f}s" if row["p95_latency"] is not None else "n/a"
+            
+            embed.add_field(
+                name=f"{row['rank'] or '-'}. {row['model'].split('/models/', 1)[-1]}",
+                value=f"{state}\n"
+                      f"**Success:** {success_rate} ({row['samples']} samples)\n"
+                      f"**Latency:** p50 {p50} / p95 {p95}\n"
+                      f"**Expected:** {row['expected_latency']:.1f}s",
+                inline=False
+            )
+        
+        embed.set_footer(text="©️ 2025 Hinata. All rights reserved")
+        await ctx.send(embed=embed)
+
 async def setup(bot):
     await bot.add_cog(AdvancedGenerationCommands(bot))
 
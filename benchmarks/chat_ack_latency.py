@@ -0,0 +1,124 @@
+"""Load test: slash-command ack latency while chat completions are in flight.
+
+Starts a local stub of the OpenRouter chat completions API that answers after a
+configurable delay, fires N concurrent ChatManager.generate_chat_response calls
+against it and, at the same time, measures how long a simulated interaction ack
+(a coroutine scheduled on the event loop) waits before it runs.
+
+With a non-blocking chat backend the ack latency should stay flat regardless of N.
+
+    python benchmarks/chat_ack_latency.py --requests 1 8 32 --delay 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STUB_REPLY = "Hello from the stub! 🌸"
+
+
+async def start_stub_server(delay: float, port: int) -> web.AppRunner:
+    """Start a fake OpenRouter /chat/completions endpoint"""
+    async def completions(request):
+        await request.json()
+        await asyncio.sleep(delay)
+        return web.json_response({
+            "id": "stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "stub",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": STUB_REPLY},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+        })
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", completions)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+async def measure_ack_latency(duration: float, interval: float = 0.05):
+    """Sample how late a scheduled ack coroutine runs, in milliseconds"""
+    samples = []
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        scheduled = time.perf_counter()
+        await asyncio.sleep(0)
+        samples.append((time.perf_counter() - scheduled) * 1000)
+        await asyncio.sleep(interval)
+    return samples
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 3),
+        "max_ms": round(samples[-1], 3),
+    }
+
+
+async def run(args):
+    os.environ.setdefault("OPENROUTER_API_KEY", "stub")
+    os.environ["OPENROUTER_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+    os.environ["CHAT_MAX_CONCURRENCY"] = str(max(1, *args.requests))
+    # Keep histories in memory so the numbers don't include SQLite writes
+    os.environ["CHAT_STORE"] = "memory"
+
+    from chat import ChatManager
+    from metrics import MetricsRegistry
+    from tracing import Tracer
+
+    runner = await start_stub_server(args.delay, args.port)
+    results = []
+    try:
+        for n in args.requests:
+            # ChatManager only needs the bot's metrics and tracer
+            manager = ChatManager(SimpleNamespace(metrics=MetricsRegistry(), tracer=Tracer()))
+            await manager.start()
+            chats = [
+                asyncio.create_task(manager.generate_chat_response("hi", channel_id, "bench"))
+                for channel_id in range(n)
+            ]
+            started = time.perf_counter()
+            samples = await measure_ack_latency(args.delay)
+            replies = await asyncio.gather(*chats)
+            results.append({
+                "in_flight": n,
+                # Failed completions come back as an apology, which would make the ack latency meaningless
+                "succeeded": sum(reply == STUB_REPLY for reply in replies),
+                "chat_wall_s": round(time.perf_counter() - started, 3),
+                "ack_latency": summarize(samples),
+            })
+            await manager.stop()
+            await manager.openrouter_client.close()
+    finally:
+        await runner.cleanup()
+
+    print(json.dumps(results, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, nargs="+", default=[0, 1, 8, 32])
+    parser.add_argument("--delay", type=float, default=2.0, help="stub completion latency in seconds")
+    parser.add_argument("--port", type=int, default=8765)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
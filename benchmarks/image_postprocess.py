@@ -0,0 +1,136 @@
+"""Benchmark: bytes uploaded and CPU time per image, before and after post-processing.
+
+Generates synthetic 1024x1024 PNGs shaped like Hugging Face output and compares
+uploading them untouched (the old path) with transcoding them through
+image_processing to WebP and JPEG. It also measures event-loop lag while the
+encoding runs inline on the loop versus on the process pool.
+
+    python benchmarks/image_postprocess.py --images 24 --workers 3
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+from PIL import Image, ImageFilter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_processing import DEFAULT_UPLOAD_LIMIT, ImageProcessor, process_image  # noqa: E402
+from metrics import MetricsRegistry  # noqa: E402
+from tracing import Tracer  # noqa: E402
+
+
+def synthetic_png(seed: int, size: int) -> bytes:
+    """Smooth shapes plus grain, which compresses roughly like a diffusion model's PNG"""
+    shift = seed * 0.05
+    base = Image.effect_mandelbrot((size, size), (-2.0 + shift, -1.5, 1.0 + shift, 1.5), 64)
+    gradient = Image.linear_gradient("L").resize((size, size))
+    noise = Image.effect_noise((size, size), 24).filter(ImageFilter.GaussianBlur(1))
+    image = Image.merge("RGB", (base, gradient, noise)).filter(ImageFilter.SMOOTH)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+async def measure_lag(stop: asyncio.Event, interval: float = 0.005):
+    """How late a 5ms timer fires while other work runs, in milliseconds"""
+    samples = []
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        scheduled = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, (loop.time() - scheduled - interval) * 1000))
+    return samples
+
+
+def summarize_lag(samples):
+    samples = sorted(samples) or [0.0]
+    return {
+        "lag_p95_ms": round(samples[max(0, int(len(samples) * 0.95) - 1)], 2),
+        "lag_max_ms": round(samples[-1], 2),
+    }
+
+
+async def run_inline(images, image_format, quality):
+    """Encode on the event loop, as a naive implementation would"""
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_lag(stop))
+    started = time.perf_counter()
+    for data in images:
+        process_image(data, image_format, quality, 40, DEFAULT_UPLOAD_LIMIT)
+        await asyncio.sleep(0)
+    wall = time.perf_counter() - started
+    stop.set()
+    return {"mode": "inline", "wall_s": round(wall, 3), **summarize_lag(await lag_task)}
+
+
+async def run_pool(images, processor):
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_lag(stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(processor.process(data) for data in images))
+    wall = time.perf_counter() - started
+    stop.set()
+    return {"mode": "pool", "wall_s": round(wall, 3), **summarize_lag(await lag_task)}
+
+
+async def run(args):
+    images = [synthetic_png(seed, args.size) for seed in range(args.images)]
+    results = {
+        "images": args.images,
+        "size": args.size,
+        "before": {
+            "format": "png (untouched)",
+            "bytes_per_image": round(statistics.mean(len(data) for data in images)),
+            "cpu_ms_per_image": 0.0,
+        },
+        "after": [],
+    }
+
+    for image_format in args.formats:
+        sizes, cpu = [], []
+        for data in images:
+            output, cpu_seconds = process_image(data, image_format, args.quality, 40, DEFAULT_UPLOAD_LIMIT)
+            sizes.append(len(output))
+            cpu.append(cpu_seconds * 1000)
+        results["after"].append({
+            "format": image_format.lower(),
+            "quality": args.quality,
+            "bytes_per_image": round(statistics.mean(sizes)),
+            "bytes_saved_pct": round(100 - statistics.mean(sizes) / results["before"]["bytes_per_image"] * 100, 1),
+            "cpu_ms_per_image": round(statistics.median(cpu), 1),
+        })
+
+    os.environ["IMAGE_PROCESS_WORKERS"] = str(args.workers)
+    os.environ["IMAGE_QUALITY"] = str(args.quality)
+    processor = ImageProcessor(SimpleNamespace(metrics=MetricsRegistry(), tracer=Tracer()))
+    await processor.start()
+    try:
+        results["event_loop"] = [
+            await run_inline(images, processor.format, args.quality),
+            await run_pool(images, processor),
+        ]
+    finally:
+        await processor.stop()
+
+    print(json.dumps(results, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=24)
+    parser.add_argument("--size", type=int, default=1024, help="width and height of the generated PNGs")
+    parser.add_argument("--quality", type=int, default=85)
+    parser.add_argument("--formats", nargs="+", default=["WEBP", "JPEG"], choices=["WEBP", "JPEG", "PNG"])
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
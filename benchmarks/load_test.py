@@ -0,0 +1,442 @@
+"""Load test: end-to-end throughput of /generate, /imgen and chat against local stand-ins.
+
+Starts one local stub server that impersonates pollinations.ai, the Hugging Face
+inference API and the OpenRouter chat API (configurable latency, 503, "model is
+loading" and non-image body injection, payload sizes). The bot's real cogs, generation
+queue, cache and ChatManager are then driven through fake interactions and
+messages whose Discord calls just sleep for --discord-latency.
+
+Each scenario reports requests/sec, p50/p95/p99 latency and peak RSS as JSON.
+Pass the JSON of an earlier run with --baseline to get per-scenario deltas.
+
+    python benchmarks/load_test.py --requests 200 --concurrency 32 --output results.json
+    python benchmarks/load_test.py --baseline results.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from aiohttp import web
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SCENARIOS = ("generate", "imgen", "chat")
+
+
+def make_image(image_format: str, size_kb: int) -> bytes:
+    """A noise image of roughly size_kb (noise barely compresses, so re-encoding can't cheat)"""
+    side = max(16, int(math.sqrt(size_kb * 1024 / 3)))
+    buffer = io.BytesIO()
+    Image.frombytes("RGB", (side, side), os.urandom(side * side * 3)).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+class StubUpstreams:
+    """pollinations, Hugging Face and OpenRouter on one local port"""
+
+    def __init__(self, args):
+        self.args = args
+        self.jpeg = make_image("JPEG", args.payload_kb)
+        self.png = make_image("PNG", args.payload_kb)
+        self.runner = None
+        self.requests = {"pollinations": 0, "huggingface": 0, "openrouter": 0}
+
+    async def _latency(self):
+        jitter = self.args.latency * self.args.jitter
+        await asyncio.sleep(max(0.0, self.args.latency + random.uniform(-jitter, jitter)))
+
+    async def pollinations(self, request):
+        self.requests["pollinations"] += 1
+        await self._latency()
+        if random.random() < self.args.error_rate:
+            return web.Response(status=503, text="Service Unavailable")
+        return web.Response(body=self.jpeg, content_type="image/jpeg")
+
+    async def huggingface(self, request):
+        self.requests["huggingface"] += 1
+        await request.json()
+        await self._latency()
+        if random.random() < self.args.loading_rate:
+            return web.json_response(
+                {"error": "Model is currently loading", "estimated_time": self.args.loading_time}, status=503
+            )
+        if random.random() < self.args.bad_payload_rate:
+            # A misbehaving model answering 200 with a large non-image body
+            return web.Response(body=b"<html>" * (self.args.payload_kb * 512), content_type="text/html")
+        return web.Response(body=self.png, content_type="image/png")
+
+    async def chat_completions(self, request):
+        self.requests["openrouter"] += 1
+        body = await request.json()
+        await self._latency()
+        tokens = [f"word{i} " for i in range(self.args.chat_tokens)]
+        base = {"id": "stub", "created": int(time.time()), "model": body.get("model", "stub")}
+
+        if not body.get("stream"):
+            return web.json_response({
+                **base,
+                "object": "chat.completion",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": 1, "completion_tokens": len(tokens), "total_tokens": len(tokens) + 1}
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for index, token in enumerate(tokens + [None]):
+            chunk = {
+                **base,
+                "object": "chat.completion.chunk",
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": token} if token is not None else {},
+                    "finish_reason": None if token is not None else "stop"
+                }],
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            if token is not None and index:
+                await asyncio.sleep(self.args.token_interval)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def start(self):
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_get("/prompt/{prompt:.+}", self.pollinations)
+        app.router.add_post("/models/{model:.+}", self.huggingface)
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, "127.0.0.1", self.args.port).start()
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+class FakeDiscord:
+    """Stand-ins for the Discord objects the cogs touch; every API call costs --discord-latency"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.ids = itertools.count(1_000_000)
+        self.calls = 0
+        self.bytes_uploaded = 0
+
+    async def call(self, files=()):
+        self.calls += 1
+        for file in files:
+            # Read attachments like an upload would
+            self.bytes_uploaded += len(file.fp.read())
+        await asyncio.sleep(self.latency)
+
+    def user(self, user_id: int):
+        return FakeUser(user_id)
+
+    def guild(self, guild_id: int):
+        return FakeObject(id=guild_id, name=f"guild-{guild_id}")
+
+    def channel(self, channel_id: int, guild):
+        return FakeChannel(self, channel_id, guild)
+
+    def interaction(self, user_id: int, guild_id: int, channel_id: int):
+        return FakeInteraction(self, user_id, guild_id, channel_id)
+
+
+class FakeObject:
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+class FakeUser(FakeObject):
+    def __init__(self, user_id: int):
+        super().__init__(id=user_id, name=f"user{user_id}", display_name=f"User {user_id}",
+                         discriminator="0", bot=False, mention=f"<@{user_id}>")
+
+
+class FakeTyping:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeChannel(FakeObject):
+    def __init__(self, discord_api: FakeDiscord, channel_id: int, guild):
+        super().__init__(id=channel_id, name=f"channel-{channel_id}", guild=guild)
+        self.discord = discord_api
+
+    def typing(self):
+        return FakeTyping()
+
+    async def send(self, content=None, **kwargs):
+        await self.discord.call(kwargs.get("files", ()))
+        return FakeMessage(self.discord, next(self.discord.ids), None, self, content)
+
+
+class FakeMessage(FakeObject):
+    def __init__(self, discord_api: FakeDiscord, message_id: int, author, channel, content):
+        super().__init__(id=message_id, author=author, channel=channel, guild=channel.guild,
+                         content=content or "", mentions=[], created_at=None)
+        self.discord = discord_api
+        self.replied_chars = 0
+
+    async def reply(self, content=None, **kwargs):
+        self.replied_chars += len(content or "")
+        return await self.channel.send(content, **kwargs)
+
+    async def edit(self, content=None, **kwargs):
+        self.replied_chars = len(content or "")
+        await self.discord.call(kwargs.get("attachments", ()))
+
+
+class FakeInteraction(FakeObject):
+    def __init__(self, discord_api: FakeDiscord, user_id: int, guild_id: int, channel_id: int):
+        guild = discord_api.guild(guild_id)
+        super().__init__(
+            id=next(discord_api.ids), user=discord_api.user(user_id), guild=guild, guild_id=guild_id,
+            channel=discord_api.channel(channel_id, guild), extras={}, created_at=datetime.now(timezone.utc),
+            response=FakeObject(defer=lambda: discord_api.call()),
+            followup=FakeObject(send=lambda **kwargs: discord_api.call(kwargs.get("files", ()))),
+        )
+        self.discord = discord_api
+        self.final = None
+
+    async def edit_original_response(self, **kwargs):
+        await self.discord.call(kwargs.get("attachments", ()))
+        self.final = kwargs
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of sorted samples"""
+    return samples[max(0, min(len(samples) - 1, math.ceil(fraction * len(samples)) - 1))]
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_scenario(name, fire, requests, concurrency):
+    """Send requests through fire(index) -> success with `concurrency` in flight"""
+    latencies = []
+    failures = 0
+    indexes = iter(range(requests))
+
+    async def worker():
+        nonlocal failures
+        for index in indexes:
+            started = time.perf_counter()
+            try:
+                ok = await fire(index)
+            except Exception as e:
+                print(f"{name} request {index} raised {type(e).__name__}: {e}", file=sys.stderr)
+                ok = False
+            latencies.append((time.perf_counter() - started) * 1000)
+            if not ok:
+                failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "scenario": name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "succeeded": requests - failures,
+        "failed": failures,
+        "wall_s": round(wall, 3),
+        "rps": round(requests / wall, 2),
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "max_ms": round(latencies[-1], 2),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def compare(results, baseline):
+    """Percentage change of throughput and tail latency against an earlier run"""
+    previous = {scenario["scenario"]: scenario for scenario in baseline.get("scenarios", [])}
+    deltas = {}
+    for scenario in results["scenarios"]:
+        old = previous.get(scenario["scenario"])
+        if not old:
+            continue
+        deltas[scenario["scenario"]] = {
+            key: round((scenario[key] - old[key]) / old[key] * 100, 1) if old[key] else None
+            for key in ("rps", "p50_ms", "p95_ms", "p99_ms", "peak_rss_mb")
+            if scenario.get(key) is not None and old.get(key) is not None
+        }
+    return deltas
+
+
+async def run(args):
+    base_url = f"http://127.0.0.1:{args.port}"
+    os.environ.update({
+        "POLLINATIONS_BASE_URL": base_url,
+        "HUGGINGFACE_BASE_URL": base_url,
+        "OPENROUTER_BASE_URL": f"{base_url}/v1",
+        "HUGGINGFACE_TOKEN": "stub",
+        "OPENROUTER_API_KEY": "stub",
+        "CHAT_STORE": "memory",
+        "CHAT_STREAMING": "true" if args.chat_streaming else "false",
+        "METRICS_PORT": "0",
+        "HF_RETRY_BASE_DELAY": str(args.loading_time),
+    })
+    import http_client
+    import image_cache
+    import image_processing
+    import job_queue
+    from hinata_bot import bot
+    from chat import ChatManager
+    from commands import ImageCommands
+    from advanced_generation import AdvancedGenerationCommands
+
+    upstreams = StubUpstreams(args)
+    await upstreams.start()
+    await http_client.setup(bot)
+    await image_cache.setup(bot)
+    await image_processing.setup(bot)
+    await job_queue.setup(bot)
+    bot.chat_manager = ChatManager(bot)
+    await bot.chat_manager.start()
+
+    discord_api = FakeDiscord(args.discord_latency)
+    image_commands = ImageCommands(bot)
+    advanced_commands = AdvancedGenerationCommands(bot)
+
+    # Warmup and timed requests never share a prompt, so only --repeat-prompts hits the cache
+    prompt_ids = itertools.count()
+
+    def prompt(index):
+        return "a cute cat" if args.repeat_prompts else f"a cute cat number {next(prompt_ids)}"
+
+    def interaction(index):
+        return discord_api.interaction(index % args.users, index % args.guilds, index % args.channels)
+
+    async def fire_generate(index):
+        fake = interaction(index)
+        await image_commands.slash_generate.callback(image_commands, fake, prompt(index), args.count)
+        return bool(fake.final and fake.final.get("attachments"))
+
+    async def fire_imgen(index):
+        fake = interaction(index)
+        await advanced_commands.slash_imgen.callback(
+            advanced_commands, fake, prompt(index), None, "1024x1024", args.count
+        )
+        return bool(fake.final and fake.final.get("attachments"))
+
+    async def fire_chat(index):
+        guild = discord_api.guild(index % args.guilds)
+        channel = discord_api.channel(index % args.channels, guild)
+        message = FakeMessage(
+            discord_api, next(discord_api.ids), discord_api.user(index % args.users), channel, f"hello {index}"
+        )
+        await bot.respond_to_chat([(message, message.content, time.perf_counter())])
+        return message.replied_chars > 0
+
+    fire = {"generate": fire_generate, "imgen": fire_imgen, "chat": fire_chat}
+    results = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "scenarios": [],
+    }
+    try:
+        for name in args.scenarios:
+            if args.warmup:
+                await run_scenario(name, fire[name], args.warmup, min(args.concurrency, args.warmup))
+            results["scenarios"].append(await run_scenario(name, fire[name], args.requests, args.concurrency))
+    finally:
+        await bot.chat_manager.stop()
+        await bot.chat_manager.openrouter_client.close()
+        await job_queue.teardown(bot)
+        await image_processing.teardown(bot)
+        await http_client.teardown(bot)
+        await upstreams.stop()
+
+    results["upstream_requests"] = upstreams.requests
+    results["discord_calls"] = discord_api.calls
+    results["bytes_uploaded"] = discord_api.bytes_uploaded
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=32, help="requests in flight at once")
+    parser.add_argument("--warmup", type=int, default=10, help="untimed requests before each scenario")
+    parser.add_argument("--guilds", type=int, default=8, help="guilds the requests are spread over")
+    parser.add_argument("--users", type=int, default=64, help="users the requests are spread over")
+    parser.add_argument("--channels", type=int, default=32, help="chat channels the requests are spread over")
+    parser.add_argument("--count", type=int, default=1, choices=range(1, 5),
+                        help="images per /generate and /imgen request (variants are sent as a grid)")
+    parser.add_argument("--repeat-prompts", action="store_true", help="reuse one prompt (measures the cache)")
+    parser.add_argument("--latency", type=float, default=0.5, help="stub upstream latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.2, help="latency jitter as a fraction of --latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of pollinations 503s")
+    parser.add_argument("--loading-rate", type=float, default=0.0, help="fraction of Hugging Face 'loading' 503s")
+    parser.add_argument("--bad-payload-rate", type=float, default=0.0,
+                        help="fraction of Hugging Face 200s with an HTML body")
+    parser.add_argument("--loading-time", type=float, default=0.5, help="estimated_time of loading responses")
+    parser.add_argument("--payload-kb", type=int, default=512, help="size of generated images")
+    parser.add_argument("--chat-tokens", type=int, default=60, help="tokens per chat completion")
+    parser.add_argument("--token-interval", type=float, default=0.01, help="seconds between streamed tokens")
+    parser.add_argument("--chat-streaming", action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument("--discord-latency", type=float, default=0.05, help="seconds per fake Discord API call")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    # The bot reports upstream errors with print(); keep stdout for the JSON results
+    with contextlib.redirect_stdout(sys.stderr):
+        results = asyncio.run(run(args))
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            results["delta_pct"] = compare(results, json.load(f))
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Benchmark: tempfile round-trip vs in-memory buffer for image attachments.
+
+The old /imgen path wrote the generated bytes to a NamedTemporaryFile, reopened
+and read it back to build the attachment, then unlinked it, all on the event
+loop. The new path wraps the received bytes in a BytesIO. This script runs both
+at a given concurrency and reports per-image latency and event-loop stall time.
+
+    python benchmarks/upload_path.py --concurrency 16 --size-kb 1500 --images 200
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import statistics
+import tempfile
+import time
+
+
+def disk_round_trip(image_bytes: bytes) -> int:
+    """Old path: write temp file, reopen, read back, unlink"""
+    with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_file:
+        temp_file.write(image_bytes)
+        temp_file_path = temp_file.name
+    with open(temp_file_path, 'rb') as f:
+        payload = f.read()
+    os.unlink(temp_file_path)
+    return len(payload)
+
+
+def in_memory(image_bytes: bytes) -> int:
+    """New path: attach the received buffer directly"""
+    buffer = io.BytesIO(image_bytes)
+    return len(buffer.read())
+
+
+async def run_path(name, fn, image_bytes, images, concurrency):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            fn(image_bytes)
+            latencies.append((time.perf_counter() - started) * 1000)
+            # Yield like a real handler awaiting the Discord upload would
+            await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(images)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "path": name,
+        "images": images,
+        "concurrency": concurrency,
+        "wall_s": round(wall, 4),
+        "images_per_s": round(images / wall, 1),
+        "p50_ms": round(statistics.median(latencies), 4),
+        "p99_ms": round(latencies[max(0, int(len(latencies) * 0.99) - 1)], 4),
+        # Every millisecond here is spent blocking the event loop
+        "loop_blocked_ms": round(sum(latencies), 2),
+    }
+
+
+async def run(args):
+    image_bytes = os.urandom(args.size_kb * 1024)
+    results = [
+        await run_path("disk", disk_round_trip, image_bytes, args.images, args.concurrency),
+        await run_path("memory", in_memory, image_bytes, args.images, args.concurrency),
+    ]
+    print(json.dumps(results, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--size-kb", type=int, default=1500, help="size of each fake image")
+    parser.add_argument("--tmpdir", help="directory for temp files (e.g. the container's overlay fs)")
+    args = parser.parse_args()
+    if args.tmpdir:
+        tempfile.tempdir = args.tmpdir
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
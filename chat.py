@@ -3,109 +3,454 @@ from discord.ext import commands
 from discord import app_commands
 import os
 import asyncio
-from openai import OpenAI
+import time
+from openai import AsyncOpenAI
 import json
-from typing import Dict, List, Optional
+import re
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+from conversation_store import ChannelState, create_backend
+from chat_history import ConversationHistory, estimate_tokens
+
+SYSTEM_PROMPT = "You are Hinata, a friendly and helpful Discord bot. You are cheerful, supportive, and love to help users. You can generate images and chat with users. Keep your responses conversational and engaging, but not too long. Use emojis occasionally to show personality. You are in a Discord server, so keep responses appropriate for a community setting."
+
+# Discord rejects messages longer than this
+DISCORD_MESSAGE_LIMIT = 2000
+
+# End of the first sentence (or line) of a streamed reply
+SENTENCE_END = re.compile(r"[.!?…](\s|$)|\n")
+
+SUMMARY_PROMPT = "Update the running summary of this Discord conversation with the new messages below. Keep names, facts, open questions and user preferences; drop small talk. Reply with the summary only, in at most {words} words."
 
 class ChatManager:
     def __init__(self, bot):
         self.bot = bot
         self.openrouter_client = None
-        self.active_channels: Dict[int, bool] = {}  # channel_id -> is_active
-        self.conversation_history: Dict[int, List[Dict]] = {}  # channel_id -> messages
-        self.max_history_length = 10  # Keep last 10 messages for context
+        self.active_channels: Set[int] = set()
+        # Histories of recently used channels, least recent first; the rest are reloaded from the store
+        self.conversation_history: "OrderedDict[int, ConversationHistory]" = OrderedDict()
+        self.max_hot_channels = int(os.getenv('CHAT_HOT_CHANNELS', '512'))
+        
+        # Changes are written behind in batches by a background flusher
+        self.store = create_backend()
+        self.flush_interval = float(os.getenv('CHAT_STORE_FLUSH_INTERVAL', '2'))
+        self.dirty: Set[int] = set()
+        self.evicted: Dict[int, ConversationHistory] = {}  # dirty histories evicted before their flush
+        self.flusher_task: Optional[asyncio.Task] = None
+        
+        # Context window: newest messages that fit the prompt budget (system prompt included)
+        self.system_message = {"role": "system", "content": SYSTEM_PROMPT}
+        self.prompt_token_budget = int(os.getenv('CHAT_PROMPT_TOKEN_BUDGET', '2000'))
+        self.history_token_budget = max(1, self.prompt_token_budget - estimate_tokens(SYSTEM_PROMPT))
+        self.max_history_length = int(os.getenv('CHAT_HISTORY_MAX_MESSAGES', '10'))
+        
+        # Optionally fold trimmed turns into a rolling summary instead of forgetting them
+        self.summary_enabled = os.getenv('CHAT_SUMMARY_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+        self.summary_max_words = int(os.getenv('CHAT_SUMMARY_MAX_WORDS', '120'))
+        self.summary_tasks: Dict[int, asyncio.Task] = {}
+        
+        # Bound concurrent completions so a burst cannot pile up upstream
+        self.max_concurrent_requests = int(os.getenv('CHAT_MAX_CONCURRENCY', '8'))
+        self.request_semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        self.request_timeout = float(os.getenv('CHAT_TIMEOUT', '60'))
+        self.model = "google/gemma-3n-e4b-it:free"
+        self.inflight_requests = 0
+        
+        # Stream replies into progressively edited messages instead of waiting for the full completion
+        self.streaming = os.getenv('CHAT_STREAMING', 'true').lower() in ('1', 'true', 'yes')
+        self.stream_edit_interval = float(os.getenv('CHAT_STREAM_EDIT_INTERVAL', '1.2'))
+        
+        # Each channel's messages are answered one batch at a time by a worker task;
+        # messages arriving within the debounce window share one completion
+        self.debounce = float(os.getenv('CHAT_DEBOUNCE', '1.5'))
+        self.debounce_max = float(os.getenv('CHAT_DEBOUNCE_MAX', '5'))
+        self.max_batch = int(os.getenv('CHAT_COALESCE_MAX_MESSAGES', '10'))
+        self.pending_messages: Dict[int, List] = {}
+        self.last_arrival: Dict[int, float] = {}
+        self.channel_workers: Dict[int, asyncio.Task] = {}
+        self.messages_coalesced = 0
         
         # Initialize OpenRouter client
         api_key = os.getenv('OPENROUTER_API_KEY')
         if api_key:
-            self.openrouter_client = OpenAI(
-                base_url="https://openrouter.ai/api/v1",
+            self.openrouter_client = AsyncOpenAI(
+                base_url=os.getenv('OPENROUTER_BASE_URL', "https://openrouter.ai/api/v1"),
                 api_key=api_key,
+                timeout=self.request_timeout,
             )
         
+    async def start(self):
+        """Open the store, restore active channels and start the flusher"""
+        await self.store.start()
+        self.active_channels.update(await self.store.load_active_channels())
+        if self.flusher_task is None:
+            self.flusher_task = asyncio.create_task(self._flush_loop())
+    
+    async def stop(self):
+        """Write pending changes and close the store"""
+        for task in list(self.summary_tasks.values()) + list(self.channel_workers.values()):
+            task.cancel()
+        if self.flusher_task:
+            self.flusher_task.cancel()
+            try:
+                await self.flusher_task
+            except asyncio.CancelledError:
+                pass
+            self.flusher_task = None
+        await self.flush()
+        await self.store.close()
+    
     def is_channel_active(self, channel_id: int) -> bool:
         """Check if Hinata is active in a channel"""
-        return self.active_channels.get(channel_id, False)
+        return channel_id in self.active_channels
     
     def activate_channel(self, channel_id: int):
         """Activate Hinata in a channel"""
-        self.active_channels[channel_id] = True
-        # Initialize conversation history for this channel
-        if channel_id not in self.conversation_history:
-            self.conversation_history[channel_id] = []
+        self.active_channels.add(channel_id)
+        self.dirty.add(channel_id)
     
     def deactivate_channel(self, channel_id: int):
         """Deactivate Hinata in a channel"""
-        self.active_channels[channel_id] = False
+        self.active_channels.discard(channel_id)
         # Clear conversation history when deactivated
-        if channel_id in self.conversation_history:
-            del self.conversation_history[channel_id]
+        self.conversation_history.pop(channel_id, None)
+        self.evicted.pop(channel_id, None)
+        self.dirty.add(channel_id)
+    
+    def _new_history(self, data=None) -> ConversationHistory:
+        return ConversationHistory.from_dict(
+            data, self.history_token_budget, self.max_history_length, keep_folded=self.summary_enabled
+        )
+    
+    async def load_history(self, channel_id: int) -> ConversationHistory:
+        """Return a channel's history, reloading it from the store if it was evicted"""
+        history = self.conversation_history.get(channel_id)
+        if history is not None:
+            self.conversation_history.move_to_end(channel_id)
+            return history
+        
+        history = self.evicted.pop(channel_id, None)
+        if history is None:
+            # A dirty channel that isn't cached was cleared and not flushed yet
+            if channel_id in self.dirty:
+                history = self._new_history()
+            else:
+                history = self._new_history(await self.store.load_history(channel_id))
+            
+            # Another message may have loaded the channel while we waited
+            if channel_id in self.conversation_history:
+                return await self.load_history(channel_id)
+        
+        self._cache(channel_id, history)
+        return history
+    
+    def _cache(self, channel_id: int, history: ConversationHistory):
+        self.conversation_history[channel_id] = history
+        while len(self.conversation_history) > self.max_hot_channels:
+            old_channel_id, old_history = self.conversation_history.popitem(last=False)
+            if old_channel_id in self.dirty:
+                self.evicted[old_channel_id] = old_history
     
     def add_to_conversation(self, channel_id: int, role: str, content: str):
-        """Add a message to the conversation history"""
+        """Add a message to the conversation history (load_history first for evicted channels)"""
         if channel_id not in self.conversation_history:
-            self.conversation_history[channel_id] = []
-        
-        self.conversation_history[channel_id].append({
-            "role": role,
-            "content": content
-        })
+            history = self.evicted.pop(channel_id, None)
+            self._cache(channel_id, history if history is not None else self._new_history())
         
-        # Keep only the last N messages to prevent context overflow
-        if len(self.conversation_history[channel_id]) > self.max_history_length:
-            self.conversation_history[channel_id] = self.conversation_history[channel_id][-self.max_history_length:]
+        # The history drops its oldest messages once they exceed the token budget
+        self.conversation_history[channel_id].append(role, content)
+        self.dirty.add(channel_id)
     
     def get_conversation_history(self, channel_id: int) -> List[Dict]:
-        """Get conversation history for a channel"""
-        return self.conversation_history.get(channel_id, [])
+        """Get conversation history for a cached channel"""
+        history = self.conversation_history.get(channel_id)
+        return history.to_dict()["messages"] if history else []
+    
+    def _snapshot(self, channel_id: int) -> ChannelState:
+        history = self.conversation_history.get(channel_id)
+        if history is None:
+            history = self.evicted.get(channel_id)
+            if history is None:
+                history = self._new_history()
+        active = channel_id in self.active_channels
+        if not active and not len(history) and not history.summary:
+            return None
+        return (active, history.to_dict())
+    
+    async def flush(self):
+        """Write every changed channel to the store in one batch"""
+        if not self.dirty:
+            return
+        # The store runs queries in submission order, so reloads issued after this see the batch
+        changes = {channel_id: self._snapshot(channel_id) for channel_id in self.dirty}
+        self.dirty.clear()
+        self.evicted.clear()
+        try:
+            await self.store.write(changes)
+        except Exception as e:
+            print(f"Error saving conversations: {e}")
+            for channel_id, state in changes.items():
+                self.dirty.add(channel_id)
+                if state and channel_id not in self.conversation_history:
+                    self.evicted.setdefault(channel_id, self._new_history(state[1]))
     
-    async def generate_chat_response(self, message_content: str, channel_id: int, user_name: str) -> Optional[str]:
-        """Generate a chat response using OpenRouter"""
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+    
+    def enqueue(self, channel_id: int, item, respond: Callable[[List], Awaitable]):
+        """Queue a message for its channel's worker, which awaits respond(batch) once per batch"""
+        self.pending_messages.setdefault(channel_id, []).append(item)
+        self.last_arrival[channel_id] = asyncio.get_running_loop().time()
+        if channel_id not in self.channel_workers:
+            self.channel_workers[channel_id] = asyncio.create_task(self._channel_worker(channel_id, respond))
+    
+    async def _channel_worker(self, channel_id: int, respond: Callable[[List], Awaitable]):
+        loop = asyncio.get_running_loop()
+        try:
+            while self.pending_messages.get(channel_id):
+                # In active channels, wait for the channel to go quiet (never longer than debounce_max);
+                # mentions elsewhere are answered right away
+                window_start = loop.time()
+                while self.is_channel_active(channel_id) and len(self.pending_messages[channel_id]) < self.max_batch:
+                    wait = min(self.last_arrival[channel_id] + self.debounce, window_start + self.debounce_max) - loop.time()
+                    if wait <= 0:
+                        break
+                    await asyncio.sleep(wait)
+                
+                pending = self.pending_messages[channel_id]
+                batch, self.pending_messages[channel_id] = pending[:self.max_batch], pending[self.max_batch:]
+                self.messages_coalesced += len(batch) - 1
+                try:
+                    await respond(batch)
+                except Exception as e:
+                    print(f"Error answering chat batch: {e}")
+        finally:
+            del self.channel_workers[channel_id]
+            if not self.pending_messages.get(channel_id):
+                self.pending_messages.pop(channel_id, None)
+                self.last_arrival.pop(channel_id, None)
+    
+    async def generate_chat_response(self, message_content: str, channel_id: int,
+                                     user_name: Optional[str]) -> Optional[str]:
+        """Generate a chat response using OpenRouter (user_name is None when the content names its authors)"""
         if not self.openrouter_client:
             return "Sorry, I'm not configured for chat yet. Please set up the OpenRouter API key!"
         
         try:
             # Add user message to conversation history
-            self.add_to_conversation(channel_id, "user", f"{user_name}: {message_content}")
-            
-            # Get conversation history
-            history = self.get_conversation_history(channel_id)
-            
-            # Prepare messages for the API
-            system_message = {
-                "role": "system",
-                "content": "You are Hinata, a friendly and helpful Discord bot. You are cheerful, supportive, and love to help users. You can generate images and chat with users. Keep your responses conversational and engaging, but not too long. Use emojis occasionally to show personality. You are in a Discord server, so keep responses appropriate for a community setting."
-            }
-            
-            messages = [system_message] + history
-            
-            # Make API call to OpenRouter
-            completion = self.openrouter_client.chat.completions.create(
-                extra_headers={
-                    "HTTP-Referer": "https://discord.com",
-                    "X-Title": "Hinata Discord Bot",
-                },
-                model="google/gemma-3n-e4b-it:free",
-                messages=messages,
-                max_tokens=500,
-                temperature=0.7
-            )
-            
-            response = completion.choices[0].message.content
+            history = await self.load_history(channel_id)
+            turn = f"{user_name}: {message_content}" if user_name else message_content
+            self.add_to_conversation(channel_id, "user", turn)
             
-            # Add bot response to conversation history
-            self.add_to_conversation(channel_id, "assistant", response)
+            # System prompt, rolling summary and the newest turns that fit the budget
+            messages = history.prompt(self.system_message)
+            response = await self._complete(messages, max_tokens=500, temperature=0.7)
             
+            await self._remember_reply(channel_id, response)
             return response
             
         except Exception as e:
             print(f"Error generating chat response: {e}")
             return "Sorry, I'm having trouble thinking right now. Please try again later! 😅"
 
+    async def stream_chat_response(self, message_content: str, channel_id: int,
+                                   user_name: Optional[str]) -> AsyncIterator[str]:
+        """Generate a chat response using OpenRouter, yielding text as it arrives"""
+        if not self.openrouter_client:
+            yield "Sorry, I'm not configured for chat yet. Please set up the OpenRouter API key!"
+            return
+        
+        parts = []
+        try:
+            history = await self.load_history(channel_id)
+            turn = f"{user_name}: {message_content}" if user_name else message_content
+            self.add_to_conversation(channel_id, "user", turn)
+            
+            async for delta in self._stream(history.prompt(self.system_message), max_tokens=500, temperature=0.7):
+                parts.append(delta)
+                yield delta
+        except Exception as e:
+            print(f"Error streaming chat response: {e}")
+            if not parts:
+                yield "Sorry, I'm having trouble thinking right now. Please try again later! 😅"
+                return
+        
+        if parts:
+            await self._remember_reply(channel_id, "".join(parts))
+    
+    async def _remember_reply(self, channel_id: int, response: str):
+        # Add bot response to conversation history (the channel may have been evicted meanwhile)
+        history = await self.load_history(channel_id)
+        self.add_to_conversation(channel_id, "assistant", response)
+        
+        # Fold trimmed turns into the summary in the background
+        if history.folded and channel_id not in self.summary_tasks:
+            self.summary_tasks[channel_id] = asyncio.create_task(self.summarize(channel_id))
+    
+    @asynccontextmanager
+    async def _upstream_call(self, messages: List[Dict]):
+        """Concurrency limit, metrics and tracing around one OpenRouter call"""
+        async with self.request_semaphore:
+            self.inflight_requests += 1
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                with self.bot.tracer.span("openrouter.completion", model=self.model, messages=len(messages)) as span:
+                    yield span
+                outcome = "200"
+            finally:
+                self.inflight_requests -= 1
+                self.bot.metrics.upstream_latency.observe(
+                    time.perf_counter() - started, backend="openrouter", model=self.model, outcome=outcome
+                )
+    
+    async def _create(self, messages: List[Dict], max_tokens: int, temperature: float, stream: bool = False):
+        # Make async API call to OpenRouter without blocking the event loop
+        return await self.openrouter_client.chat.completions.create(
+            extra_headers={
+                "HTTP-Referer": "https://discord.com",
+                "X-Title": "Hinata Discord Bot",
+            },
+            model=self.model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=stream
+        )
+    
+    async def _complete(self, messages: List[Dict], max_tokens: int, temperature: float) -> str:
+        """Run one completion within the concurrency limit"""
+        async with self._upstream_call(messages):
+            completion = await self._create(messages, max_tokens, temperature)
+        return completion.choices[0].message.content
+    
+    async def _stream(self, messages: List[Dict], max_tokens: int, temperature: float) -> AsyncIterator[str]:
+        """Run one streamed completion within the concurrency limit, yielding text deltas"""
+        async with self._upstream_call(messages) as span:
+            started = time.perf_counter()
+            first_token = True
+            stream = await self._create(messages, max_tokens, temperature, stream=True)
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                if first_token:
+                    first_token = False
+                    time_to_first_token = time.perf_counter() - started
+                    span.set_attribute("first_token_ms", time_to_first_token * 1000)
+                    self.bot.metrics.chat_first_token.observe(time_to_first_token, model=self.model)
+                yield delta
+    
+    async def summarize(self, channel_id: int):
+        """Merge trimmed messages into the channel's rolling summary"""
+        try:
+            history = await self.load_history(channel_id)
+            folded, history.folded = history.folded, []
+            if not folded:
+                return
+            
+            transcript = "\n".join(f"{message['role']}: {message['content']}" for message in folded)
+            if history.summary:
+                transcript = f"Current summary: {history.summary}\n\nNew messages:\n{transcript}"
+            
+            try:
+                summary = await self._complete([
+                    {"role": "system", "content": SUMMARY_PROMPT.format(words=self.summary_max_words)},
+                    {"role": "user", "content": transcript},
+                ], max_tokens=self.summary_max_words * 2, temperature=0.3)
+            except Exception as e:
+                print(f"Error summarizing conversation: {e}")
+                history.folded[:0] = folded
+                return
+            
+            # The channel may have been cleared or evicted while the summary was generated
+            history.set_summary(summary.strip())
+            if self.conversation_history.get(channel_id) is history or self.evicted.get(channel_id) is history:
+                self.dirty.add(channel_id)
+        finally:
+            self.summary_tasks.pop(channel_id, None)
+
+def split_message(text: str, limit: int = DISCORD_MESSAGE_LIMIT) -> List[str]:
+    """Split text into Discord-sized chunks, preferring line and word boundaries"""
+    chunks = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = text.rfind(" ", 0, limit)
+        if cut <= 0:
+            cut = limit
+        chunks.append(text[:cut])
+        text = text[cut:].lstrip()
+    if text or not chunks:
+        chunks.append(text)
+    return chunks
+
+
+class StreamingReply:
+    """Shows a streamed reply as Discord messages that are edited as text arrives
+
+    The first message is posted once the first sentence is complete; after that
+    messages are edited at most once per interval to stay clear of rate limits.
+    Text past 2000 characters continues in follow-up messages.
+    """
+    
+    def __init__(self, bot, message: discord.Message, edit_interval: float):
+        self.bot = bot
+        self.message = message
+        self.edit_interval = edit_interval
+        self.text = ""
+        self.sent: List[discord.Message] = []
+        self.shown: List[str] = []
+        self.last_render = 0.0
+    
+    async def feed(self, delta: str):
+        self.text += delta
+        if not self.sent:
+            if SENTENCE_END.search(self.text):
+                await self._render()
+        elif time.perf_counter() - self.last_render >= self.edit_interval:
+            await self._render()
+    
+    async def finish(self) -> str:
+        """Show the complete text and return it"""
+        if self.text.strip():
+            await self._render()
+        return self.text
+    
+    async def _render(self):
+        self.last_render = time.perf_counter()
+        for index, chunk in enumerate(split_message(self.text.strip() or "…")):
+            if index < len(self.sent):
+                if self.shown[index] != chunk:
+                    with self.bot.track_discord("edit"):
+                        await self.sent[index].edit(content=chunk)
+                    self.shown[index] = chunk
+            else:
+                with self.bot.track_discord("send"):
+                    if self.sent:
+                        sent = await self.message.channel.send(chunk)
+                    else:
+                        sent = await self.message.reply(chunk)
+                self.sent.append(sent)
+                self.shown.append(chunk)
+
 class ChatCommands(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.chat_manager = ChatManager(bot)
+    
+    async def cog_load(self):
+        """Restore persisted chat state"""
+        await self.chat_manager.start()
+    
+    async def cog_unload(self):
+        """Save chat state and close the OpenRouter client's connection pool"""
+        await self.chat_manager.stop()
+        if self.chat_manager.openrouter_client:
+            await self.chat_manager.openrouter_client.close()
         
     @app_commands.command(name="activate", description="Activate Hinata in this channel for automatic responses")
     async def slash_activate(self, interaction: discord.Interaction):
@@ -0,0 +1,84 @@
+from collections import deque
+from typing import Dict, List, Optional, Union
+
+# Rough per-message framing cost (role, separators) added by chat templates
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)"""
+    return (len(text) + 3) // 4 + MESSAGE_OVERHEAD_TOKENS
+
+
+class ConversationHistory:
+    """Recent messages of one channel, trimmed to a token budget
+
+    Messages live in a deque with their token estimates so appends and trims
+    are O(1) and the running total never needs recounting. Messages trimmed
+    from the front are kept in `folded` until the rolling summary absorbs them.
+    """
+
+    def __init__(self, token_budget: int, max_messages: int, keep_folded: bool = False):
+        self.token_budget = token_budget
+        self.max_messages = max_messages
+        self.keep_folded = keep_folded
+        self.messages = deque()  # (message, tokens)
+        self.tokens = 0
+        self.summary: Optional[str] = None
+        self.summary_tokens = 0
+        self.folded: List[Dict] = []
+
+    @classmethod
+    def from_dict(cls, data: Optional[Union[Dict, List]], token_budget: int, max_messages: int,
+                  keep_folded: bool = False) -> "ConversationHistory":
+        """Rebuild a history from its stored form (older rows are plain message lists)"""
+        history = cls(token_budget, max_messages, keep_folded)
+        if isinstance(data, list):
+            data = {"messages": data}
+        data = data or {}
+        history.set_summary(data.get("summary"))
+        for message in data.get("messages", []):
+            history.append(message["role"], message["content"])
+        history.folded.clear()
+        return history
+
+    def to_dict(self) -> Dict:
+        return {
+            "messages": [message for message, _ in self.messages],
+            "summary": self.summary,
+        }
+
+    def __len__(self):
+        return len(self.messages)
+
+    def append(self, role: str, content: str):
+        """Add a message and drop the oldest ones that no longer fit"""
+        tokens = estimate_tokens(content)
+        self.messages.append(({"role": role, "content": content}, tokens))
+        self.tokens += tokens
+        self.trim()
+
+    def set_summary(self, summary: Optional[str]):
+        self.summary = summary or None
+        self.summary_tokens = estimate_tokens(summary) if summary else 0
+        self.trim()
+
+    def trim(self):
+        """Keep the newest messages within the budget (always at least the last one)"""
+        budget = self.token_budget - self.summary_tokens
+        while len(self.messages) > 1 and (self.tokens > budget or len(self.messages) > self.max_messages):
+            message, tokens = self.messages.popleft()
+            self.tokens -= tokens
+            if self.keep_folded:
+                self.folded.append(message)
+
+    def prompt(self, system_message: Dict) -> List[Dict]:
+        """Messages to send upstream: system prompt, rolling summary, then recent turns"""
+        messages = [system_message]
+        if self.summary:
+            messages.append({
+                "role": "system",
+                "content": f"Summary of the earlier conversation: {self.summary}"
+            })
+        messages.extend(message for message, _ in self.messages)
+        return messages
@@ -1,19 +1,27 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import urllib.parse
-import requests
-import asyncio
+import io
+import time
+from job_queue import BACKEND_POLLINATIONS, PRIORITY_HIGH, QueueFullError
+from image_cache import ImageCache
+from http_client import sniff_image_format
+from variants import MAX_VARIANTS, send_variants
 
 class ImageCommands(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
     @app_commands.command(name="generate", description="Generate an image from a text prompt")
-    @app_commands.describe(prompt="The text prompt to generate an image from")
-    async def slash_generate(self, interaction: discord.Interaction, prompt: str):
+    @app_commands.describe(
+        prompt="The text prompt to generate an image from",
+        count="How many variations to generate (shown as a grid)"
+    )
+    async def slash_generate(self, interaction: discord.Interaction, prompt: str,
+                             count: app_commands.Range[int, 1, MAX_VARIANTS] = 1):
         """Slash command for image generation"""
-        await interaction.response.defer()
+        with self.bot.track_discord("defer"):
+            await interaction.response.defer()
         
         # Log slash command usage
         if self.bot.discord_logger:
@@ -31,45 +39,93 @@ class ImageCommands(commands.Cog):
         
         # Clean and encode the prompt
         clean_prompt = prompt.strip()
-        encoded_prompt = urllib.parse.quote(clean_prompt)
+        
+        if count > 1:
+            def submit_variant(seed):
+                variant_url = self.bot.pollinations_image_url(clean_prompt, seed)
+                return self.bot.generation_queue.submit(
+                    BACKEND_POLLINATIONS,
+                    lambda: self.bot.postprocess_image(self.bot.query_pollinations(variant_url)),
+                    PRIORITY_HIGH,
+                    cache_key=ImageCache.make_key(clean_prompt, model=BACKEND_POLLINATIONS, seed=seed),
+                    guild_id=interaction.guild_id
+                )
+            
+            await send_variants(
+                self.bot, interaction, "generate", BACKEND_POLLINATIONS, clean_prompt, count, submit_variant
+            )
+            return
         
         # Create the image URL
-        image_url = f"https://image.pollinations.ai/prompt/{encoded_prompt}"
+        image_url = self.bot.pollinations_image_url(clean_prompt)
+        
+        # Queue the generation so upstream load stays bounded
+        started = time.perf_counter()
+        try:
+            job = await self.bot.generation_queue.submit(
+                BACKEND_POLLINATIONS,
+                lambda: self.bot.postprocess_image(self.bot.query_pollinations(image_url)),
+                PRIORITY_HIGH,
+                cache_key=ImageCache.make_key(clean_prompt, model=BACKEND_POLLINATIONS),
+                guild_id=interaction.guild_id
+            )
+        except QueueFullError:
+            busy_embed = discord.Embed(
+                title="⏳ I'm Busy!",
+                description="Too many images are being generated right now. Please try again in a moment!",
+                color=0xFF6B6B
+            )
+            busy_embed.set_footer(text="©️ 2025 Hinata. All rights reserved")
+            await interaction.followup.send(embed=busy_embed)
+            return
         
         # Create loading embed
         loading_embed = discord.Embed(
             title="🎨 Generating Image...",
-            description=f"**Prompt:** {clean_prompt}\n\nPlease wait while I create your image...",
+            description=f"**Prompt:** {clean_prompt}\n"
+                       f"**Queue Position:** {self.bot.generation_queue.position_label(job)}\n\n"
+                       "Please wait while I create your image...",
             color=0xFFD700
         )
         loading_embed.set_footer(text="©️ 2025 Hinata. All rights reserved")
         
-        await interaction.followup.send(embed=loading_embed)
+        with self.bot.track_discord("followup"):
+            await interaction.followup.send(embed=loading_embed)
         
         try:
-            # Use requests for synchronous HTTP call, run in executor to avoid blocking
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(None, lambda: requests.get(image_url, stream=True))
+            # Wait for the queued request (or cached image)
+            image_bytes = await job
             
-            if response.status_code == 200:
+            if image_bytes:
                 # Create success embed
                 success_embed = discord.Embed(
                     title="✨ Image Generated!",
                     description=f"**Prompt:** {clean_prompt}",
                     color=0x00FF00
                 )
-                success_embed.set_image(url=image_url)
+                # Upload the bytes we already fetched so Discord doesn't request the image again
+                filename = f"hinata_generate_{interaction.id}.{sniff_image_format(image_bytes) or 'jpeg'}"
+                success_embed.set_image(url=f"attachment://{filename}")
                 success_embed.set_footer(text="©️ 2025 Hinata. All rights reserved")
                 
-                await interaction.edit_original_response(embed=success_embed)
+                file = discord.File(io.BytesIO(image_bytes), filename=filename)
+                with self.bot.track_discord("upload"):
+                    await interaction.edit_original_response(embed=success_embed, attachments=[file])
+                latency = time.perf_counter() - started
+                self.bot.metrics.generation_latency.observe(
+                    latency, command="generate", backend=BACKEND_POLLINATIONS,
+                    outcome="cached" if job.cached else "success"
+                )
                 
                 # Log successful image generation
                 if self.bot.discord_logger:
                     await self.bot.discord_logger.log_image_generation(
-                        interaction.user, interaction.guild, interaction.channel, clean_prompt, True
+                        interaction.user, interaction.guild, interaction.channel, clean_prompt, True,
+                        latency=latency, backend=BACKEND_POLLINATIONS,
+                        cache_hit=job.cached, size_bytes=len(image_bytes)
                     )
             else:
-                raise Exception(f"HTTP {response.status_code}")
+                raise Exception("Failed to generate image")
                         
         except Exception as e:
             # Create error embed
@@ -81,12 +137,18 @@ class ImageCommands(commands.Cog):
             )
             error_embed.set_footer(text="©️ 2025 Hinata. All rights reserved")
             
-            await interaction.edit_original_response(embed=error_embed)
+            with self.bot.track_discord("edit"):
+                await interaction.edit_original_response(embed=error_embed)
+            latency = time.perf_counter() - started
+            self.bot.metrics.generation_latency.observe(
+                latency, command="generate", backend=BACKEND_POLLINATIONS, outcome="failure"
+            )
             
             # Log failed image generation
             if self.bot.discord_logger:
                 await self.bot.discord_logger.log_image_generation(
-                    interaction.user, interaction.guild, interaction.channel, clean_prompt, False
+                    interaction.user, interaction.guild, interaction.channel, clean_prompt, False,
+                    latency=latency, backend=BACKEND_POLLINATIONS
                 )
 
     @commands.command(name="generate", aliases=["gen", "img", "image"])
@@ -125,8 +187,8 @@ class ImageCommands(commands.Cog):
         
         embed.add_field(
             name="📝 Slash Commands",
-            value="`/generate <prompt>` - Generate an image\n"
-                  "`/imgen <prompt>` - Advanced image generation\n"
+            value="`/generate <prompt> [count]` - Generate an image (or up to 4 variations)\n"
+                  "`/imgen <prompt> [count]` - Advanced image generation\n"
                   "`/vidgen <prompt>` - Video generation (Premium)\n"
                   "`/activate` - Activate chat mode in this channel\n"
                   "`/deactivate` - Deactivate chat mode\n"
@@ -188,8 +250,8 @@ class ImageCommands(commands.Cog):
         
         embed.add_field(
             name="📝 Slash Commands",
-            value="`/generate <prompt>` - Generate an image\n"
-                  "`/imgen <prompt>` - Advanced image generation\n"
+            value="`/generate <prompt> [count]` - Generate an image (or up to 4 variations)\n"
+                  "`/imgen <prompt> [count]` - Advanced image generation\n"
                   "`/vidgen <prompt>` - Video generation (Premium)\n"
                   "`/activate` - Activate chat mode in this channel\n"
                   "`/deactivate` - Deactivate chat mode\n"
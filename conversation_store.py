@@ -0,0 +1,134 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from data_dir import data_path
+
+# channel_id -> (is_active, stored history); None deletes the channel
+ChannelState = Optional[Tuple[bool, Dict]]
+
+
+class ConversationBackend:
+    """Base class for chat persistence; methods are only awaited off the message hot path"""
+    name = "backend"
+
+    async def start(self):
+        """Open connections and prepare storage"""
+
+    async def close(self):
+        """Release resources"""
+
+    async def load_active_channels(self) -> List[int]:
+        return []
+
+    async def load_history(self, channel_id: int) -> Optional[Dict]:
+        return None
+
+    async def write(self, changes: Dict[int, ChannelState]):
+        """Apply a batch of channel updates"""
+
+
+class MemoryBackend(ConversationBackend):
+    """No persistence; state is lost on restart"""
+    name = "memory"
+
+
+class SQLiteBackend(ConversationBackend):
+    """SQLite persistence; every query runs on one dedicated worker thread"""
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        self.retention_days = float(os.getenv('CHAT_STORE_RETENTION_DAYS', '7'))
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-store")
+        self.connection: Optional[sqlite3.Connection] = None
+
+    async def _run(self, fn, *args):
+        if self.connection is None and fn != self._open:
+            raise RuntimeError(f"Chat store {self.path} is not open; await ChatManager.start() first")
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, fn, *args)
+
+    async def start(self):
+        await self._run(self._open)
+
+    async def close(self):
+        if self.connection:
+            await self._run(self.connection.close)
+            self.connection = None
+        self.executor.shutdown(wait=True)
+
+    async def load_active_channels(self) -> List[int]:
+        return await self._run(self._load_active_channels)
+
+    async def load_history(self, channel_id: int) -> Optional[Dict]:
+        return await self._run(self._load_history, channel_id)
+
+    async def write(self, changes: Dict[int, ChannelState]):
+        await self._run(self._write, changes)
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS channels ("
+            "channel_id INTEGER PRIMARY KEY, active INTEGER NOT NULL, "
+            "history TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        # Forget idle, inactive channels so the database stays bounded
+        if self.retention_days > 0:
+            self.connection.execute(
+                "DELETE FROM channels WHERE active = 0 AND updated_at < ?",
+                (time.time() - self.retention_days * 86400,)
+            )
+        self.connection.commit()
+
+    def _load_active_channels(self) -> List[int]:
+        rows = self.connection.execute("SELECT channel_id FROM channels WHERE active = 1")
+        return [row[0] for row in rows]
+
+    def _load_history(self, channel_id: int) -> Optional[Dict]:
+        row = self.connection.execute(
+            "SELECT history FROM channels WHERE channel_id = ?", (channel_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _write(self, changes: Dict[int, ChannelState]):
+        now = time.time()
+        upserts = []
+        deletes = []
+        for channel_id, state in changes.items():
+            if state is None:
+                deletes.append((channel_id,))
+            else:
+                active, history = state
+                upserts.append((channel_id, int(active), json.dumps(history, ensure_ascii=False), now))
+
+        with self.connection:
+            if upserts:
+                self.connection.executemany(
+                    "INSERT INTO channels (channel_id, active, history, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(channel_id) DO UPDATE SET active = excluded.active, "
+                    "history = excluded.history, updated_at = excluded.updated_at",
+                    upserts
+                )
+            if deletes:
+                self.connection.executemany("DELETE FROM channels WHERE channel_id = ?", deletes)
+
+
+def create_backend() -> ConversationBackend:
+    """Backend selected by CHAT_STORE (sqlite or memory)"""
+    kind = os.getenv('CHAT_STORE', 'sqlite').lower()
+    if kind == 'memory':
+        return MemoryBackend()
+    if kind == 'sqlite':
+        return SQLiteBackend(os.getenv('CHAT_STORE_PATH', data_path('hinata_chat.db')))
+    raise ValueError(f"Unknown CHAT_STORE backend: {kind}")
@@ -0,0 +1,6 @@
+import os
+
+
+def data_path(filename: str) -> str:
+    """Default location of a state file, under DATA_DIR (./data unless set)"""
+    return os.path.join(os.getenv('DATA_DIR', 'data'), filename)
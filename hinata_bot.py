@@ -0,0 +1,716 @@
+import time
+
+# Taken before the heavy imports below so time-to-ready covers the whole boot
+BOOT_STARTED = time.monotonic()
+
+import discord
+from discord.ext import commands
+from discord import app_commands
+import os
+import asyncio
+from dotenv import load_dotenv
+import urllib.parse
+import io
+import math
+import json
+import hashlib
+import importlib
+from datetime import datetime, timezone
+from contextlib import contextmanager
+from job_queue import BACKEND_POLLINATIONS, QueueFullError
+from image_cache import ImageCache
+from http_client import PayloadRejected, sniff_image_format
+from metrics import MetricsRegistry
+from tracing import Tracer, current_span
+from chat import StreamingReply, split_message
+from data_dir import data_path
+
+# Load environment variables
+load_dotenv()
+
+# Bot configuration
+TOKEN = os.getenv("DISCORD_TOKEN")
+PREFIX = os.getenv("COMMAND_PREFIX", "%")
+POLLINATIONS_BASE_URL = os.getenv("POLLINATIONS_BASE_URL", "https://image.pollinations.ai").rstrip("/")
+
+# Sharding; launcher.py sets these for each cluster process
+SHARD_COUNT = os.getenv("SHARD_COUNT")
+SHARD_IDS = os.getenv("SHARD_IDS")
+CLUSTER_ID = os.getenv("CLUSTER_ID")
+
+# Fingerprint of the last command tree synced to Discord; delete the file to force a sync
+COMMAND_SYNC_STATE_PATH = os.getenv("COMMAND_SYNC_STATE_PATH", data_path("hinata_commands.json"))
+
+# Extensions load stage by stage. Extensions in a stage load concurrently, so during
+# setup they may only rely on extensions from earlier stages.
+EXTENSION_STAGES = [
+    ["metrics", "http_client", "image_cache", "image_processing", "rate_limit"],
+    # The collector span exporter uses the HTTP client
+    ["tracing", "job_queue", "logger"],
+    ["commands", "chat", "advanced_generation"],
+]
+
+# Shared services are set up from the modules this file and the cogs already import.
+# load_extension would execute a second copy of each, whose classes (QueueFullError,
+# PayloadRejected) and context variables (current_span) differ from the ones used here.
+SERVICE_MODULES = {"metrics", "http_client", "tracing", "image_cache", "image_processing", "job_queue", "rate_limit"}
+
+# Bot intents
+intents = discord.Intents.default()
+intents.message_content = True
+intents.guilds = True
+
+class HinataCommandTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction):
+        """Open a root span that the slash command runs under"""
+        # Autocomplete runs the check on every keystroke; only invocations are traced and counted
+        if interaction.command and interaction.type is discord.InteractionType.application_command:
+            span = self.client.tracer.start_span(
+                f"command {interaction.command.qualified_name}", root=True, kind="slash",
+                interaction_id=interaction.id,
+                gateway_delay_ms=(discord.utils.utcnow() - interaction.created_at).total_seconds() * 1000
+            )
+            interaction.extras["span"] = span
+            current_span.set(span)
+            
+            async def send_notice(**kwargs):
+                await interaction.response.send_message(ephemeral=True, **kwargs)
+            
+            # Variations are paid for up front, in the same check as the command itself
+            options = {option["name"]: option.get("value") for option in interaction.data.get("options", [])}
+            allowed = await self.client.check_rate_limit(
+                interaction.command.qualified_name, interaction.user, interaction.guild, send_notice,
+                cost=int(options.get("count") or 1)
+            )
+            if not allowed:
+                self.client.record_command(
+                    interaction.command.qualified_name, "slash", "rate_limited", interaction.created_at, span
+                )
+                return False
+        return True
+    
+    async def on_error(self, interaction, error):
+        """Count failed slash commands before the default error handling"""
+        if interaction.command:
+            self.client.record_command(
+                interaction.command.qualified_name, "slash", "failure", interaction.created_at,
+                interaction.extras.get("span")
+            )
+        await super().on_error(interaction, error)
+
+class HinataBot(commands.AutoShardedBot):
+    def __init__(self):
+        # Without SHARD_COUNT, Discord's recommended shard count is used and every shard runs here
+        super().__init__(
+            command_prefix=PREFIX,
+            intents=intents,
+            help_command=None,
+            case_insensitive=True,
+            tree_cls=HinataCommandTree,
+            shard_count=int(SHARD_COUNT) if SHARD_COUNT else None,
+            shard_ids=[int(shard_id) for shard_id in SHARD_IDS.split(",")] if SHARD_IDS else None
+        )
+        self.cluster_id = int(CLUSTER_ID) if CLUSTER_ID else None
+        # Only one cluster syncs the global command tree
+        self.sync_commands = os.getenv("SYNC_COMMANDS", "true").lower() == "true"
+        # Metrics are always collected; the metrics extension serves them over HTTP
+        self.metrics = MetricsRegistry()
+        self.metrics_server = None
+        # Spans are exported once the tracing extension attaches an exporter
+        self.tracer = Tracer()
+        self.discord_logger = None
+        self.chat_manager = None
+        self.http_client = None
+        self.generation_queue = None
+        self.image_cache = None
+        self.rate_limiter = None
+        self.image_processor = None
+        # Seconds spent in each startup phase, and from boot to the first on_ready
+        self.startup_phases = {}
+        self.ready_after = None
+        # Service modules in the order they were set up, for teardown on close
+        self.services = []
+        
+    async def setup_hook(self):
+        """Called when the bot is starting up"""
+        print(f"Setting up {self.user} (ID: {self.user.id})")
+        self.record_startup_phase("login", time.monotonic() - BOOT_STARTED)
+        
+        started = time.monotonic()
+        await self.load_extensions()
+        self.record_startup_phase("extensions", time.monotonic() - started)
+        
+        # Sync slash commands
+        if not self.sync_commands:
+            print("Skipping command sync (another cluster syncs commands)")
+            return
+        started = time.monotonic()
+        await self.sync_command_tree()
+        self.record_startup_phase("command_sync", time.monotonic() - started)
+
+    async def load_extensions(self):
+        """Load every extension, one stage at a time"""
+        for stage in EXTENSION_STAGES:
+            await asyncio.gather(*(self._load_extension_timed(name) for name in stage))
+        
+        # Get chat manager reference
+        chat_cog = self.get_cog("ChatCommands")
+        if chat_cog:
+            self.chat_manager = chat_cog.chat_manager
+
+    async def _load_extension_timed(self, name: str):
+        started = time.monotonic()
+        try:
+            if name in SERVICE_MODULES:
+                module = importlib.import_module(name)
+                await module.setup(self)
+                self.services.append(module)
+            else:
+                await self.load_extension(name)
+        except Exception as e:
+            print(f"Failed to load {name}: {e}")
+            return
+        print(f"Loaded {name} extension ({(time.monotonic() - started) * 1000:.0f}ms)")
+
+    async def close(self):
+        """Unload the cogs and disconnect, then stop services in reverse setup order"""
+        await super().close()
+        for module in reversed(self.services):
+            teardown = getattr(module, "teardown", None)
+            if teardown:
+                try:
+                    await teardown(self)
+                except Exception as e:
+                    print(f"Error stopping {module.__name__}: {e}")
+        self.services = []
+
+    def command_tree_fingerprint(self) -> str:
+        """Hash of the command payload a sync would upload, independent of registration order"""
+        payload = sorted(
+            (command.to_dict() for command in self.tree.get_commands()),
+            key=lambda command: (command.get("type", 1), command["name"])
+        )
+        data = json.dumps({"application_id": self.application_id, "commands": payload}, sort_keys=True)
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    async def sync_command_tree(self):
+        """Sync slash commands unless the tree is unchanged since the last successful sync
+
+        Discord rate limits syncing heavily, and restarts rarely change the commands.
+        """
+        fingerprint = self.command_tree_fingerprint()
+        try:
+            with open(COMMAND_SYNC_STATE_PATH, encoding="utf-8") as f:
+                previous = json.load(f).get("fingerprint")
+        except (OSError, ValueError, AttributeError):
+            previous = None
+        
+        if fingerprint == previous:
+            print("Command tree unchanged since the last sync; skipping sync")
+            return
+        
+        try:
+            synced = await self.tree.sync()
+            print(f"Synced {len(synced)} command(s)")
+        except Exception as e:
+            print(f"Failed to sync commands: {e}")
+            return
+        
+        # Only remember the fingerprint once Discord has accepted it
+        temp_path = f"{COMMAND_SYNC_STATE_PATH}.{os.getpid()}.tmp"
+        try:
+            directory = os.path.dirname(COMMAND_SYNC_STATE_PATH)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "fingerprint": fingerprint,
+                    "commands": len(synced),
+                    "synced_at": datetime.now(timezone.utc).isoformat()
+                }, f)
+            os.replace(temp_path, COMMAND_SYNC_STATE_PATH)
+        except OSError as e:
+            print(f"Failed to save command sync state: {e}")
+
+    def record_startup_phase(self, phase: str, seconds: float):
+        self.startup_phases[phase] = seconds
+        self.metrics.startup_duration.set(seconds, phase=phase)
+
+    def record_command(self, command_name: str, kind: str, outcome: str, created_at, span=None):
+        """Count a finished command and its latency since the user sent it"""
+        self.metrics.commands_total.inc(command=command_name, kind=kind, outcome=outcome)
+        latency = (discord.utils.utcnow() - created_at).total_seconds()
+        self.metrics.command_latency.observe(latency, command=command_name, outcome=outcome)
+        
+        if span:
+            if outcome == "failure":
+                span.status = "error"
+            self.tracer.finish(span)
+
+    async def postprocess_image(self, generation) -> bytes:
+        """Await a generation and re-encode its image for upload; runs inside the queued job so
+        cached and coalesced results are processed once"""
+        image_bytes = await generation
+        if not image_bytes or not self.image_processor:
+            return image_bytes
+        try:
+            return await self.image_processor.process(image_bytes)
+        except Exception as e:
+            print(f"Error processing image: {e}")
+            return image_bytes
+
+    @contextmanager
+    def track_discord(self, operation: str):
+        """Time a Discord API call for metrics and the current trace"""
+        with self.tracer.span(f"discord.{operation}"), self.metrics.discord_latency.time(operation=operation):
+            yield
+
+    async def invoke(self, ctx):
+        """Run prefix commands under a root span"""
+        if ctx.command is None:
+            await super().invoke(ctx)
+            return
+        
+        with self.tracer.span(
+            f"command {ctx.command.qualified_name}", root=True, kind="prefix", message_id=ctx.message.id,
+            gateway_delay_ms=(discord.utils.utcnow() - ctx.message.created_at).total_seconds() * 1000
+        ):
+            if not await self.check_rate_limit(ctx.command.qualified_name, ctx.author, ctx.guild, ctx.send):
+                self.record_command(ctx.command.qualified_name, "prefix", "rate_limited", ctx.message.created_at)
+                return
+            await super().invoke(ctx)
+
+    async def check_rate_limit(self, command_name: str, user, guild, send=None, cost: int = 1) -> bool:
+        """Spend `cost` requests from the caller's quota; tells them (once per wait) when they're over it"""
+        if not self.rate_limiter:
+            return True
+        
+        guild_id = guild.id if guild else None
+        result = await self.rate_limiter.check(command_name, user.id, guild_id, cost)
+        if result:
+            return True
+        
+        self.metrics.rate_limited.inc(command=command_name, scope=result.scope)
+        span = current_span.get()
+        if span:
+            span.set_attribute("rate_limited", result.scope)
+        
+        if send and self.rate_limiter.should_notify(command_name, user.id, guild_id, result):
+            wait = max(1, math.ceil(result.retry_after))
+            if result.scope == "guild":
+                description = (f"This server is making a lot of `{command_name}` requests right now. "
+                               f"Please try again in {wait}s!")
+            else:
+                description = f"You're sending `{command_name}` requests too quickly. Please try again in {wait}s!"
+            embed = discord.Embed(title="⏳ Slow Down!", description=description, color=0xFF6B6B)
+            embed.set_footer(text="©️ 2025 Hinata. All rights reserved")
+            try:
+                await send(embed=embed)
+            except discord.HTTPException as e:
+                print(f"Error sending rate limit notice: {e}")
+        return False
+
+    async def on_command_completion(self, ctx):
+        """Called after a prefix command finishes"""
+        self.record_command(ctx.command.qualified_name, "prefix", "success", ctx.message.created_at)
+
+    async def on_app_command_completion(self, interaction, command):
+        """Called after a slash command finishes"""
+        self.record_command(
+            command.qualified_name, "slash", "success", interaction.created_at, interaction.extras.get("span")
+        )
+
+    async def on_ready(self):
+        """Called when the bot is ready"""
+        print(f"{self.user} has awakened! 🌸")
+        print(f"Bot ID: {self.user.id}")
+        print(f"Prefix: {PREFIX}")
+        print(f"Shards: {sorted(self.shards)} of {self.shard_count}"
+              + (f" (cluster {self.cluster_id})" if self.cluster_id is not None else ""))
+        
+        # on_ready fires again after reconnects; only the first one measures startup
+        if self.ready_after is None:
+            self.ready_after = time.monotonic() - BOOT_STARTED
+            self.record_startup_phase("ready", self.ready_after)
+            print(f"Ready in {self.ready_after:.2f}s ("
+                  + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.startup_phases.items()
+                              if phase != "ready") + ")")
+        print("---")
+        
+        # Set bot status
+        activity = discord.Activity(
+            type=discord.ActivityType.watching,
+            name="for messages and image requests | /help"
+        )
+        await self.change_presence(activity=activity)
+        
+        # Log startup
+        if self.discord_logger:
+            await self.discord_logger.log_startup()
+
+    async def on_message(self, message):
+        """Handle messages for mentions, chat responses, and prefix commands"""
+        # Ignore messages from bots
+        if message.author.bot:
+            return
+        
+        # Check if bot is mentioned
+        if self.user in message.mentions:
+            with self.tracer.span("mention", root=True, message_id=message.id):
+                if await self.check_rate_limit("mention", message.author, message.guild, message.reply):
+                    await self.handle_mention(message)
+            return
+        
+        # Check if channel is active for chat
+        if self.chat_manager and self.chat_manager.is_channel_active(message.channel.id):
+            with self.tracer.span("chat", root=True, message_id=message.id):
+                if await self.check_rate_limit("chat", message.author, message.guild, message.reply):
+                    await self.handle_chat_message(message)
+            return
+            
+        # Process commands normally
+        await self.process_commands(message)
+    
+    async def handle_mention(self, message):
+        """Handle when the bot is mentioned"""
+        # Log the mention
+        if self.discord_logger:
+            await self.discord_logger.log_mention_response(
+                message.author, message.guild, message.channel, message.content
+            )
+        
+        # Extract the prompt from the message (remove the mention)
+        content = message.content
+        for mention in message.mentions:
+            content = content.replace(f"<@{mention.id}>", "").replace(f"<@!{mention.id}>", "")
+        
+        prompt = content.strip()
+        
+        if not prompt:
+            embed = discord.Embed(
+                title="Hi there! 👋",
+                description="I'm Hinata, your friendly assistant!\n\n"
+                           "**How to use me:**\n"
+                           f"• **Chat:** Mention me with a message or use `/activate` in a channel\n"
+                           f"• **Images:** Mention me with a prompt: `@{self.user.display_name} a cute cat`\n"
+                           f"• **Slash commands:** `/generate`, `/activate`, `/help`\n"
+                           f"• **Prefix commands:** `{PREFIX}generate`, `{PREFIX}activate`, `{PREFIX}help`",
+                color=0x7289DA
+            )
+            embed.set_footer(text="©️ 2025 Hinata. All rights reserved")
+            await message.reply(embed=embed)
+            return
+        
+        # Check if this looks like an image generation request
+        image_keywords = ["generate", "create", "make", "draw", "image", "picture", "art", "painting"]
+        is_image_request = any(keyword in prompt.lower() for keyword in image_keywords)
+        
+        if is_image_request or len(prompt.split()) > 10:  # Long prompts are likely image requests
+            # Generate image for the mentioned prompt
+            await self.generate_image_from_prompt(message, prompt, is_mention=True)
+        else:
+            # Generate chat response
+            if self.chat_manager:
+                await self.handle_chat_response(message, prompt)
+            else:
+                # Fallback if chat is not available
+                await self.generate_image_from_prompt(message, prompt, is_mention=True)
+    
+    async def handle_chat_message(self, message):
+        """Handle chat messages in active channels"""
+        if not self.chat_manager:
+            return
+        
+        # Generate chat response
+        await self.handle_chat_response(message, message.content)
+    
+    async def handle_chat_response(self, message, content):
+        """Queue a chat message; bursts in a channel are answered together"""
+        self.chat_manager.enqueue(
+            message.channel.id, (message, content, time.perf_counter()), self.respond_to_chat
+        )
+    
+    async def respond_to_chat(self, batch):
+        """Generate and send one chat response for a batch of (message, content, queued_at)"""
+        # Reply to the newest message; latency counts from the oldest one
+        message = batch[-1][0]
+        started = batch[0][2]
+        if len(batch) == 1:
+            content, user_name = batch[0][1], message.author.display_name
+        else:
+            content = "\n".join(f"{queued.author.display_name}: {text}" for queued, text, _ in batch)
+            user_name = None
+        
+        with self.tracer.span("chat.reply", root=True, channel_id=message.channel.id, messages=len(batch)):
+            await self._send_chat_response(message, content, user_name, started)
+    
+    async def _send_chat_response(self, message, content, user_name, started):
+        """Generate a reply to message and send it, streaming if enabled"""
+        try:
+            # Show typing indicator
+            if self.chat_manager.streaming:
+                # Post the first sentence right away and edit the rest in as it streams
+                reply = StreamingReply(self, message, self.chat_manager.stream_edit_interval)
+                async with message.channel.typing():
+                    async for delta in self.chat_manager.stream_chat_response(
+                        content, message.channel.id, user_name
+                    ):
+                        await reply.feed(delta)
+                    response = await reply.finish()
+            else:
+                async with message.channel.typing():
+                    response = await self.chat_manager.generate_chat_response(
+                        content, message.channel.id, user_name
+                    )
+                
+                if response:
+                    chunks = split_message(response)
+                    with self.track_discord("send"):
+                        await message.reply(chunks[0])
+                        for chunk in chunks[1:]:
+                            await message.channel.send(chunk)
+            
+            if response:
+                latency = time.perf_counter() - started
+                self.metrics.generation_latency.observe(
+                    latency, command="chat", backend="openrouter", outcome="success"
+                )
+                
+                # Log the chat response
+                if self.discord_logger:
+                    await self.discord_logger.log_chat_response(
+                        message.author, message.guild, message.channel, 
+                        content, len(response), latency=latency
+                    )
+        except Exception as e:
+            print(f"Error handling chat response: {e}")
+            self.metrics.generation_latency.observe(
+                time.perf_counter() - started, command="chat", backend="openrouter", outcome="failure"
+            )
+            if self.discord_logger:
+                await self.discord_logger.log_error(
+                    "Chat Response", str(e), 
+                    message.author, message.guild, message.channel
+                )
+    
+    async def on_guild_join(self, guild):
+        """Called when the bot joins a new guild"""
+        if self.discord_logger:
+            await self.discord_logger.log_guild_join(guild)
+    
+    async def on_guild_remove(self, guild):
+        """Called when the bot leaves a guild"""
+        if self.discord_logger:
+            await self.discord_logger.log_guild_remove(guild)
+    
+    async def on_command_error(self, ctx, error):
+        """Handle command errors"""
+        if ctx.command:
+            self.record_command(ctx.command.qualified_name, "prefix", "failure", ctx.message.created_at)
+            # Error events run with the command's span still current
+            span = current_span.get()
+            if span:
+                span.status = "error"
+                span.set_attribute("error", type(error).__name__)
+        
+        if self.discord_logger:
+            await self.discord_logger.log_error(
+                "Command Error", str(error),
+                ctx.author, ctx.guild, ctx.channel
+            )
+        
+        # Send user-friendly error message
+        if isinstance(error, commands.CommandNotFound):
+            return  # Ignore unknown commands
+        
+        embed = discord.Embed(
+            title="❌ Oops!",
+            description="Something went wrong while processing your command. Please try again!",
+            color=0xFF0000
+        )
+        embed.set_footer(text="©️ 2025 Hinata. All rights reserved")
+        await ctx.send(embed=embed)
+
+# Create bot instance
+bot = HinataBot()
+
+def pollinations_image_url(prompt: str, seed: int = None) -> str:
+    """Pollinations URL that renders an image for prompt (a fixed seed gives a repeatable variant)"""
+    url = f"{POLLINATIONS_BASE_URL}/prompt/{urllib.parse.quote(prompt)}"
+    if seed is not None:
+        url += f"?seed={seed}"
+    return url
+
+async def query_pollinations(image_url: str):
+    """Fetch a generated image from pollinations.ai using the shared connection pool"""
+    started = time.perf_counter()
+    try:
+        with bot.tracer.span("pollinations.request") as span:
+            response = await bot.http_client.fetch_image("GET", image_url)
+            span.set_attribute("status", response.status_code)
+            span.set_attribute("bytes", len(response.content))
+        bot.metrics.upstream_latency.observe(
+            time.perf_counter() - started,
+            backend=BACKEND_POLLINATIONS, model=BACKEND_POLLINATIONS, outcome=str(response.status_code)
+        )
+        
+        if response.status_code == 200:
+            return response.content
+        
+        print(f"Pollinations request failed: HTTP {response.status_code}")
+        return None
+        
+    except Exception as e:
+        bot.metrics.upstream_latency.observe(
+            time.perf_counter() - started, backend=BACKEND_POLLINATIONS, model=BACKEND_POLLINATIONS,
+            outcome="rejected" if isinstance(e, PayloadRejected) else "error"
+        )
+        print(f"Pollinations request error: {e}")
+        return None
+
+async def generate_image_from_prompt(ctx_or_message, prompt: str, is_mention: bool = False):
+    """Generate image from prompt using pollinations.ai API"""
+    if not prompt or not prompt.strip():
+        embed = discord.Embed(
+            title="❌ Error",
+            description="Please provide a prompt for image generation!",
+            color=0xFF0000
+        )
+        embed.set_footer(text="©️ 2025 Hinata. All rights reserved")
+        
+        if is_mention:
+            await ctx_or_message.reply(embed=embed)
+        else:
+            await ctx_or_message.send(embed=embed)
+        return
+    
+    # Clean and encode the prompt
+    clean_prompt = prompt.strip()
+    
+    # Create the image URL
+    image_url = pollinations_image_url(clean_prompt)
+    
+    # Queue the generation so upstream load stays bounded
+    command_name = "mention" if is_mention else "generate"
+    started = time.perf_counter()
+    try:
+        job = await bot.generation_queue.submit(
+            BACKEND_POLLINATIONS, lambda: bot.postprocess_image(query_pollinations(image_url)),
+            cache_key=ImageCache.make_key(clean_prompt, model=BACKEND_POLLINATIONS),
+            guild_id=ctx_or_message.guild.id if ctx_or_message.guild else None
+        )
+    except QueueFullError:
+        busy_embed = discord.Embed(
+            title="⏳ I'm Busy!",
+            description="Too many images are being generated right now. Please try again in a moment!",
+            color=0xFF6B6B
+        )
+        busy_embed.set_footer(text="©️ 2025 Hinata. All rights reserved")
+        
+        if is_mention:
+            await ctx_or_message.reply(embed=busy_embed)
+        else:
+            await ctx_or_message.send(embed=busy_embed)
+        return
+    
+    # Create loading embed
+    loading_embed = discord.Embed(
+        title="🎨 Generating Image...",
+        description=f"**Prompt:** {clean_prompt}\n"
+                   f"**Queue Position:** {bot.generation_queue.position_label(job)}\n\n"
+                   "Please wait while I create your image...",
+        color=0xFFD700
+    )
+    loading_embed.set_footer(text="©️ 2025 Hinata. All rights reserved")
+    
+    with bot.track_discord("send"):
+        if is_mention:
+            loading_message = await ctx_or_message.reply(embed=loading_embed)
+        else:
+            loading_message = await ctx_or_message.send(embed=loading_embed)
+    
+    try:
+        # Wait for the queued request (or cached image)
+        image_bytes = await job
+        
+        if image_bytes:
+            # Create success embed
+            success_embed = discord.Embed(
+                title="✨ Image Generated!",
+                description=f"**Prompt:** {clean_prompt}",
+                color=0x00FF00
+            )
+            # Upload the bytes we already fetched so Discord doesn't request the image again
+            filename = f"hinata_generate_{loading_message.id}.{sniff_image_format(image_bytes) or 'jpeg'}"
+            success_embed.set_image(url=f"attachment://{filename}")
+            success_embed.set_footer(text="©️ 2025 Hinata. All rights reserved")
+            
+            file = discord.File(io.BytesIO(image_bytes), filename=filename)
+            with bot.track_discord("upload"):
+                await loading_message.edit(embed=success_embed, attachments=[file])
+            latency = time.perf_counter() - started
+            bot.metrics.generation_latency.observe(
+                latency, command=command_name, backend=BACKEND_POLLINATIONS,
+                outcome="cached" if job.cached else "success"
+            )
+            
+            # Log successful image generation
+            if bot.discord_logger:
+                user = ctx_or_message.author if hasattr(ctx_or_message, "author") else ctx_or_message.user
+                guild = ctx_or_message.guild
+                channel = ctx_or_message.channel
+                await bot.discord_logger.log_image_generation(
+                    user, guild, channel, clean_prompt, True,
+                    latency=latency, backend=BACKEND_POLLINATIONS,
+                    cache_hit=job.cached, size_bytes=len(image_bytes)
+                )
+        else:
+            raise Exception("Failed to generate image")
+            
+    except Exception as e:
+        # Create error embed
+        error_embed = discord.Embed(
+            title="❌ Generation Failed",
+            description=f"Sorry, I couldn't generate an image for: **{clean_prompt}**\n\n"
+                       "Please try again with a different prompt.",
+            color=0xFF0000
+        )
+        error_embed.set_footer(text="©️ 2025 Hinata. All rights reserved")
+        
+        with bot.track_discord("edit"):
+            await loading_message.edit(embed=error_embed)
+        latency = time.perf_counter() - started
+        bot.metrics.generation_latency.observe(
+            latency, command=command_name, backend=BACKEND_POLLINATIONS, outcome="failure"
+        )
+        
+        # Log failed image generation
+        if bot.discord_logger:
+            user = ctx_or_message.author if hasattr(ctx_or_message, "author") else ctx_or_message.user
+            guild = ctx_or_message.guild
+            channel = ctx_or_message.channel
+            await bot.discord_logger.log_image_generation(
+                user, guild, channel, clean_prompt, False,
+                latency=latency, backend=BACKEND_POLLINATIONS
+            )
+
+# Add the functions to bot class
+bot.pollinations_image_url = pollinations_image_url
+bot.query_pollinations = query_pollinations
+bot.generate_image_from_prompt = generate_image_from_prompt
+
+def main():
+    """Run the bot until it is stopped (see bot.py)"""
+    if not TOKEN:
+        print("❌ Error: DISCORD_TOKEN not found in environment variables!")
+        print("Please create a .env file with your Discord bot token.")
+        exit(1)
+    
+    try:
+        bot.run(TOKEN)
+    except discord.LoginFailure:
+        print("❌ Error: Invalid Discord token!")
+    except Exception as e:
+        print(f"❌ Error starting bot: {e}")
+
+
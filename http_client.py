@@ -0,0 +1,171 @@
+import aiohttp
+import os
+from typing import Dict, Optional
+
+# Bytes read per chunk when streaming a body
+CHUNK_SIZE = 64 * 1024
+
+# Error bodies (JSON loading hints, HTML error pages) are only read this far
+ERROR_BODY_LIMIT = 64 * 1024
+
+# Content types that may carry an image; the first bytes decide
+IMAGE_CONTENT_TYPES = ("image/", "application/octet-stream", "binary/octet-stream")
+
+
+def sniff_image_format(data: bytes) -> Optional[str]:
+    """Detect the image format from its first bytes"""
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if data.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    return None
+
+
+class PayloadRejected(Exception):
+    """Raised when a streamed body is too large or is not an image"""
+
+
+class HTTPResponse:
+    """A fully-read HTTP response"""
+
+    def __init__(self, status: int, headers, content: bytes):
+        self.status_code = status
+        self.headers = headers
+        self.content = content
+
+
+class HTTPClient:
+    """Shared async HTTP client with keep-alive connection pooling"""
+
+    def __init__(self):
+        # Pool limits (0 means unlimited in aiohttp)
+        self.pool_size = int(os.getenv('HTTP_POOL_SIZE', '100'))
+        self.pool_size_per_host = int(os.getenv('HTTP_POOL_SIZE_PER_HOST', '20'))
+        self.keepalive_timeout = float(os.getenv('HTTP_KEEPALIVE_TIMEOUT', '60'))
+
+        # Default timeouts in seconds
+        self.connect_timeout = float(os.getenv('HTTP_CONNECT_TIMEOUT', '10'))
+        self.default_timeout = float(os.getenv('HTTP_TIMEOUT', '60'))
+
+        # Hard cap on generated image downloads
+        self.max_image_bytes = int(os.getenv('HTTP_MAX_IMAGE_BYTES', str(20 * 1024 * 1024)))
+
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self):
+        """Create the underlying session and connection pool"""
+        if self.session is not None and not self.session.closed:
+            return
+
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_size,
+            limit_per_host=self.pool_size_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=300
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.default_timeout, connect=self.connect_timeout)
+        )
+
+    async def close(self):
+        """Close the session and release pooled connections"""
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    def _timeout(self, timeout: Optional[float]) -> aiohttp.ClientTimeout:
+        return aiohttp.ClientTimeout(
+            total=timeout if timeout is not None else self.default_timeout,
+            connect=self.connect_timeout
+        )
+
+    async def request(self, method: str, url: str, headers: Optional[Dict[str, str]] = None,
+                      json=None, timeout: Optional[float] = None) -> HTTPResponse:
+        """Send a request over the shared pool and read the whole body"""
+        if self.session is None or self.session.closed:
+            await self.start()
+
+        async with self.session.request(
+            method, url, headers=headers, json=json, timeout=self._timeout(timeout)
+        ) as response:
+            content = await response.read()
+            return HTTPResponse(response.status, response.headers, content)
+
+    async def fetch_image(self, method: str, url: str, headers: Optional[Dict[str, str]] = None,
+                          json=None, timeout: Optional[float] = None,
+                          max_bytes: Optional[int] = None) -> HTTPResponse:
+        """Stream an image body into a preallocated buffer with a hard size cap
+
+        Raises PayloadRejected as soon as the content type, the declared length
+        or the first bytes show the body isn't an image that fits; the connection
+        is dropped without reading the rest. Non-200 bodies are returned
+        truncated so callers can still read error details.
+        """
+        if self.session is None or self.session.closed:
+            await self.start()
+        max_bytes = max_bytes or self.max_image_bytes
+
+        async with self.session.request(
+            method, url, headers=headers, json=json, timeout=self._timeout(timeout)
+        ) as response:
+            if response.status != 200:
+                content = await response.content.read(ERROR_BODY_LIMIT)
+                return HTTPResponse(response.status, response.headers, content)
+
+            content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            if content_type and not content_type.startswith(IMAGE_CONTENT_TYPES):
+                raise PayloadRejected(f"unexpected content type {content_type}")
+
+            declared = response.content_length
+            if declared is not None and declared > max_bytes:
+                raise PayloadRejected(f"body of {declared} bytes exceeds the {max_bytes} byte cap")
+
+            buffer = bytearray(declared if declared is not None else CHUNK_SIZE)
+            size = 0
+            sniffed = False
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                end = size + len(chunk)
+                if end > max_bytes:
+                    raise PayloadRejected(f"body exceeds the {max_bytes} byte cap")
+                if end > len(buffer):
+                    # Unknown (or wrong) length: grow geometrically up to the cap
+                    buffer.extend(bytes(min(max(len(buffer), end - len(buffer)), max_bytes - len(buffer))))
+                buffer[size:end] = chunk
+                size = end
+
+                if not sniffed and size >= 12:
+                    if sniff_image_format(bytes(buffer[:12])) is None:
+                        raise PayloadRejected("body is not a known image format")
+                    sniffed = True
+
+            if not sniffed:
+                raise PayloadRejected("body is not a known image format")
+            del buffer[size:]
+            # Callers get immutable bytes, like every other response body
+            return HTTPResponse(response.status, response.headers, bytes(buffer))
+
+    async def get(self, url: str, **kwargs) -> HTTPResponse:
+        """Send a GET request"""
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> HTTPResponse:
+        """Send a POST request"""
+        return await self.request("POST", url, **kwargs)
+
+
+async def setup(bot):
+    """Setup function for the shared HTTP client"""
+    bot.http_client = HTTPClient()
+    await bot.http_client.start()
+
+
+async def teardown(bot):
+    """Close the shared HTTP client when the extension is unloaded"""
+    if bot.http_client:
+        await bot.http_client.close()
+    bot.http_client = None
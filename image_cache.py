@@ -0,0 +1,206 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+class ImageCache:
+    """Content-addressed cache of generated images with an LRU memory tier and optional disk tier"""
+
+    def __init__(self):
+        self.ttl = float(os.getenv('IMAGE_CACHE_TTL', '3600'))
+        self.max_entries = int(os.getenv('IMAGE_CACHE_MAX_ENTRIES', '256'))
+        self.max_memory_bytes = int(os.getenv('IMAGE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+
+        # Disk tier is only enabled when a directory is configured
+        self.disk_dir = os.getenv('IMAGE_CACHE_DIR')
+        self.max_disk_bytes = int(os.getenv('IMAGE_CACHE_DISK_MAX_BYTES', str(1024 * 1024 * 1024)))
+
+        self.memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, image_bytes)
+        self.memory_bytes = 0
+        self.disk_index: "OrderedDict[str, int]" = OrderedDict()  # key -> size in bytes
+        self.disk_bytes = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(prompt: str, negative_prompt: Optional[str] = None, width: Optional[int] = None,
+                 height: Optional[int] = None, model: Optional[str] = None,
+                 seed: Optional[int] = None) -> str:
+        """Build a cache key from normalized generation parameters"""
+        def normalize(text):
+            return " ".join(text.lower().split()) if text else ""
+
+        params = {
+            "prompt": normalize(prompt),
+            "negative_prompt": normalize(negative_prompt),
+            "width": width,
+            "height": height,
+            "model": model,
+        }
+        # Only seeded variants carry a seed, so unseeded keys stay as they were
+        if seed is not None:
+            params["seed"] = seed
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+    async def start(self):
+        """Index any images already in the disk tier"""
+        if not self.disk_dir:
+            return
+        loop = asyncio.get_event_loop()
+        entries = await loop.run_in_executor(None, self._scan_disk)
+
+        # Oldest first so eviction order survives restarts
+        for _, key, size in entries:
+            self.disk_index[key] = size
+            self.disk_bytes += size
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Return a cached image, promoting disk hits into memory"""
+        entry = self.memory.get(key)
+        if entry is not None:
+            expires_at, image_bytes = entry
+            if expires_at > time.time():
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return image_bytes
+            self._evict_memory(key)
+
+        if self.disk_dir and key in self.disk_index:
+            loop = asyncio.get_event_loop()
+            image_bytes = await loop.run_in_executor(None, self._read_disk, key)
+            if image_bytes is not None:
+                self.disk_index.move_to_end(key)
+                self._store_memory(key, image_bytes)
+                self.hits += 1
+                self.disk_hits += 1
+                return image_bytes
+            self._forget_disk(key)
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, image_bytes: bytes):
+        """Store an image in memory and, if enabled, on disk"""
+        self._store_memory(key, image_bytes)
+
+        if self.disk_dir and len(image_bytes) <= self.max_disk_bytes:
+            loop = asyncio.get_event_loop()
+            try:
+                await loop.run_in_executor(None, self._write_disk, key, image_bytes)
+            except OSError as e:
+                print(f"Error writing image cache entry: {e}")
+                return
+
+            self._forget_disk(key)
+            self.disk_index[key] = len(image_bytes)
+            self.disk_bytes += len(image_bytes)
+
+            # Evict least recently used files until the disk tier fits its byte budget
+            evicted = []
+            while self.disk_bytes > self.max_disk_bytes and self.disk_index:
+                oldest_key, size = self.disk_index.popitem(last=False)
+                self.disk_bytes -= size
+                self.evictions += 1
+                evicted.append(oldest_key)
+            if evicted:
+                await loop.run_in_executor(None, self._unlink_disk, evicted)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and tier sizes"""
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory_bytes,
+            "disk_entries": len(self.disk_index),
+            "disk_bytes": self.disk_bytes,
+        }
+
+    def _store_memory(self, key: str, image_bytes: bytes):
+        if len(image_bytes) > self.max_memory_bytes:
+            return
+        if key in self.memory:
+            self._evict_memory(key)
+
+        self.memory[key] = (time.time() + self.ttl, image_bytes)
+        self.memory_bytes += len(image_bytes)
+
+        while len(self.memory) > self.max_entries or self.memory_bytes > self.max_memory_bytes:
+            oldest_key = next(iter(self.memory))
+            self._evict_memory(oldest_key)
+            self.evictions += 1
+
+    def _evict_memory(self, key: str):
+        _, image_bytes = self.memory.pop(key)
+        self.memory_bytes -= len(image_bytes)
+
+    def _forget_disk(self, key: str):
+        size = self.disk_index.pop(key, None)
+        if size is not None:
+            self.disk_bytes -= size
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.bin")
+
+    def _scan_disk(self):
+        """Cached files oldest first, after deleting the oldest ones beyond the byte budget"""
+        os.makedirs(self.disk_dir, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith(".bin"):
+                continue
+            stat = os.stat(os.path.join(self.disk_dir, name))
+            entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        entries.sort()
+
+        # The budget may have shrunk, or other processes may have filled the directory
+        total = sum(size for _, _, size in entries)
+        evicted = []
+        while total > self.max_disk_bytes and entries:
+            _, key, size = entries.pop(0)
+            total -= size
+            evicted.append(key)
+        self._unlink_disk(evicted)
+        self.evictions += len(evicted)
+        return entries
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        path = self._disk_path(key)
+        try:
+            if os.path.getmtime(path) + self.ttl <= time.time():
+                os.unlink(path)
+                return None
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_disk(self, key: str, image_bytes: bytes):
+        path = self._disk_path(key)
+        # Per-process temp file; cluster processes may share the cache directory
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(image_bytes)
+        os.replace(temp_path, path)
+
+    def _unlink_disk(self, keys):
+        for key in keys:
+            try:
+                os.unlink(self._disk_path(key))
+            except OSError:
+                pass
+
+
+async def setup(bot):
+    """Setup function for the image cache"""
+    bot.image_cache = ImageCache()
+    await bot.image_cache.start()
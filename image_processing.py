@@ -0,0 +1,222 @@
+import asyncio
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from PIL import Image
+
+# Smallest upload limit a Discord server can have; results that fit it fit everywhere
+DEFAULT_UPLOAD_LIMIT = 8 * 1024 * 1024
+
+FORMATS = {"webp": "WEBP", "jpeg": "JPEG", "png": "PNG"}
+
+# Grid tiles are downscaled to fit this box; 2x2 of them stays well under Discord's preview size
+DEFAULT_GRID_TILE_SIZE = 512
+GRID_GAP = 8
+GRID_BACKGROUND = (43, 45, 49)  # Discord's dark theme, so the gaps blend into the embed
+
+# Workers are forked from a server that has imported only this module (Pillow and the
+# standard library), so the functions below must not rely on anything else.
+
+
+def _encode(image: Image.Image, image_format: str, quality: int) -> bytes:
+    """Encode without metadata (Pillow only writes EXIF/ICC/text chunks when asked to)"""
+    buffer = io.BytesIO()
+    if image_format == "JPEG":
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
+    elif image_format == "WEBP":
+        image.save(buffer, format="WEBP", quality=quality, method=4)
+    else:
+        image.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def _load(image: Image.Image) -> Image.Image:
+    image.load()
+    if image.mode not in ("RGB", "RGBA"):
+        has_alpha = "A" in image.getbands() or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+    return image
+
+
+def process_image(data: bytes, image_format: str, quality: int, min_quality: int,
+                  max_bytes: int) -> Tuple[bytes, float]:
+    """Transcode to image_format within max_bytes; returns (image, CPU seconds)
+
+    Quality steps down to min_quality first, then the image is scaled down
+    until it fits. Animated images are passed through untouched.
+    """
+    started = time.process_time()
+    image = Image.open(io.BytesIO(data))
+    if getattr(image, "is_animated", False):
+        return data, time.process_time() - started
+
+    image = _load(image)
+    output = _encode(image, image_format, quality)
+    while len(output) > max_bytes and image_format != "PNG" and quality > min_quality:
+        quality = max(min_quality, quality - 10)
+        output = _encode(image, image_format, quality)
+    while len(output) > max_bytes and min(image.size) > 64:
+        width, height = image.size
+        image = image.resize((int(width * 0.8), int(height * 0.8)), Image.LANCZOS)
+        output = _encode(image, image_format, quality)
+    return output, time.process_time() - started
+
+
+def make_thumbnail(data: bytes, size: int, image_format: str) -> Tuple[bytes, float]:
+    """Small preview of an image; returns (thumbnail, CPU seconds)"""
+    started = time.process_time()
+    image = _load(Image.open(io.BytesIO(data)))
+    image.thumbnail((size, size), Image.LANCZOS)
+    return _encode(image, image_format, 75), time.process_time() - started
+
+
+def make_grid(images: List[bytes], tile_size: int, image_format: str, quality: int) -> Tuple[bytes, float]:
+    """Tile images left to right, top to bottom, two per row; returns (grid, CPU seconds)"""
+    started = time.process_time()
+    tiles = []
+    for data in images:
+        tile = _load(Image.open(io.BytesIO(data))).convert("RGB")
+        tile.thumbnail((tile_size, tile_size), Image.LANCZOS)
+        tiles.append(tile)
+
+    columns = min(2, len(tiles))
+    rows = -(-len(tiles) // columns)
+    cell_width = max(tile.width for tile in tiles)
+    cell_height = max(tile.height for tile in tiles)
+    grid = Image.new(
+        "RGB",
+        (columns * cell_width + (columns - 1) * GRID_GAP, rows * cell_height + (rows - 1) * GRID_GAP),
+        GRID_BACKGROUND
+    )
+    for index, tile in enumerate(tiles):
+        row, column = divmod(index, columns)
+        # Centre tiles of a different aspect ratio in their cell
+        grid.paste(tile, (
+            column * (cell_width + GRID_GAP) + (cell_width - tile.width) // 2,
+            row * (cell_height + GRID_GAP) + (cell_height - tile.height) // 2,
+        ))
+    return _encode(grid, image_format, quality), time.process_time() - started
+
+
+def _warm_up() -> int:
+    return os.getpid()
+
+
+def worker_context():
+    """Start method for pool workers
+
+    Neither forkserver nor spawn workers inherit the bot's sockets, threads or
+    event loop. The fork server imports Pillow once and forks every worker
+    from that, so workers start faster than spawned ones.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+class ImageProcessor:
+    """Runs Pillow encoding on a process pool so CPU-bound work never blocks the event loop"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.workers = int(os.getenv('IMAGE_PROCESS_WORKERS', str(max(1, (os.cpu_count() or 2) - 1))))
+        image_format = os.getenv('IMAGE_FORMAT', 'webp').lower()
+        if image_format not in FORMATS:
+            raise ValueError(f"Unknown IMAGE_FORMAT: {image_format}")
+        self.format = FORMATS[image_format]
+        self.quality = int(os.getenv('IMAGE_QUALITY', '85'))
+        self.min_quality = int(os.getenv('IMAGE_MIN_QUALITY', '40'))
+        self.max_bytes = int(os.getenv('IMAGE_MAX_UPLOAD_BYTES', str(DEFAULT_UPLOAD_LIMIT)))
+        self.thumbnail_size = int(os.getenv('IMAGE_THUMBNAIL_SIZE', '256'))
+        self.grid_tile_size = int(os.getenv('IMAGE_GRID_TILE_SIZE', str(DEFAULT_GRID_TILE_SIZE)))
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.warm_up_task: Optional[asyncio.Task] = None
+
+        # Counters
+        self.images_processed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+
+    async def start(self, wait: bool = True):
+        """Start the pool; with wait=False workers boot in the background and early jobs queue for them"""
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=worker_context())
+        self.warm_up_task = asyncio.create_task(self._warm_up())
+        if wait:
+            await self.warm_up_task
+
+    async def _warm_up(self):
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.executor, _warm_up) for _ in range(self.workers)))
+
+    async def stop(self):
+        if self.warm_up_task and not self.warm_up_task.done():
+            self.warm_up_task.cancel()
+        if self.executor:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    async def _run(self, operation: str, fn, *args) -> Tuple[bytes, float]:
+        loop = asyncio.get_running_loop()
+        with self.bot.tracer.span(f"image.{operation}"), \
+                self.bot.metrics.image_processing.time(operation=operation):
+            output, cpu_seconds = await loop.run_in_executor(self.executor, fn, *args)
+        self.cpu_seconds += cpu_seconds
+        return output, cpu_seconds
+
+    async def process(self, data: bytes, max_bytes: Optional[int] = None) -> bytes:
+        """Transcode a generated image, strip its metadata and fit it under the upload limit"""
+        output, _ = await self._run(
+            "process", process_image, data, self.format, self.quality, self.min_quality,
+            max_bytes or self.max_bytes
+        )
+        self.images_processed += 1
+        self.bytes_in += len(data)
+        self.bytes_out += len(output)
+        self.bot.metrics.image_bytes.inc(len(data), stage="generated")
+        self.bot.metrics.image_bytes.inc(len(output), stage="processed")
+        return output
+
+    async def thumbnail(self, data: bytes, size: Optional[int] = None) -> bytes:
+        """Small preview of an image"""
+        output, _ = await self._run("thumbnail", make_thumbnail, data, size or self.thumbnail_size, self.format)
+        return output
+
+    async def grid(self, images: List[bytes]) -> bytes:
+        """One image showing every variant, so several results cost a single upload"""
+        output, _ = await self._run("grid", make_grid, images, self.grid_tile_size, self.format, self.quality)
+        self.bot.metrics.image_bytes.inc(len(output), stage="grid")
+        return output
+
+    def stats(self) -> dict:
+        return {
+            "processed": self.images_processed,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "cpu_seconds": round(self.cpu_seconds, 3),
+        }
+
+
+async def setup(bot):
+    """Setup function for the image post-processing pool"""
+    if os.getenv('IMAGE_PROCESSING', 'true').lower() != 'true':
+        return
+    processor = ImageProcessor(bot)
+    # Booting the workers is the slowest part of startup and nothing needs them until the first image
+    await processor.start(wait=False)
+    bot.image_processor = processor
+
+
+async def teardown(bot):
+    """Shut the pool down when the extension is unloaded"""
+    if bot.image_processor:
+        await bot.image_processor.stop()
+    bot.image_processor = None
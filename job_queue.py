@@ -0,0 +1,373 @@
+import asyncio
+import contextlib
+import contextvars
+import itertools
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional, Set
+from tracing import current_span
+
+# Lower values run first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+BACKEND_POLLINATIONS = "pollinations"
+BACKEND_HUGGINGFACE = "huggingface"
+
+# Flow shared by requests made outside a guild (DMs)
+FLOW_DIRECT = "direct"
+
+
+class QueueFullError(Exception):
+    """Raised when a backend queue is at its depth limit"""
+
+
+class WorkerSlot:
+    """The worker and backend capacity held by a running job
+
+    Upstream attempts register with the slot; once the job has no attempt in
+    flight and is parked waiting to retry, the capacity is handed back to the
+    queue and it is reacquired before any attempt resumes.
+    """
+
+    def __init__(self, semaphores):
+        self.semaphores = semaphores
+        self.held = True
+        self.attempts = 0
+        self.parked = 0
+        self.lock = asyncio.Lock()
+
+    def release_if_idle(self):
+        if self.held and self.parked and not self.attempts:
+            for semaphore in self.semaphores:
+                semaphore.release()
+            self.held = False
+
+    async def reacquire(self):
+        async with self.lock:
+            if self.held:
+                return
+            acquired = []
+            try:
+                for semaphore in self.semaphores:
+                    await semaphore.acquire()
+                    acquired.append(semaphore)
+            except BaseException:
+                for semaphore in acquired:
+                    semaphore.release()
+                raise
+            self.held = True
+
+    def release(self):
+        if self.held:
+            for semaphore in self.semaphores:
+                semaphore.release()
+            self.held = False
+
+
+# Slot of the job running in the current task, inherited by tasks it spawns
+current_slot: contextvars.ContextVar = contextvars.ContextVar("generation_slot", default=None)
+
+
+class GenerationJob:
+    """A queued generation request"""
+
+    def __init__(self, backend: str, factory: Callable[[], Awaitable], priority: int, sequence: int,
+                 cache_key: Optional[str] = None, flow: str = FLOW_DIRECT):
+        self.backend = backend
+        self.factory = factory
+        self.priority = priority
+        self.sequence = sequence
+        self.cache_key = cache_key
+        # Guild the job is charged to and its virtual start time in that guild's share of the queue
+        self.flow = flow
+        self.start_tag = 0.0
+        self.cached = False
+        self.submitted_at = time.perf_counter()
+        # Span of the request that submitted the job; the work is traced under it
+        self.span = current_span.get()
+        self.future = asyncio.get_running_loop().create_future()
+
+        # Identical requests submitted while this job is in flight share its result
+        self.leader: Optional["GenerationJob"] = None
+        self.followers = []
+
+    @property
+    def abandoned(self) -> bool:
+        """True once nobody is waiting for this job's result any more"""
+        return self.future.done() and all(follower.future.done() for follower in self.followers)
+
+    @property
+    def sort_key(self):
+        return (self.priority, self.start_tag, self.sequence)
+
+    def __lt__(self, other):
+        return self.sort_key < other.sort_key
+
+    def __await__(self):
+        return self.future.__await__()
+
+
+def parse_guild_weights(value: str) -> Dict[str, float]:
+    """Parse "guild_id:weight,guild_id:weight" into a weight per flow"""
+    weights = {}
+    for entry in value.split(','):
+        if ':' in entry:
+            guild_id, weight = entry.split(':', 1)
+            if float(weight) > 0:
+                weights[guild_id.strip()] = float(weight)
+    return weights
+
+
+class GenerationQueue:
+    """Prioritized generation queue with a shared worker pool and per-backend caps
+
+    Within a priority level, guilds share each backend by weighted fair
+    queuing: every job gets a virtual start tag one 1/weight step after the
+    previous job of its guild (or at the backend's current virtual time if the
+    guild was idle), and jobs run in tag order. A guild with a burst of
+    requests therefore takes turns with everyone else instead of running ahead.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.max_workers = int(os.getenv('GEN_MAX_WORKERS', '8'))
+        self.max_queue_depth = int(os.getenv('GEN_MAX_QUEUE_DEPTH', '50'))
+        self.max_guild_queue_depth = int(os.getenv('GEN_MAX_GUILD_QUEUE_DEPTH', '10'))
+        self.guild_weights = parse_guild_weights(os.getenv('GEN_GUILD_WEIGHTS', ''))
+        self.backend_limits: Dict[str, int] = {
+            BACKEND_POLLINATIONS: int(os.getenv('GEN_POLLINATIONS_CONCURRENCY', '4')),
+            BACKEND_HUGGINGFACE: int(os.getenv('GEN_HUGGINGFACE_CONCURRENCY', '2')),
+        }
+
+        self.worker_semaphore = asyncio.Semaphore(self.max_workers)
+        self.backend_semaphores = {
+            backend: asyncio.Semaphore(limit) for backend, limit in self.backend_limits.items()
+        }
+        self.queues = {backend: asyncio.PriorityQueue() for backend in self.backend_limits}
+        self.pending: Dict[str, Set[GenerationJob]] = {backend: set() for backend in self.backend_limits}
+        self.inflight: Dict[str, GenerationJob] = {}  # cache_key -> leader job
+        # Weighted fair queuing state per backend
+        self.virtual_time: Dict[str, float] = {backend: 0.0 for backend in self.backend_limits}
+        self.flow_finish: Dict[str, Dict[str, float]] = {backend: {} for backend in self.backend_limits}
+        self.flow_pending: Dict[str, Dict[str, int]] = {backend: {} for backend in self.backend_limits}
+        self.coalesced = 0
+        self.running: Set[asyncio.Task] = set()
+        self.dispatchers = []
+        self._sequence = itertools.count()
+
+    def start(self):
+        """Start one dispatcher per backend"""
+        for backend in self.queues:
+            self.dispatchers.append(asyncio.create_task(self._dispatch(backend)))
+
+    async def stop(self):
+        """Stop dispatching and cancel anything still queued or running"""
+        for task in self.dispatchers + list(self.running):
+            task.cancel()
+        await asyncio.gather(*self.dispatchers, *self.running, return_exceptions=True)
+        self.dispatchers = []
+        for jobs in self.pending.values():
+            for job in jobs:
+                self._cancel(job)
+            jobs.clear()
+        self.inflight.clear()
+        for flows in self.flow_pending.values():
+            flows.clear()
+
+    async def submit(self, backend: str, factory: Callable[[], Awaitable], priority: int = PRIORITY_NORMAL,
+                     cache_key: Optional[str] = None, guild_id: Optional[int] = None) -> GenerationJob:
+        """Queue a generation; raises QueueFullError if the backend or the guild's share is saturated
+
+        When a cache key is given, cached images complete immediately without
+        taking a queue slot, identical in-flight requests are coalesced into a
+        single upstream call and successful results are stored in the cache.
+        """
+        flow = str(guild_id) if guild_id is not None else FLOW_DIRECT
+        job = GenerationJob(backend, factory, priority, next(self._sequence), cache_key, flow)
+
+        if cache_key and self.bot.image_cache:
+            cached = await self.bot.image_cache.get(cache_key)
+            if cached is not None:
+                if job.span:
+                    job.span.set_attribute("cache_hit", True)
+                job.cached = True
+                job.future.set_result(cached)
+                return job
+
+        if cache_key and cache_key in self.inflight:
+            leader = self.inflight[cache_key]
+            job.leader = leader
+            leader.followers.append(job)
+            self.coalesced += 1
+            if job.span:
+                job.span.set_attribute("coalesced", True)
+            return job
+
+        if len(self.pending[backend]) >= self.max_queue_depth:
+            raise QueueFullError(f"{backend} queue is full ({self.max_queue_depth} jobs waiting)")
+        flow_pending = self.flow_pending[backend]
+        if self.max_guild_queue_depth and flow_pending.get(flow, 0) >= self.max_guild_queue_depth:
+            raise QueueFullError(f"{backend} queue is full for {flow} ({self.max_guild_queue_depth} jobs waiting)")
+
+        # Start after this guild's previous job, or now if it has nothing queued
+        flow_finish = self.flow_finish[backend]
+        job.start_tag = max(self.virtual_time[backend], flow_finish.get(flow, 0.0))
+        flow_finish[flow] = job.start_tag + 1 / self.guild_weights.get(flow, 1.0)
+        flow_pending[flow] = flow_pending.get(flow, 0) + 1
+
+        self.pending[backend].add(job)
+        self.queues[backend].put_nowait(job)
+        if cache_key:
+            self.inflight[cache_key] = job
+        return job
+
+    def position(self, job: GenerationJob) -> int:
+        """Estimated position of a job in its queue (0 once it is running)"""
+        job = job.leader or job
+        if job not in self.pending[job.backend]:
+            return 0
+        return 1 + sum(1 for other in self.pending[job.backend] if other < job)
+
+    def position_label(self, job: GenerationJob) -> str:
+        """Human-readable queue position for loading embeds"""
+        if job.cached:
+            return "Cached ⚡"
+        position = self.position(job)
+        return f"#{position}" if position else "Generating now"
+
+    @contextlib.asynccontextmanager
+    async def attempt(self):
+        """Register an upstream call made by the running job so park() can free its slot"""
+        slot = current_slot.get()
+        if slot is None:
+            yield
+            return
+
+        await slot.reacquire()
+        slot.attempts += 1
+        try:
+            yield
+        finally:
+            slot.attempts -= 1
+            slot.release_if_idle()
+
+    async def park(self, delay: float):
+        """Sleep before a retry without holding a worker while every attempt is waiting"""
+        slot = current_slot.get()
+        if slot is None:
+            await asyncio.sleep(delay)
+            return
+
+        slot.parked += 1
+        slot.release_if_idle()
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            slot.parked -= 1
+        await slot.reacquire()
+
+    def depth(self, backend: str) -> int:
+        """Number of jobs waiting for a backend"""
+        return len(self.pending[backend])
+
+    def stats(self) -> Dict[str, int]:
+        """Queue depths, running jobs and coalescing counters"""
+        stats = {f"{backend}_depth": len(jobs) for backend, jobs in self.pending.items()}
+        stats["running"] = len(self.running)
+        stats["inflight_keys"] = len(self.inflight)
+        stats["coalesced"] = self.coalesced
+        return stats
+
+    async def _dispatch(self, backend: str):
+        queue = self.queues[backend]
+        backend_semaphore = self.backend_semaphores[backend]
+        while True:
+            # Hold the next job (it keeps its queue position) until both slots are free.
+            # Slots are never held while idle so parked jobs can always reacquire them.
+            job = await queue.get()
+            await backend_semaphore.acquire()
+            try:
+                await self.worker_semaphore.acquire()
+            except BaseException:
+                backend_semaphore.release()
+                raise
+            self._dequeued(job)
+
+            if job.abandoned:
+                self._finish(job)
+                backend_semaphore.release()
+                self.worker_semaphore.release()
+                continue
+
+            waited = time.perf_counter() - job.submitted_at
+            self.bot.metrics.queue_wait.observe(waited, backend=backend)
+            self.bot.tracer.record("queue.wait", waited, job.span, backend=backend, priority=job.priority)
+            task = asyncio.create_task(self._run(job, backend_semaphore))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+    async def _run(self, job: GenerationJob, backend_semaphore: asyncio.Semaphore):
+        slot = WorkerSlot((backend_semaphore, self.worker_semaphore))
+        current_slot.set(slot)
+        current_span.set(job.span)
+        try:
+            with self.bot.tracer.span("generate", backend=job.backend, followers=len(job.followers)):
+                result = await job.factory()
+            self._finish(job)
+            for waiter in [job] + job.followers:
+                if not waiter.future.done():
+                    waiter.future.set_result(result)
+            if result and job.cache_key and self.bot.image_cache:
+                await self.bot.image_cache.set(job.cache_key, result)
+        except asyncio.CancelledError:
+            self._finish(job)
+            self._cancel(job)
+            raise
+        except Exception as e:
+            self._finish(job)
+            for waiter in [job] + job.followers:
+                if not waiter.future.done():
+                    waiter.future.set_exception(e)
+        finally:
+            slot.release()
+
+    def _dequeued(self, job: GenerationJob):
+        backend = job.backend
+        self.pending[backend].discard(job)
+        flow_pending = self.flow_pending[backend]
+        flow_pending[job.flow] -= 1
+        if not flow_pending[job.flow]:
+            del flow_pending[job.flow]
+
+        # Virtual time follows the jobs being served; guilds whose share is
+        # already behind it have no queued work and restart from it
+        self.virtual_time[backend] = max(self.virtual_time[backend], job.start_tag)
+        flow_finish = self.flow_finish[backend]
+        if len(flow_finish) > 1024:
+            now = self.virtual_time[backend]
+            self.flow_finish[backend] = {flow: tag for flow, tag in flow_finish.items() if tag > now}
+
+    def _finish(self, job: GenerationJob):
+        # Later identical requests start a new flight (or hit the cache)
+        if job.cache_key and self.inflight.get(job.cache_key) is job:
+            del self.inflight[job.cache_key]
+
+    def _cancel(self, job: GenerationJob):
+        for waiter in [job] + job.followers:
+            if not waiter.future.done():
+                waiter.future.cancel()
+
+
+async def setup(bot):
+    """Setup function for the generation queue"""
+    bot.generation_queue = GenerationQueue(bot)
+    bot.generation_queue.start()
+
+
+async def teardown(bot):
+    """Stop the generation queue when the extension is unloaded"""
+    if bot.generation_queue:
+        await bot.generation_queue.stop()
+    bot.generation_queue = None
@@ -0,0 +1,182 @@
+"""Run HinataBot as several processes, each owning a contiguous range of shards
+
+    python launcher.py
+
+CLUSTER_COUNT bot processes are started with SHARD_COUNT shards between them
+(Discord's recommendation when unset). To spread clusters over several hosts,
+give every host the same SHARD_COUNT and CLUSTER_COUNT and choose the clusters
+it runs with CLUSTER_IDS (e.g. "0,1" on one host and "2,3" on the other).
+"""
+import asyncio
+import math
+import os
+import signal
+import sys
+import time
+from typing import Dict, List, Tuple
+
+import aiohttp
+from dotenv import load_dotenv
+
+DISCORD_API = "https://discord.com/api/v10"
+
+# Discord allows max_concurrency identifies per 5 seconds
+IDENTIFY_INTERVAL = 5
+
+# Clusters run bot.py from this directory, wherever the launcher was started from
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.py")
+
+
+async def fetch_gateway_info(token: str) -> Tuple[int, int]:
+    """Recommended shard count and identify concurrency for this bot"""
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{DISCORD_API}/gateway/bot", headers={"Authorization": f"Bot {token}"}) as response:
+            response.raise_for_status()
+            data = await response.json()
+    return data["shards"], data["session_start_limit"]["max_concurrency"]
+
+
+def shard_ranges(shard_count: int, cluster_count: int) -> List[List[int]]:
+    """Split shards into cluster_count contiguous, near-equal ranges"""
+    per_cluster, extra = divmod(shard_count, cluster_count)
+    ranges = []
+    start = 0
+    for cluster_id in range(cluster_count):
+        size = per_cluster + (1 if cluster_id < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+
+def parse_cluster_ids(value: str, cluster_count: int) -> List[int]:
+    """Parse CLUSTER_IDS ("0,1"); every id must name one of the cluster_count clusters"""
+    try:
+        cluster_ids = [int(cluster_id) for cluster_id in value.split(",") if cluster_id.strip()]
+    except ValueError:
+        raise ValueError(f"CLUSTER_IDS must be comma separated cluster numbers, got {value!r}") from None
+    invalid = [cluster_id for cluster_id in cluster_ids if not 0 <= cluster_id < cluster_count]
+    if invalid:
+        raise ValueError(
+            f"CLUSTER_IDS {', '.join(map(str, invalid))} out of range: "
+            f"there are {cluster_count} clusters (0-{cluster_count - 1})"
+        )
+    if not cluster_ids:
+        raise ValueError("CLUSTER_IDS is set but names no clusters")
+    return cluster_ids
+
+
+def per_cluster_path(path: str, cluster_id: int) -> str:
+    """hinata.jsonl -> hinata.cluster2.jsonl, so processes never share a rotating file"""
+    root, extension = os.path.splitext(path)
+    return f"{root}.cluster{cluster_id}{extension}"
+
+
+def cluster_environment(cluster_id: int, cluster_count: int, shard_count: int, shards: List[int]) -> Dict[str, str]:
+    env = dict(os.environ)
+    env["CLUSTER_ID"] = str(cluster_id)
+    env["CLUSTER_COUNT"] = str(cluster_count)
+    env["SHARD_COUNT"] = str(shard_count)
+    env["SHARD_IDS"] = ",".join(str(shard_id) for shard_id in shards)
+
+    # Commands are global, so the cluster with shard 0 syncs them for everyone
+    if os.getenv("SYNC_COMMANDS", "true").lower() == "true":
+        env["SYNC_COMMANDS"] = "true" if cluster_id == 0 else "false"
+
+    # Rate limits are per user across every guild, so clusters share buckets by default
+    env.setdefault("RATE_LIMIT_BACKEND", "sqlite")
+
+    metrics_port = int(os.getenv("METRICS_PORT", "9108"))
+    if metrics_port:
+        env["METRICS_PORT"] = str(metrics_port + cluster_id)
+    for name in ("LOG_JSONL_PATH", "TRACE_JSONL_PATH"):
+        if os.getenv(name):
+            env[name] = per_cluster_path(os.environ[name], cluster_id)
+    return env
+
+
+class ClusterLauncher:
+    """Starts one bot process per cluster and restarts any that exit"""
+
+    def __init__(self, shard_count: int, cluster_count: int, cluster_ids: List[int], max_concurrency: int):
+        self.shard_count = shard_count
+        self.cluster_count = cluster_count
+        self.cluster_ids = cluster_ids
+        self.max_concurrency = max_concurrency
+        self.restart_delay = float(os.getenv("LAUNCHER_RESTART_DELAY", "5"))
+        self.ranges = shard_ranges(shard_count, cluster_count)
+        self.processes: Dict[int, asyncio.subprocess.Process] = {}
+        self.stopping = False
+
+    def identify_time(self, cluster_id: int) -> float:
+        """Seconds a cluster needs to identify all of its shards"""
+        return math.ceil(len(self.ranges[cluster_id]) / self.max_concurrency) * IDENTIFY_INTERVAL
+
+    async def run(self):
+        tasks = []
+        for cluster_id in self.cluster_ids:
+            if self.stopping:
+                break
+            tasks.append(asyncio.create_task(self.supervise(cluster_id)))
+            # Stagger startups so clusters don't exceed the identify rate limit together
+            await asyncio.sleep(self.identify_time(cluster_id) + 1)
+        await asyncio.gather(*tasks)
+
+    async def supervise(self, cluster_id: int):
+        shards = self.ranges[cluster_id]
+        env = cluster_environment(cluster_id, self.cluster_count, self.shard_count, shards)
+        delay = self.restart_delay
+        while not self.stopping:
+            print(f"Starting cluster {cluster_id} (shards {shards[0]}-{shards[-1]})")
+            started = time.monotonic()
+            process = await asyncio.create_subprocess_exec(sys.executable, BOT_SCRIPT, env=env)
+            self.processes[cluster_id] = process
+            code = await process.wait()
+            del self.processes[cluster_id]
+            if self.stopping:
+                break
+
+            # Back off while a cluster keeps crashing right after startup
+            delay = self.restart_delay if time.monotonic() - started > 60 else min(delay * 2, 300)
+            print(f"Cluster {cluster_id} exited with code {code}; restarting in {delay:.0f}s")
+            await asyncio.sleep(delay)
+
+    def stop(self):
+        """Ask every cluster to shut down cleanly"""
+        if self.stopping:
+            return
+        self.stopping = True
+        print("Stopping clusters...")
+        for process in self.processes.values():
+            if process.returncode is None:
+                process.send_signal(signal.SIGINT)
+
+
+async def main():
+    load_dotenv()
+    token = os.getenv("DISCORD_TOKEN")
+    if not token:
+        print("❌ Error: DISCORD_TOKEN not found in environment variables!")
+        sys.exit(1)
+
+    recommended, max_concurrency = await fetch_gateway_info(token)
+    shard_count = int(os.getenv("SHARD_COUNT") or recommended)
+    cluster_count = min(int(os.getenv("CLUSTER_COUNT") or os.cpu_count() or 1), shard_count)
+    cluster_ids = list(range(cluster_count))
+    if os.getenv("CLUSTER_IDS"):
+        # CLUSTER_COUNT is capped at the shard count, which can leave ids chosen for another host out of range
+        try:
+            cluster_ids = parse_cluster_ids(os.environ["CLUSTER_IDS"], cluster_count)
+        except ValueError as e:
+            print(f"❌ Error: {e}")
+            sys.exit(1)
+
+    print(f"🌸 Launching {len(cluster_ids)} of {cluster_count} clusters for {shard_count} shards")
+    launcher = ClusterLauncher(shard_count, cluster_count, cluster_ids, max_concurrency)
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, launcher.stop)
+    await launcher.run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
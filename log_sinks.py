@@ -0,0 +1,367 @@
+import discord
+import asyncio
+import gzip
+import json
+import os
+import shutil
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import List, Optional
+
+# Discord accepts at most 10 embeds per message
+MAX_EMBEDS_PER_MESSAGE = 10
+
+
+@dataclass
+class LogRecord:
+    """A structured log event shared by every sink"""
+    timestamp: float
+    event_type: str
+    description: str
+    color: int = 0x7289DA
+    user_id: Optional[int] = None
+    user_name: Optional[str] = None
+    guild_id: Optional[int] = None
+    guild_name: Optional[str] = None
+    channel_id: Optional[int] = None
+    channel_name: Optional[str] = None
+    command: Optional[str] = None
+    success: Optional[bool] = None
+    latency_ms: Optional[float] = None
+    backend: Optional[str] = None
+    cache_hit: Optional[bool] = None
+    size_bytes: Optional[int] = None
+    error: Optional[str] = None
+    trace_id: Optional[str] = None
+    span_id: Optional[str] = None
+    cluster_id: Optional[int] = None
+
+    @classmethod
+    def create(cls, event_type: str, description: str, color: int = 0x7289DA,
+               user=None, guild=None, channel=None, **fields) -> "LogRecord":
+        """Build a record from Discord objects plus typed extra fields"""
+        return cls(
+            timestamp=time.time(),
+            event_type=event_type,
+            description=description,
+            color=color,
+            user_id=user.id if user else None,
+            user_name=f"{user.display_name} ({user.name}#{user.discriminator})" if user else None,
+            guild_id=guild.id if guild else None,
+            guild_name=guild.name if guild else None,
+            channel_id=channel.id if channel else None,
+            channel_name=getattr(channel, "name", None) if channel else None,
+            **fields
+        )
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class LogSink:
+    """Base class for log outputs; emit() must never block the event loop"""
+    name = "sink"
+
+    def start(self):
+        """Start any background work"""
+
+    async def stop(self):
+        """Flush and release resources"""
+
+    def emit(self, record: LogRecord):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {}
+
+
+class DiscordChannelSink(LogSink):
+    """Ships records as embeds to a Discord channel in rate-limit-friendly batches"""
+    name = "discord"
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.log_channel_id = int(os.getenv('LOG_CHANNEL_ID', '1387774689811628176'))
+        self.log_channel = None
+
+        # Events are queued and shipped in batches by a background flusher
+        self.flush_interval = float(os.getenv('LOG_FLUSH_INTERVAL', '2'))
+        self.log_queue: asyncio.Queue = asyncio.Queue(maxsize=int(os.getenv('LOG_QUEUE_SIZE', '1000')))
+        self.flusher_task: Optional[asyncio.Task] = None
+        # Embeds the flusher has taken off the queue but not handed to a send yet, and the send in flight
+        self.batch: List[discord.Embed] = []
+        self.sending: Optional[asyncio.Future] = None
+
+        # Counters
+        self.events_queued = 0
+        self.events_sent = 0
+        self.batches_sent = 0
+        self.events_overflowed = 0  # dropped because the queue was full
+        self.events_dropped = 0  # dropped because they couldn't be delivered
+
+    async def get_log_channel(self) -> Optional[discord.TextChannel]:
+        """Get the log channel"""
+        if self.log_channel is None:
+            try:
+                self.log_channel = self.bot.get_channel(self.log_channel_id)
+                if self.log_channel is None:
+                    self.log_channel = await self.bot.fetch_channel(self.log_channel_id)
+            except Exception as e:
+                print(f"Error getting log channel: {e}")
+                return None
+        return self.log_channel
+
+    def start(self):
+        """Start the background flusher"""
+        if self.flusher_task is None:
+            self.flusher_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the flusher and ship anything still queued"""
+        if self.flusher_task:
+            # Before Python 3.12, wait_for swallows a cancel that lands as its get() completes,
+            # leaving the flusher blocked on an empty queue; cancel until it sticks
+            while not self.flusher_task.done():
+                self.flusher_task.cancel()
+                await asyncio.wait([self.flusher_task], timeout=0.1)
+            self.flusher_task = None
+        if self.sending:
+            await self.sending
+            self.sending = None
+
+        batch, self.batch = self.batch, []
+        while batch or not self.log_queue.empty():
+            while len(batch) < MAX_EMBEDS_PER_MESSAGE and not self.log_queue.empty():
+                batch.append(self.log_queue.get_nowait())
+            await self._send_batch(batch)
+            batch = []
+
+    def emit(self, record: LogRecord):
+        try:
+            self.log_queue.put_nowait(self.format_embed(record))
+            self.events_queued += 1
+        except asyncio.QueueFull:
+            self.events_overflowed += 1
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.events_queued,
+            "sent": self.events_sent,
+            "batches": self.batches_sent,
+            "overflowed": self.events_overflowed,
+            "dropped": self.events_dropped,
+            "backlog": self.log_queue.qsize(),
+        }
+
+    def format_embed(self, record: LogRecord) -> discord.Embed:
+        """Render a record as a log embed"""
+        embed = discord.Embed(
+            title=f"🌸 {record.event_type}",
+            description=record.description,
+            color=record.color,
+            timestamp=datetime.utcfromtimestamp(record.timestamp)
+        )
+
+        # Add user information if provided
+        if record.user_id is not None:
+            embed.add_field(
+                name="👤 User",
+                value=f"{record.user_name}\nID: {record.user_id}",
+                inline=True
+            )
+
+        # Add guild information if provided
+        if record.guild_id is not None:
+            embed.add_field(
+                name="🏠 Server",
+                value=f"{record.guild_name}\nID: {record.guild_id}",
+                inline=True
+            )
+
+        # Add channel information if provided
+        if record.channel_id is not None:
+            embed.add_field(
+                name="📝 Channel",
+                value=f"#{record.channel_name}\nID: {record.channel_id}",
+                inline=True
+            )
+
+        footer = "Hinata Bot Logs"
+        if record.cluster_id is not None:
+            footer += f" • cluster {record.cluster_id}"
+        if record.trace_id:
+            footer += f" • trace {record.trace_id}"
+        embed.set_footer(text=footer)
+        return embed
+
+    async def _flush_loop(self):
+        """Pack queued embeds into messages, at most one send per flush interval"""
+        loop = asyncio.get_event_loop()
+        while True:
+            self.batch = [await self.log_queue.get()]
+            deadline = loop.time() + self.flush_interval
+
+            # Collect more events until the message is full or the interval ends
+            while len(self.batch) < MAX_EMBEDS_PER_MESSAGE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    self.batch.append(await asyncio.wait_for(self.log_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Shielded so stopping the flusher waits for the send instead of losing the batch
+            batch, self.batch = self.batch, []
+            self.sending = asyncio.ensure_future(self._send_batch(batch))
+            await asyncio.shield(self.sending)
+            self.sending = None
+
+            # Keep sends spaced out so logging never competes with the channel's rate limit
+            remaining = deadline - loop.time()
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+
+    async def _send_batch(self, batch):
+        """Send up to 10 embeds in a single message"""
+        try:
+            log_channel = await self.get_log_channel()
+            if not log_channel:
+                self.events_dropped += len(batch)
+                return
+
+            await log_channel.send(embeds=batch)
+            self.events_sent += len(batch)
+            self.batches_sent += 1
+
+        except Exception as e:
+            self.events_dropped += len(batch)
+            print(f"Error sending log batch: {e}")
+
+
+class JSONLSink(LogSink):
+    """Buffered JSON-lines file sink with size/time rotation and optional gzip"""
+    name = "jsonl"
+
+    def __init__(self, path: str):
+        self.path = path
+        self.max_bytes = int(os.getenv('LOG_JSONL_MAX_BYTES', str(100 * 1024 * 1024)))
+        self.rotate_seconds = float(os.getenv('LOG_JSONL_ROTATE_SECONDS', '86400'))
+        self.compress = os.getenv('LOG_JSONL_COMPRESS', 'false').lower() in ('1', 'true', 'yes')
+        self.flush_interval = float(os.getenv('LOG_JSONL_FLUSH_INTERVAL', '1'))
+        self.max_buffer = int(os.getenv('LOG_JSONL_BUFFER_SIZE', '100000'))
+
+        self.buffer: List[str] = []
+        self.file = None
+        self.file_opened_at = 0.0
+        self.flush_lock = asyncio.Lock()
+        self.flusher_task: Optional[asyncio.Task] = None
+
+        # Counters
+        self.records_written = 0
+        self.records_dropped = 0
+        self.rotations = 0
+
+    def start(self):
+        """Start the periodic flusher"""
+        if self.flusher_task is None:
+            self.flusher_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Flush the buffer and close the file"""
+        if self.flusher_task:
+            self.flusher_task.cancel()
+            try:
+                await self.flusher_task
+            except asyncio.CancelledError:
+                pass
+            self.flusher_task = None
+        await self.flush()
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def emit(self, record: LogRecord):
+        if len(self.buffer) >= self.max_buffer:
+            self.records_dropped += 1
+            return
+        self.buffer.append(json.dumps(record.to_dict(), ensure_ascii=False, default=str))
+
+    def stats(self) -> dict:
+        return {
+            "written": self.records_written,
+            "dropped": self.records_dropped,
+            "rotations": self.rotations,
+            "buffered": len(self.buffer),
+        }
+
+    async def flush(self):
+        """Write buffered lines from a worker thread"""
+        async with self.flush_lock:
+            if not self.buffer:
+                return
+            lines, self.buffer = self.buffer, []
+            loop = asyncio.get_event_loop()
+            try:
+                await loop.run_in_executor(None, self._write, lines)
+                self.records_written += len(lines)
+            except OSError as e:
+                self.records_dropped += len(lines)
+                print(f"Error writing JSONL logs: {e}")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def _write(self, lines: List[str]):
+        if self.file is not None and self._should_rotate():
+            self._rotate()
+        if self.file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.file = open(self.path, 'a', encoding='utf-8')
+            self.file_opened_at = self._started_at()
+
+        self.file.write("\n".join(lines) + "\n")
+        self.file.flush()
+
+    def _started_at(self) -> float:
+        """When the current file was started, so restarts don't reset the rotation clock"""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                first_line = f.readline()
+        except OSError:
+            return time.time()
+        if not first_line:
+            return time.time()
+        try:
+            return float(json.loads(first_line)["timestamp"])
+        except (ValueError, KeyError, TypeError):
+            return os.path.getmtime(self.path)
+
+    def _should_rotate(self) -> bool:
+        if self.file.tell() >= self.max_bytes:
+            return True
+        return time.time() - self.file_opened_at >= self.rotate_seconds
+
+    def _rotate(self):
+        self.file.close()
+        self.file = None
+
+        # Bursts can rotate more than once per timestamp; never replace an earlier segment
+        stamp = datetime.utcnow().strftime('%Y%m%d-%H%M%S-%f')
+        rotated_path = f"{self.path}.{stamp}"
+        suffix = 0
+        while os.path.exists(rotated_path) or os.path.exists(f"{rotated_path}.gz"):
+            suffix += 1
+            rotated_path = f"{self.path}.{stamp}-{suffix}"
+        os.replace(self.path, rotated_path)
+        self.rotations += 1
+
+        if self.compress:
+            with open(rotated_path, 'rb') as source, gzip.open(f"{rotated_path}.gz", 'wb') as target:
+                shutil.copyfileobj(source, target)
+            os.unlink(rotated_path)
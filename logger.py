@@ -1,74 +1,65 @@
 import discord
-from discord.ext import commands
 import os
-import asyncio
-from datetime import datetime
-from typing import Optional
+from typing import List, Optional
+from log_sinks import DiscordChannelSink, JSONLSink, LogRecord, LogSink
+from tracing import current_span
 
 class DiscordLogger:
     def __init__(self, bot):
         self.bot = bot
-        self.log_channel_id = int(os.getenv('LOG_CHANNEL_ID', '1387774689811628176'))
-        self.log_channel = None
         
-    async def get_log_channel(self) -> Optional[discord.TextChannel]:
-        """Get the log channel"""
-        if self.log_channel is None:
+        # The Discord log channel is one sink; others can be added with add_sink()
+        self.sinks: List[LogSink] = [DiscordChannelSink(bot)]
+        
+        jsonl_path = os.getenv('LOG_JSONL_PATH')
+        if jsonl_path:
+            self.sinks.append(JSONLSink(jsonl_path))
+    
+    def add_sink(self, sink: LogSink):
+        """Register another log output"""
+        self.sinks.append(sink)
+    
+    def start(self):
+        """Start every sink's background work"""
+        for sink in self.sinks:
+            sink.start()
+    
+    async def stop(self):
+        """Flush and close every sink"""
+        for sink in self.sinks:
             try:
-                self.log_channel = self.bot.get_channel(self.log_channel_id)
-                if self.log_channel is None:
-                    self.log_channel = await self.bot.fetch_channel(self.log_channel_id)
+                await sink.stop()
             except Exception as e:
-                print(f"Error getting log channel: {e}")
-                return None
-        return self.log_channel
+                print(f"Error stopping {sink.name} log sink: {e}")
+    
+    def stats(self) -> dict:
+        """Counters for each sink"""
+        return {sink.name: sink.stats() for sink in self.sinks}
     
     async def log_event(self, event_type: str, description: str, color: int = 0x7289DA, 
                        user: Optional[discord.User] = None, guild: Optional[discord.Guild] = None,
-                       channel: Optional[discord.TextChannel] = None):
-        """Log an event to the Discord log channel"""
+                       channel: Optional[discord.TextChannel] = None, **fields):
+        """Emit a structured event to every sink (returns immediately)"""
+        # Tie the event to the request being traced, if any
+        span = current_span.get()
+        if span:
+            fields.setdefault("trace_id", span.trace_id)
+            fields.setdefault("span_id", span.span_id)
+        # Several processes share the log channel when running as clusters
+        if self.bot.cluster_id is not None:
+            fields.setdefault("cluster_id", self.bot.cluster_id)
+        
         try:
-            log_channel = await self.get_log_channel()
-            if not log_channel:
-                return
-            
-            embed = discord.Embed(
-                title=f"🌸 {event_type}",
-                description=description,
-                color=color,
-                timestamp=datetime.utcnow()
-            )
-            
-            # Add user information if provided
-            if user:
-                embed.add_field(
-                    name="👤 User",
-                    value=f"{user.display_name} ({user.name}#{user.discriminator})\nID: {user.id}",
-                    inline=True
-                )
-            
-            # Add guild information if provided
-            if guild:
-                embed.add_field(
-                    name="🏠 Server",
-                    value=f"{guild.name}\nID: {guild.id}",
-                    inline=True
-                )
-            
-            # Add channel information if provided
-            if channel:
-                embed.add_field(
-                    name="📝 Channel",
-                    value=f"#{channel.name}\nID: {channel.id}",
-                    inline=True
-                )
-            
-            embed.set_footer(text="Hinata Bot Logs")
-            
-            await log_channel.send(embed=embed)
-            
+            record = LogRecord.create(event_type, description, color, user, guild, channel, **fields)
         except Exception as e:
             print(f"Error logging event: {e}")
+            return
+        
+        for sink in self.sinks:
+            try:
+                sink.emit(record)
+            except Exception as e:
+                print(f"Error logging event to {sink.name}: {e}")
     
     async def log_startup(self):
         """Log bot startup"""
@@ -76,7 +67,9 @@ class DiscordLogger:
             "Bot Started",
             f"Hinata has successfully started and is ready!\n"
             f"**Servers:** {len(self.bot.guilds)}\n"
-            f"**Users:** {len(self.bot.users)}",
+            f"**Users:** {len(self.bot.users)}\n"
+            f"**Shards:** {', '.join(str(shard_id) for shard_id in sorted(self.bot.shards))} of {self.bot.shard_count}\n"
+            f"**Ready in:** {self.bot.ready_after or 0:.1f}s",
             color=0x00FF00
         )
     
@@ -100,7 +93,9 @@ class DiscordLogger:
             color=color,
             user=ctx.author,
             guild=ctx.guild,
-            channel=ctx.channel
+            channel=ctx.channel,
+            command=command_name.split(" ", 1)[0],
+            success=success
         )
     
     async def log_slash_command_used(self, interaction, command_name: str, success: bool = True):
@@ -114,11 +109,15 @@ class DiscordLogger:
             color=color,
             user=interaction.user,
             guild=interaction.guild,
-            channel=interaction.channel
+            channel=interaction.channel,
+            command=command_name,
+            success=success
         )
     
-    async def log_image_generation(self, user, guild, channel, prompt: str, success: bool = True):
-        """Log image generation attempts"""
+    async def log_image_generation(self, user, guild, channel, prompt: str, success: bool = True,
+                                   latency: Optional[float] = None, backend: Optional[str] = None,
+                                   cache_hit: Optional[bool] = None, size_bytes: Optional[int] = None):
+        """Log image generation attempts (latency in seconds)"""
         color = 0x00FF00 if success else 0xFF0000
         status = "Success" if success else "Failed"
         
@@ -128,11 +127,17 @@ class DiscordLogger:
             color=color,
             user=user,
             guild=guild,
-            channel=channel
+            channel=channel,
+            success=success,
+            latency_ms=latency * 1000 if latency is not None else None,
+            backend=backend,
+            cache_hit=cache_hit,
+            size_bytes=size_bytes
         )
     
-    async def log_chat_response(self, user, guild, channel, message_content: str, response_length: int):
-        """Log chat responses"""
+    async def log_chat_response(self, user, guild, channel, message_content: str, response_length: int,
+                                latency: Optional[float] = None):
+        """Log chat responses (latency in seconds)"""
         await self.log_event(
             "Chat Response",
             f"**User Message:** {message_content[:100]}{'...' if len(message_content) > 100 else ''}\n"
@@ -140,7 +145,11 @@ class DiscordLogger:
             color=0x7289DA,
             user=user,
             guild=guild,
-            channel=channel
+            channel=channel,
+            success=True,
+            latency_ms=latency * 1000 if latency is not None else None,
+            backend="openrouter",
+            size_bytes=response_length
         )
     
     async def log_channel_activation(self, user, guild, channel, activated: bool):
@@ -154,7 +163,8 @@ class DiscordLogger:
             color=color,
             user=user,
             guild=guild,
-            channel=channel
+            channel=channel,
+            command="activate" if activated else "deactivate"
         )
     
     async def log_mention_response(self, user, guild, channel, message_content: str):
@@ -176,7 +186,9 @@ class DiscordLogger:
             color=0xFF0000,
             user=user,
             guild=guild,
-            channel=channel
+            channel=channel,
+            success=False,
+            error=error_type
         )
     
     async def log_guild_join(self, guild):
@@ -203,4 +215,11 @@ class DiscordLogger:
 async def setup(bot):
     """Setup function for the logger"""
     bot.discord_logger = DiscordLogger(bot)
+    bot.discord_logger.start()
+
+async def teardown(bot):
+    """Flush pending log events when the extension is unloaded"""
+    if bot.discord_logger:
+        await bot.discord_logger.stop()
+    bot.discord_logger = None
 
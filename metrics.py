@@ -0,0 +1,308 @@
+import bisect
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from aiohttp import web
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """Base class for labelled metrics"""
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+        return tuple((name, str(labels.get(name, ""))) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Monotonically increasing value"""
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def set(self, value: float, **labels):
+        """Mirror a cumulative count kept by another component"""
+        self.values[self._key(labels)] = value
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in self.values.items()]
+
+
+class Gauge(Metric):
+    """Value that can go up and down"""
+    type = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values: Dict[tuple, float] = {}
+
+    def set(self, value: float, **labels):
+        self.values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in self.values.items()]
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets"""
+    type = "histogram"
+
+    def __init__(self, *args, buckets=DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        self.counts: Dict[tuple, List[int]] = {}
+        self.sums: Dict[tuple, float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        if key not in self.counts:
+            self.counts[key] = [0] * (len(self.buckets) + 1)
+            self.sums[key] = 0.0
+        self.counts[key][bisect.bisect_left(self.buckets, value)] += 1
+        self.sums[key] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a block in seconds"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, counts in self.counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', _format_value(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(self.sums[key])}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """All of the bot's metrics, rendered in Prometheus text exposition format"""
+
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        self.collectors: List[Callable[[], None]] = []
+
+        # Commands
+        self.commands_total = self.counter(
+            "hinata_commands_total", "Commands handled", ("command", "kind", "outcome"))
+        self.command_latency = self.histogram(
+            "hinata_command_duration_seconds", "Time from the user's message or interaction to completion",
+            ("command", "outcome"))
+
+        # Image generations and chat replies, from request to delivered response
+        self.generation_latency = self.histogram(
+            "hinata_generation_duration_seconds", "End-to-end generation latency", ("command", "backend", "outcome"))
+
+        # Gateway
+        self.gateway_latency = self.gauge(
+            "hinata_gateway_latency_seconds", "Heartbeat latency per shard run by this process", ("shard",))
+
+        # Startup: login, extensions, command_sync, and ready (boot to the first on_ready)
+        self.startup_duration = self.gauge(
+            "hinata_startup_duration_seconds", "Seconds spent in each startup phase", ("phase",))
+
+        # Upstream APIs (pollinations, Hugging Face, OpenRouter)
+        self.upstream_latency = self.histogram(
+            "hinata_upstream_request_duration_seconds", "Upstream API request latency",
+            ("backend", "model", "outcome"))
+
+        # Discord API calls made while answering a command
+        self.discord_latency = self.histogram(
+            "hinata_discord_request_duration_seconds", "Discord API call latency", ("operation",))
+
+        # Generation queue
+        self.queue_wait = self.histogram(
+            "hinata_queue_wait_seconds", "Time jobs spend waiting for a worker", ("backend",))
+        self.queue_depth = self.gauge("hinata_queue_depth", "Jobs waiting per backend", ("backend",))
+        self.jobs_running = self.gauge("hinata_jobs_running", "Generation jobs currently running")
+        self.jobs_coalesced = self.counter(
+            "hinata_jobs_coalesced_total", "Requests that shared an identical in-flight job")
+
+        # Rate limiting
+        self.rate_limited = self.counter(
+            "hinata_rate_limited_total", "Requests rejected by the rate limiter", ("command", "scope"))
+
+        # Image post-processing
+        self.image_processing = self.histogram(
+            "hinata_image_processing_seconds", "Time to re-encode an image on the process pool", ("operation",),
+            buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+        self.image_bytes = self.counter(
+            "hinata_image_bytes_total", "Image bytes before and after post-processing", ("stage",))
+
+        # Image cache
+        self.cache_events = self.counter(
+            "hinata_image_cache_events_total", "Image cache lookups by result", ("result",))
+        self.cache_size = self.gauge(
+            "hinata_image_cache_bytes", "Bytes held by the image cache", ("tier",))
+
+        # Chat
+        self.chat_inflight = self.gauge("hinata_chat_inflight", "Chat completions in flight")
+        self.chat_coalesced = self.counter(
+            "hinata_chat_messages_coalesced_total", "Chat messages answered as part of another message's batch")
+        self.chat_first_token = self.histogram(
+            "hinata_chat_first_token_seconds", "Time until a streamed chat completion returns its first text",
+            ("model",))
+
+        # Logging
+        self.log_events = self.counter(
+            "hinata_log_events_total", "Log pipeline counters per sink", ("sink", "counter"))
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets=buckets))
+
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]):
+        """Register a callback that refreshes gauges right before each scrape"""
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"Error collecting metrics: {e}")
+
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def collect_bot_state(bot):
+    """Copy queue, cache, chat and logger state into gauges"""
+    metrics = bot.metrics
+
+    for shard_id, latency in bot.latencies:
+        # Latency is NaN until the shard's first heartbeat is acknowledged
+        if latency == latency:
+            metrics.gateway_latency.set(latency, shard=shard_id)
+
+    if bot.generation_queue:
+        for backend in bot.generation_queue.queues:
+            metrics.queue_depth.set(bot.generation_queue.depth(backend), backend=backend)
+        metrics.jobs_running.set(len(bot.generation_queue.running))
+        metrics.jobs_coalesced.set(bot.generation_queue.coalesced)
+
+    if bot.image_cache:
+        stats = bot.image_cache.stats()
+        metrics.cache_events.set(stats["hits"] - stats["disk_hits"], result="memory_hit")
+        metrics.cache_events.set(stats["disk_hits"], result="disk_hit")
+        metrics.cache_events.set(stats["misses"], result="miss")
+        metrics.cache_events.set(stats["evictions"], result="eviction")
+        metrics.cache_size.set(stats["memory_bytes"], tier="memory")
+        metrics.cache_size.set(stats["disk_bytes"], tier="disk")
+
+    if bot.chat_manager:
+        metrics.chat_inflight.set(bot.chat_manager.inflight_requests)
+        metrics.chat_coalesced.set(bot.chat_manager.messages_coalesced)
+
+    if bot.discord_logger:
+        for sink_name, counters in bot.discord_logger.stats().items():
+            for counter, value in counters.items():
+                metrics.log_events.set(value, sink=sink_name, counter=counter)
+
+
+class MetricsServer:
+    """Serves /metrics over HTTP on a local port"""
+
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+        self.host = os.getenv('METRICS_HOST', '127.0.0.1')
+        self.port = int(os.getenv('METRICS_PORT', '9108'))
+        self.runner: Optional[web.AppRunner] = None
+
+    async def handle_metrics(self, request):
+        return web.Response(
+            text=self.registry.render(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+        )
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle_metrics)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        print(f"Metrics available at http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+
+async def setup(bot):
+    """Setup function for the metrics exporter"""
+    bot.metrics.add_collector(lambda: collect_bot_state(bot))
+
+    # METRICS_PORT=0 keeps metrics in-process only
+    server = MetricsServer(bot.metrics)
+    if server.port:
+        await server.start()
+    bot.metrics_server = server
+
+
+async def teardown(bot):
+    """Stop the metrics exporter when the extension is unloaded"""
+    if bot.metrics_server:
+        await bot.metrics_server.stop()
+    bot.metrics_server = None
@@ -0,0 +1,120 @@
+import os
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+
+class ModelHealth:
+    """Rolling health statistics for one model endpoint"""
+
+    def __init__(self, window: int):
+        self.outcomes = deque(maxlen=window)  # True for success
+        self.latencies = deque(maxlen=window)  # seconds, successful calls only
+        self.consecutive_failures = 0
+        self.circuit_open_until = 0.0
+        self.loading_until = 0.0
+
+    @property
+    def success_rate(self) -> Optional[float]:
+        if not self.outcomes:
+            return None
+        return sum(self.outcomes) / len(self.outcomes)
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class ModelHealthTracker:
+    """Tracks model endpoint health and orders candidates by expected latency"""
+
+    def __init__(self):
+        self.window = int(os.getenv('HF_HEALTH_WINDOW', '20'))
+        self.failure_threshold = int(os.getenv('HF_CIRCUIT_FAILURES', '3'))
+        self.circuit_cooldown = float(os.getenv('HF_CIRCUIT_COOLDOWN', '120'))
+        # Assumed latency for models we have no data for yet
+        self.default_latency = float(os.getenv('HF_DEFAULT_LATENCY', '30'))
+        self.models: Dict[str, ModelHealth] = {}
+
+    def _get(self, model: str) -> ModelHealth:
+        if model not in self.models:
+            self.models[model] = ModelHealth(self.window)
+        return self.models[model]
+
+    def record_success(self, model: str, latency: float):
+        """Record a successful generation"""
+        health = self._get(model)
+        health.outcomes.append(True)
+        health.latencies.append(latency)
+        health.consecutive_failures = 0
+        health.circuit_open_until = 0.0
+        health.loading_until = 0.0
+
+    def record_failure(self, model: str, loading_for: Optional[float] = None):
+        """Record a failed call; loading_for marks the model as warming up for that many seconds"""
+        health = self._get(model)
+        health.outcomes.append(False)
+        health.consecutive_failures += 1
+
+        now = time.time()
+        if loading_for:
+            health.loading_until = now + loading_for
+        if health.consecutive_failures >= self.failure_threshold:
+            health.circuit_open_until = now + self.circuit_cooldown
+
+    def is_available(self, model: str) -> bool:
+        """False while the model's circuit breaker is open"""
+        health = self.models.get(model)
+        return health is None or health.circuit_open_until <= time.time()
+
+    def is_loading(self, model: str) -> bool:
+        health = self.models.get(model)
+        return health is not None and health.loading_until > time.time()
+
+    def expected_latency(self, model: str) -> float:
+        """Median latency inflated by the failure rate and any remaining load time"""
+        health = self.models.get(model)
+        if health is None:
+            return self.default_latency
+
+        latency = health.latency_percentile(50) or self.default_latency
+        success_rate = health.success_rate
+        if success_rate is not None:
+            latency /= max(success_rate, 0.05)
+        if self.is_loading(model):
+            latency += health.loading_until - time.time()
+        return latency
+
+    def rank(self, models: List[str]) -> List[str]:
+        """Order candidates by expected latency, skipping models with an open circuit
+
+        Ties keep the configured order. If every circuit is open the configured
+        order is returned so requests still have something to try.
+        """
+        available = [model for model in models if self.is_available(model)]
+        if not available:
+            return list(models)
+        return sorted(available, key=lambda model: (self.expected_latency(model), models.index(model)))
+
+    def routing_table(self, models: List[str]) -> List[Dict]:
+        """Current routing order with the health data behind it"""
+        table = []
+        ranked = self.rank(models)
+        for model in models:
+            health = self.models.get(model)
+            table.append({
+                "model": model,
+                "rank": ranked.index(model) + 1 if model in ranked else None,
+                "available": self.is_available(model),
+                "loading": self.is_loading(model),
+                "success_rate": health.success_rate if health else None,
+                "p50_latency": health.latency_percentile(50) if health else None,
+                "p95_latency": health.latency_percentile(95) if health else None,
+                "expected_latency": self.expected_latency(model),
+                "samples": len(health.outcomes) if health else 0,
+            })
+        table.sort(key=lambda row: (row["rank"] is None, row["rank"] or 0))
+        return table
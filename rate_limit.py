@@ -0,0 +1,293 @@
+import asyncio
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from data_dir import data_path
+
+# Default quotas as (requests, seconds); RATE_LIMIT_<COMMAND>_<SCOPE> overrides them
+DEFAULT_QUOTAS: Dict[str, Dict[str, str]] = {
+    "generate": {"user": "5/60", "guild": "30/60"},
+    "imgen": {"user": "3/60", "guild": "12/60"},
+    "vidgen": {"user": "3/60"},
+    "mention": {"user": "6/60", "guild": "40/60"},
+    "chat": {"user": "12/60", "guild": "60/60"},
+}
+
+SCOPES = ("user", "guild")
+
+# (key, capacity, refill per second)
+Bucket = Tuple[str, float, float]
+
+
+class Quota:
+    """Token bucket shape: up to `requests` at once, refilled over `seconds`"""
+
+    def __init__(self, requests: float, seconds: float):
+        self.requests = requests
+        self.seconds = seconds
+
+    @property
+    def rate(self) -> float:
+        return self.requests / self.seconds
+
+    @classmethod
+    def parse(cls, value: str) -> Optional["Quota"]:
+        """Parse "requests/seconds"; "0" or an empty value disables the bucket"""
+        value = value.strip()
+        if not value or value == "0":
+            return None
+        requests, _, seconds = value.partition("/")
+        quota = cls(float(requests), float(seconds or 60))
+        if quota.requests <= 0 or quota.seconds <= 0:
+            return None
+        return quota
+
+    def __str__(self):
+        return f"{self.requests:g}/{self.seconds:g}s"
+
+
+class RateLimitResult:
+    """Outcome of a limiter check"""
+
+    def __init__(self, allowed: bool, scope: Optional[str] = None, retry_after: float = 0.0):
+        self.allowed = allowed
+        self.scope = scope
+        self.retry_after = retry_after
+
+    def __bool__(self):
+        return self.allowed
+
+
+def refill(tokens: float, updated: float, capacity: float, rate: float, now: float) -> float:
+    return min(capacity, tokens + max(0.0, now - updated) * rate)
+
+
+class RateLimitBackend:
+    """Base class for bucket storage
+
+    take() must be atomic across all the given buckets: either every bucket
+    pays the cost or none does. It returns the index of the first bucket that
+    was short and the seconds until it can pay, or (None, 0) when allowed.
+    """
+    name = "backend"
+
+    async def start(self):
+        """Open connections and prepare storage"""
+
+    async def close(self):
+        """Release resources"""
+
+    async def take(self, buckets: List[Bucket], cost: float = 1) -> Tuple[Optional[int], float]:
+        raise NotImplementedError
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Buckets in a dict; limits apply per process"""
+    name = "memory"
+
+    def __init__(self):
+        self.buckets: Dict[str, Tuple[float, float]] = {}  # key -> (tokens, updated)
+        self.prune_threshold = 10000
+
+    async def take(self, buckets: List[Bucket], cost: float = 1) -> Tuple[Optional[int], float]:
+        return self.take_now(buckets, cost, time.monotonic())
+
+    def take_now(self, buckets: List[Bucket], cost: float, now: float) -> Tuple[Optional[int], float]:
+        levels = []
+        for index, (key, capacity, rate) in enumerate(buckets):
+            tokens, updated = self.buckets.get(key, (capacity, now))
+            tokens = refill(tokens, updated, capacity, rate, now)
+            if tokens < cost:
+                return index, (cost - tokens) / rate
+            levels.append(tokens)
+
+        for (key, _, _), tokens in zip(buckets, levels):
+            self.buckets[key] = (tokens - cost, now)
+        if len(self.buckets) > self.prune_threshold:
+            self._prune(now)
+        return None, 0.0
+
+    def _prune(self, now: float):
+        # A bucket idle long enough to be full again is the same as no bucket
+        self.buckets = {
+            key: (tokens, updated) for key, (tokens, updated) in self.buckets.items()
+            if now - updated < 3600
+        }
+
+
+class SQLiteRateLimitBackend(RateLimitBackend):
+    """Buckets in a SQLite file shared by every shard process on the host
+
+    Each check is one IMMEDIATE transaction, so concurrent processes serialize
+    on the database lock and never both spend the last token.
+    """
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rate-limit")
+        self.connection: Optional[sqlite3.Connection] = None
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, fn, *args)
+
+    async def start(self):
+        await self._run(self._open)
+
+    async def close(self):
+        if self.connection:
+            await self._run(self.connection.close)
+            self.connection = None
+        self.executor.shutdown(wait=True)
+
+    async def take(self, buckets: List[Bucket], cost: float = 1) -> Tuple[Optional[int], float]:
+        return await self._run(self._take, buckets, cost)
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Transactions are managed explicitly so BEGIN IMMEDIATE takes the write lock up front
+        self.connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self.connection.execute("DELETE FROM buckets WHERE updated_at < ?", (time.time() - 86400,))
+
+    def _take(self, buckets: List[Bucket], cost: float) -> Tuple[Optional[int], float]:
+        # Wall-clock time so every process agrees on refills
+        now = time.time()
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            levels = []
+            for index, (key, capacity, rate) in enumerate(buckets):
+                row = connection.execute(
+                    "SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)
+                ).fetchone()
+                tokens = refill(row[0], row[1], capacity, rate, now) if row else capacity
+                if tokens < cost:
+                    connection.execute("ROLLBACK")
+                    return index, (cost - tokens) / rate
+                levels.append(tokens)
+
+            connection.executemany(
+                "INSERT INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                [(key, tokens - cost, now) for (key, _, _), tokens in zip(buckets, levels)]
+            )
+            connection.execute("COMMIT")
+            return None, 0.0
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+
+
+def create_backend() -> RateLimitBackend:
+    """Backend selected by RATE_LIMIT_BACKEND (memory or sqlite)"""
+    kind = os.getenv('RATE_LIMIT_BACKEND', 'memory').lower()
+    if kind == 'memory':
+        return MemoryRateLimitBackend()
+    if kind == 'sqlite':
+        return SQLiteRateLimitBackend(os.getenv('RATE_LIMIT_PATH', data_path('hinata_ratelimit.db')))
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {kind}")
+
+
+class RateLimiter:
+    """Token-bucket limits per user and per guild for each command
+
+    A request must fit in every bucket that applies to it (its user's and its
+    guild's); nothing is spent when any of them is empty.
+    """
+
+    def __init__(self, backend: RateLimitBackend):
+        self.backend = backend
+        self.quotas: Dict[str, Dict[str, Quota]] = {}
+        for command, defaults in DEFAULT_QUOTAS.items():
+            for scope in SCOPES:
+                value = os.getenv(f'RATE_LIMIT_{command.upper()}_{scope.upper()}', defaults.get(scope, "0"))
+                quota = Quota.parse(value)
+                if quota:
+                    self.quotas.setdefault(command, {})[scope] = quota
+
+        # Only one "slow down" notice per bucket while it is empty
+        self.notice_until: Dict[str, float] = {}
+
+        # Counters
+        self.allowed = 0
+        self.limited = 0
+
+    def buckets(self, command: str, user_id: int, guild_id: Optional[int]) -> List[Tuple[str, Bucket]]:
+        quotas = self.quotas.get(command, {})
+        buckets = []
+        if "user" in quotas:
+            quota = quotas["user"]
+            buckets.append(("user", (f"{command}:user:{user_id}", quota.requests, quota.rate)))
+        if "guild" in quotas and guild_id is not None:
+            quota = quotas["guild"]
+            buckets.append(("guild", (f"{command}:guild:{guild_id}", quota.requests, quota.rate)))
+        return buckets
+
+    async def check(self, command: str, user_id: int, guild_id: Optional[int] = None,
+                    cost: int = 1) -> RateLimitResult:
+        """Spend `cost` requests from every bucket for this command, or report which one is short"""
+        buckets = self.buckets(command, user_id, guild_id)
+        if not buckets:
+            return RateLimitResult(True)
+
+        # A batch bigger than a bucket could never fit; let it empty a full bucket instead
+        cost = min(cost, min(capacity for _, (_, capacity, _) in buckets))
+        try:
+            index, retry_after = await self.backend.take([bucket for _, bucket in buckets], cost)
+        except Exception as e:
+            # Fail open: a broken store should not take the bot down with it
+            print(f"Error checking rate limit: {e}")
+            return RateLimitResult(True)
+
+        if index is None:
+            self.allowed += 1
+            return RateLimitResult(True)
+        self.limited += 1
+        return RateLimitResult(False, buckets[index][0], retry_after)
+
+    def should_notify(self, command: str, user_id: int, guild_id: Optional[int], result: RateLimitResult) -> bool:
+        """True for the first rejection of an empty bucket, so replies can't be used to spam"""
+        key = f"{command}:{result.scope}:{user_id if result.scope == 'user' else guild_id}"
+        now = time.monotonic()
+        if self.notice_until.get(key, 0) > now:
+            return False
+        if len(self.notice_until) > 10000:
+            self.notice_until = {k: until for k, until in self.notice_until.items() if until > now}
+        self.notice_until[key] = now + result.retry_after
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend.name,
+            "allowed": self.allowed,
+            "limited": self.limited,
+        }
+
+
+async def setup(bot):
+    """Setup function for the rate limiter"""
+    if os.getenv('RATE_LIMIT_ENABLED', 'true').lower() != 'true':
+        return
+    backend = create_backend()
+    await backend.start()
+    bot.rate_limiter = RateLimiter(backend)
+
+
+async def teardown(bot):
+    """Close the rate limiter store when the extension is unloaded"""
+    if bot.rate_limiter:
+        await bot.rate_limiter.backend.close()
+    bot.rate_limiter = None
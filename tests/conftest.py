@@ -0,0 +1,25 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Keep every service in memory and off the network while testing
+os.environ.update({
+    "METRICS_PORT": "0",
+    "CHAT_STORE": "memory",
+    "RATE_LIMIT_BACKEND": "memory",
+    "IMAGE_PROCESSING": "false",
+})
+
+from metrics import MetricsRegistry  # noqa: E402
+from tracing import Tracer  # noqa: E402
+
+
+@pytest.fixture
+def fake_bot():
+    """The attributes services read from the bot, without a Discord client"""
+    return SimpleNamespace(metrics=MetricsRegistry(), tracer=Tracer(), image_cache=None)
@@ -0,0 +1,163 @@
+import asyncio
+import contextlib
+from types import SimpleNamespace
+
+from chat import ChatManager, StreamingReply, split_message
+
+
+def test_short_text_is_one_chunk():
+    assert split_message("hi") == ["hi"]
+    assert split_message("") == [""]
+    assert split_message("a" * 2000) == ["a" * 2000]
+
+
+def test_split_prefers_newlines_over_spaces():
+    text = "a" * 1500 + "\n" + "b" * 300 + " " + "c" * 300
+    assert split_message(text) == ["a" * 1500, "b" * 300 + " " + "c" * 300]
+
+
+def test_split_falls_back_to_spaces():
+    text = "a" * 1990 + " " + "b" * 20
+    assert split_message(text) == ["a" * 1990, "b" * 20]
+
+
+def test_text_without_whitespace_is_cut_hard():
+    assert split_message("a" * 4500) == ["a" * 2000, "a" * 2000, "a" * 500]
+
+
+class Message:
+    def __init__(self, events, index=0):
+        self.events = events
+        self.index = index
+        self.channel = SimpleNamespace(send=self.send)
+
+    async def reply(self, content):
+        self.events.append(("reply", content))
+        return Message(self.events, 0)
+
+    async def send(self, content):
+        self.events.append(("send", content))
+        return Message(self.events, 1)
+
+    async def edit(self, content):
+        self.events.append(("edit", self.index, content))
+
+
+def test_streamed_reply_is_sent_edited_and_continued():
+    events = []
+    bot = SimpleNamespace(track_discord=lambda operation: contextlib.nullcontext())
+
+    async def scenario():
+        reply = StreamingReply(bot, Message(events), edit_interval=0)
+        await reply.feed("Hello")
+        # Nothing is shown until the first sentence is complete
+        assert events == []
+        await reply.feed(" there. How")
+        await reply.feed(" are you?")
+        await reply.feed(" " + "x" * 2000)
+        return await reply.finish()
+
+    text = asyncio.run(scenario())
+    assert text == "Hello there. How are you? " + "x" * 2000
+    assert events == [
+        ("reply", "Hello there. How"),
+        ("edit", 0, "Hello there. How are you?"),
+        # Past 2000 characters the text continues in a new message; unchanged chunks aren't edited
+        ("send", "x" * 2000),
+    ]
+
+
+def test_edits_wait_for_the_interval():
+    events = []
+    bot = SimpleNamespace(track_discord=lambda operation: contextlib.nullcontext())
+
+    async def scenario():
+        reply = StreamingReply(bot, Message(events), edit_interval=3600)
+        await reply.feed("Hi! ")
+        await reply.feed("More")
+        await reply.feed(" text")
+        await reply.finish()
+
+    asyncio.run(scenario())
+    assert events == [("reply", "Hi!"), ("edit", 0, "Hi! More text")]
+
+
+def make_manager(fake_bot, monkeypatch, **env):
+    for name, value in env.items():
+        monkeypatch.setenv(name, str(value))
+    return ChatManager(fake_bot)
+
+
+async def drain(manager):
+    while manager.channel_workers:
+        await asyncio.gather(*manager.channel_workers.values())
+
+
+def test_burst_is_answered_once(fake_bot, monkeypatch):
+    manager = make_manager(fake_bot, monkeypatch, CHAT_DEBOUNCE=0.1, CHAT_DEBOUNCE_MAX=5)
+    manager.activate_channel(1)
+    batches = []
+
+    async def respond(batch):
+        batches.append(batch)
+
+    async def scenario():
+        for item in range(3):
+            manager.enqueue(1, item, respond)
+            await asyncio.sleep(0.02)
+        await drain(manager)
+
+    asyncio.run(scenario())
+    assert batches == [[0, 1, 2]]
+    assert manager.messages_coalesced == 2
+    assert manager.pending_messages == {}
+
+
+def test_continuous_traffic_is_flushed_at_debounce_max(fake_bot, monkeypatch):
+    manager = make_manager(fake_bot, monkeypatch, CHAT_DEBOUNCE=0.1, CHAT_DEBOUNCE_MAX=0.2)
+    manager.activate_channel(1)
+    answered_at = []
+    batches = []
+
+    async def respond(batch):
+        answered_at.append(asyncio.get_running_loop().time())
+        batches.append(batch)
+
+    async def scenario():
+        started = asyncio.get_running_loop().time()
+        # Never quiet for a whole debounce window
+        for item in range(30):
+            manager.enqueue(1, item, respond)
+            await asyncio.sleep(0.03)
+        await drain(manager)
+        return started
+
+    started = asyncio.run(scenario())
+    assert answered_at[0] - started < 0.5
+    assert len(batches) >= 2
+    assert [item for batch in batches for item in batch] == list(range(30))
+
+
+def test_channels_are_answered_independently(fake_bot, monkeypatch):
+    manager = make_manager(fake_bot, monkeypatch)
+    answered = []
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def slow(batch):
+            await release.wait()
+            answered.append(1)
+
+        async def fast(batch):
+            answered.append(2)
+
+        # Channel 1's reply is stuck; channel 2 must not wait behind it
+        manager.enqueue(1, "a", slow)
+        manager.enqueue(2, "b", fast)
+        await asyncio.wait_for(manager.channel_workers[2], 1)
+        release.set()
+        await drain(manager)
+
+    asyncio.run(scenario())
+    assert answered == [2, 1]
@@ -0,0 +1,80 @@
+from chat_history import ConversationHistory, estimate_tokens
+
+SYSTEM = {"role": "system", "content": "You are Hinata"}
+
+
+def contents(history: ConversationHistory):
+    return [message["content"] for message in history.to_dict()["messages"]]
+
+
+def test_message_cap_drops_the_oldest():
+    history = ConversationHistory(token_budget=1000, max_messages=3)
+    for text in "abcde":
+        history.append("user", text)
+    assert contents(history) == ["c", "d", "e"]
+    assert history.tokens == 3 * estimate_tokens("a")
+
+
+def test_token_budget_drops_the_oldest():
+    # Each 40-character message costs 14 tokens, so two fit in 30
+    history = ConversationHistory(token_budget=30, max_messages=10)
+    for text in ("a" * 40, "b" * 40, "c" * 40):
+        history.append("user", text)
+    assert contents(history) == ["b" * 40, "c" * 40]
+    assert history.tokens == 28
+
+
+def test_newest_message_is_kept_even_over_budget():
+    history = ConversationHistory(token_budget=10, max_messages=10)
+    history.append("user", "short")
+    history.append("user", "x" * 400)
+    assert contents(history) == ["x" * 400]
+
+
+def test_trimmed_messages_are_folded_when_summarizing():
+    history = ConversationHistory(token_budget=1000, max_messages=2, keep_folded=True)
+    for text in "abc":
+        history.append("user", text)
+    assert history.folded == [{"role": "user", "content": "a"}]
+
+    plain = ConversationHistory(token_budget=1000, max_messages=2)
+    for text in "abc":
+        plain.append("user", text)
+    assert plain.folded == []
+
+
+def test_summary_is_prompted_and_shares_the_budget():
+    history = ConversationHistory(token_budget=30, max_messages=10)
+    history.append("user", "a" * 40)
+    history.append("assistant", "b" * 40)
+    # The summary's tokens come out of the same budget, so the oldest turn goes
+    history.set_summary("they talked about cats")
+    assert history.prompt(SYSTEM) == [
+        SYSTEM,
+        {"role": "system", "content": "Summary of the earlier conversation: they talked about cats"},
+        {"role": "assistant", "content": "b" * 40},
+    ]
+    history.set_summary("")
+    assert history.summary is None and history.prompt(SYSTEM)[1]["role"] == "assistant"
+
+
+def test_round_trip():
+    history = ConversationHistory(token_budget=1000, max_messages=10)
+    history.append("user", "hi")
+    history.append("assistant", "hello!")
+    history.set_summary("greetings")
+    restored = ConversationHistory.from_dict(history.to_dict(), 1000, 10, keep_folded=True)
+    assert restored.to_dict() == history.to_dict()
+    assert restored.tokens == history.tokens and restored.summary_tokens == history.summary_tokens
+
+
+def test_legacy_message_list_is_loaded_and_trimmed():
+    rows = [{"role": "user", "content": str(index)} for index in range(5)]
+    # Messages trimmed while loading were never part of the live window, so nothing is folded
+    restored = ConversationHistory.from_dict(rows, 1000, 3, keep_folded=True)
+    assert contents(restored) == ["2", "3", "4"]
+    assert restored.summary is None and restored.folded == []
+
+
+def test_empty_stored_history():
+    assert len(ConversationHistory.from_dict(None, 1000, 10)) == 0
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from chat import ChatManager
+from conversation_store import MemoryBackend
+
+
+class RecordingBackend(MemoryBackend):
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+
+    async def write(self, changes):
+        if self.fail:
+            raise OSError("disk full")
+        self.batches.append(changes)
+
+
+def make_manager(fake_bot, monkeypatch, **env):
+    for name, value in env.items():
+        monkeypatch.setenv(name, str(value))
+    return ChatManager(fake_bot)
+
+
+def test_changes_are_written_in_one_batch(fake_bot, monkeypatch):
+    async def scenario():
+        manager = make_manager(fake_bot, monkeypatch, CHAT_STORE_FLUSH_INTERVAL=3600)
+        manager.store = RecordingBackend()
+        await manager.start()
+        manager.activate_channel(1)
+        manager.add_to_conversation(1, "user", "hi")
+        manager.add_to_conversation(1, "assistant", "hello!")
+        manager.add_to_conversation(2, "user", "hey")
+        # Nothing reaches the store until the flush
+        assert manager.store.batches == []
+        await manager.stop()
+        return manager.store.batches
+
+    batches = asyncio.run(scenario())
+    assert len(batches) == 1
+    active, history = batches[0][1]
+    assert active and [message["content"] for message in history["messages"]] == ["hi", "hello!"]
+    assert batches[0][2][0] is False
+
+
+def test_evicted_channel_keeps_unflushed_messages(fake_bot, monkeypatch):
+    async def scenario():
+        manager = make_manager(fake_bot, monkeypatch, CHAT_HOT_CHANNELS=1, CHAT_STORE_FLUSH_INTERVAL=3600)
+        await manager.start()
+        manager.add_to_conversation(1, "user", "remember me")
+        manager.add_to_conversation(2, "user", "hey")
+        assert list(manager.conversation_history) == [2]
+        history = await manager.load_history(1)
+        await manager.stop()
+        return history.to_dict()["messages"]
+
+    assert [message["content"] for message in asyncio.run(scenario())] == ["remember me"]
+
+
+def test_failed_write_is_retried(fake_bot, monkeypatch):
+    async def scenario():
+        manager = make_manager(fake_bot, monkeypatch, CHAT_STORE_FLUSH_INTERVAL=3600)
+        manager.store = RecordingBackend(fail=True)
+        await manager.start()
+        manager.add_to_conversation(1, "user", "hi")
+        await manager.flush()
+        assert manager.dirty == {1}
+        manager.store.fail = False
+        await manager.stop()
+        return manager.store.batches
+
+    batches = asyncio.run(scenario())
+    assert [list(batch) for batch in batches] == [[1]]
+
+
+def test_sqlite_store_survives_a_restart(fake_bot, monkeypatch, tmp_path):
+    env = {"CHAT_STORE": "sqlite", "CHAT_STORE_PATH": tmp_path / "chat.db", "CHAT_STORE_FLUSH_INTERVAL": 3600}
+
+    async def scenario():
+        manager = make_manager(fake_bot, monkeypatch, **env)
+        await manager.start()
+        manager.activate_channel(1)
+        manager.add_to_conversation(1, "user", "hi")
+        await manager.stop()
+
+        restarted = make_manager(fake_bot, monkeypatch, **env)
+        await restarted.start()
+        history = await restarted.load_history(1)
+        active = restarted.is_channel_active(1)
+        await restarted.stop()
+        return active, history.to_dict()["messages"]
+
+    active, messages = asyncio.run(scenario())
+    assert active
+    assert [message["content"] for message in messages] == ["hi"]
+
+
+def test_unstarted_sqlite_store_fails_clearly(fake_bot, monkeypatch, tmp_path):
+    async def scenario():
+        manager = make_manager(fake_bot, monkeypatch, CHAT_STORE="sqlite", CHAT_STORE_PATH=tmp_path / "chat.db")
+        with pytest.raises(RuntimeError, match="start"):
+            await manager.load_history(1)
+
+    asyncio.run(scenario())
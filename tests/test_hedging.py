@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+from advanced_generation import AdvancedGenerationCommands
+
+
+def make_cog(fake_bot, monkeypatch, hedge_delay, responses):
+    """Cog whose model calls answer from `responses`: url -> (seconds, result)"""
+    monkeypatch.setenv("HF_HEDGE_DELAY", str(hedge_delay))
+    cog = AdvancedGenerationCommands(fake_bot)
+    cog.calls = []
+    cog.cancelled = []
+    cog.in_flight = cog.peak = 0
+
+    async def query(api_url, payload, timeout=60):
+        cog.calls.append(api_url)
+        cog.in_flight += 1
+        cog.peak = max(cog.peak, cog.in_flight)
+        delay, result = responses[api_url]
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cog.cancelled.append(api_url)
+            raise
+        finally:
+            cog.in_flight -= 1
+        return result
+
+    cog.query_huggingface_api = query
+    return cog
+
+
+def test_slow_model_is_hedged(fake_bot, monkeypatch):
+    cog = make_cog(fake_bot, monkeypatch, 0.05, {"slow": (5, b"slow"), "fast": (0.01, b"fast")})
+
+    async def scenario():
+        started = time.perf_counter()
+        result = await cog.query_first_success(["slow", "fast"], {})
+        return result, time.perf_counter() - started
+
+    result, elapsed = asyncio.run(scenario())
+    assert result == b"fast"
+    assert elapsed < 1
+    assert cog.cancelled == ["slow"]
+
+
+def test_failure_starts_the_next_model_without_waiting(fake_bot, monkeypatch):
+    cog = make_cog(fake_bot, monkeypatch, 10, {"broken": (0, None), "backup": (0, b"backup")})
+
+    async def scenario():
+        started = time.perf_counter()
+        result = await cog.query_first_success(["broken", "backup"], {})
+        return result, time.perf_counter() - started
+
+    result, elapsed = asyncio.run(scenario())
+    assert result == b"backup"
+    assert elapsed < 1
+
+
+def test_negative_delay_falls_back_in_order(fake_bot, monkeypatch):
+    cog = make_cog(fake_bot, monkeypatch, -1, {"a": (0, None), "b": (0, b"b"), "c": (0, b"c")})
+    assert asyncio.run(cog.query_first_success(["a", "b", "c"], {})) == b"b"
+    assert cog.calls == ["a", "b"]
+
+
+def test_parallel_attempts_are_capped(fake_bot, monkeypatch):
+    monkeypatch.setenv("HF_HEDGE_MAX_PARALLEL", "2")
+    cog = make_cog(fake_bot, monkeypatch, 0, {"a": (0.2, None), "b": (0.2, None), "c": (0, b"c")})
+    assert asyncio.run(cog.query_first_success(["a", "b", "c"], {})) == b"c"
+    assert cog.calls == ["a", "b", "c"]
+    assert cog.peak == 2
+
+
+def test_all_models_failing_returns_none(fake_bot, monkeypatch):
+    cog = make_cog(fake_bot, monkeypatch, 0, {"a": (0, None), "b": (0, None)})
+    assert asyncio.run(cog.query_first_success(["a", "b"], {})) is None
@@ -0,0 +1,159 @@
+import asyncio
+import os
+import runpy
+import sys
+from types import SimpleNamespace
+
+import discord
+from aiohttp import web
+
+import hinata_bot as bot_module
+from hinata_bot import bot
+from job_queue import BACKEND_POLLINATIONS
+from log_sinks import LogSink
+
+
+async def start_services(*names):
+    for name in names:
+        await bot._load_extension_timed(name)
+
+
+async def stop_services():
+    for name in list(bot.extensions):
+        await bot.unload_extension(name)
+    for module in reversed(bot.services):
+        await module.teardown(bot)
+    bot.services = []
+
+
+def test_services_use_the_imported_modules():
+    async def scenario():
+        await start_services("tracing", "job_queue")
+        try:
+            # A second copy of a module would have its own exception classes and context variables
+            assert sys.modules["job_queue"].QueueFullError is bot_module.QueueFullError
+            assert sys.modules["tracing"].current_span is bot_module.current_span
+            assert type(bot.generation_queue) is sys.modules["job_queue"].GenerationQueue
+        finally:
+            await stop_services()
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_replies_busy(monkeypatch):
+    monkeypatch.setenv("GEN_MAX_QUEUE_DEPTH", "0")
+    sent = []
+
+    class Context:
+        guild = None
+
+        async def send(self, embed=None, **kwargs):
+            sent.append(embed)
+
+    async def scenario():
+        await start_services("job_queue")
+        try:
+            await bot.generate_image_from_prompt(Context(), "a cute cat")
+        finally:
+            await stop_services()
+
+    asyncio.run(scenario())
+    assert [embed.title for embed in sent] == ["⏳ I'm Busy!"]
+
+
+def make_interaction(interaction_type):
+    return SimpleNamespace(
+        command=SimpleNamespace(qualified_name="imagine"), id=1, created_at=discord.utils.utcnow(),
+        type=interaction_type, data={"options": []}, user=SimpleNamespace(id=1), guild=None, extras={}
+    )
+
+
+def test_autocomplete_opens_no_span():
+    interaction = make_interaction(discord.InteractionType.autocomplete)
+
+    async def scenario():
+        assert await bot.tree.interaction_check(interaction)
+        return bot_module.current_span.get()
+
+    assert asyncio.run(scenario()) is None
+    assert "span" not in interaction.extras
+
+
+def test_job_spans_join_the_interaction_trace():
+    finished = []
+
+    class Exporter(LogSink):
+        def emit(self, span):
+            finished.append(span)
+
+    interaction = make_interaction(discord.InteractionType.application_command)
+
+    async def factory():
+        with bot.tracer.span("pollinations.request"):
+            return b"image"
+
+    async def scenario():
+        await start_services("tracing", "job_queue")
+        bot.tracer.exporters.append(Exporter())
+        try:
+            assert await bot.tree.interaction_check(interaction)
+            job = await bot.generation_queue.submit(BACKEND_POLLINATIONS, factory)
+            await job
+            return job
+        finally:
+            await stop_services()
+
+    job = asyncio.run(scenario())
+    root = interaction.extras["span"]
+    assert job.span is root
+    assert {span.name for span in finished} == {"queue.wait", "generate", "pollinations.request"}
+    assert {span.trace_id for span in finished} == {root.trace_id}
+
+
+def test_entry_script_is_inert_in_workers():
+    # Pool workers re-import the script that started the bot as __mp_main__
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bot.py")
+    namespace = runpy.run_path(path, run_name="__mp_main__")
+    assert [name for name in namespace if not name.startswith("__")] == []
+
+
+def test_rejected_pollinations_body_is_labelled():
+    async def page(request):
+        return web.Response(text="<html></html>", content_type="text/html")
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_get("/prompt/cat", page)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", 0).start()
+        await start_services("http_client")
+        try:
+            return await bot.query_pollinations(f"http://127.0.0.1:{runner.addresses[0][1]}/prompt/cat")
+        finally:
+            await stop_services()
+            await runner.cleanup()
+
+    assert asyncio.run(scenario()) is None
+    outcomes = [dict(key)["outcome"] for key in bot.metrics.upstream_latency.counts]
+    assert "rejected" in outcomes and "error" not in outcomes
+
+
+def test_command_sync_is_skipped_when_unchanged(monkeypatch, tmp_path):
+    monkeypatch.setattr(bot_module, "COMMAND_SYNC_STATE_PATH", str(tmp_path / "data" / "commands.json"))
+    syncs = []
+
+    async def sync():
+        syncs.append(1)
+        return []
+
+    monkeypatch.setattr(bot.tree, "sync", sync)
+
+    async def scenario():
+        # The first sync creates the data directory for its state file
+        await bot.sync_command_tree()
+        await bot.sync_command_tree()
+
+    asyncio.run(scenario())
+    assert syncs == [1]
+    assert (tmp_path / "data" / "commands.json").exists()
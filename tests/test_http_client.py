@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from http_client import HTTPClient, PayloadRejected
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(200 * 1024)
+
+
+async def streamed(request, body: bytes, content_type: str = "image/png"):
+    # Chunked, so the client can't see the length up front
+    response = web.StreamResponse(headers={"Content-Type": content_type})
+    await response.prepare(request)
+    for start in range(0, len(body), 32 * 1024):
+        await response.write(body[start:start + 32 * 1024])
+    await response.write_eof()
+    return response
+
+
+async def image(request):
+    return web.Response(body=PNG, content_type="image/png")
+
+
+async def streamed_image(request):
+    return await streamed(request, PNG)
+
+
+async def page(request):
+    return web.Response(text="<html></html>", content_type="text/html")
+
+
+async def text(request):
+    return await streamed(request, b"definitely not an image", "image/png")
+
+
+async def busy(request):
+    return web.Response(status=503, body=bytes(200 * 1024))
+
+
+def make_app() -> web.Application:
+    app = web.Application()
+    app.router.add_get("/image", image)
+    app.router.add_get("/streamed", streamed_image)
+    app.router.add_get("/page", page)
+    app.router.add_get("/text", text)
+    app.router.add_get("/busy", busy)
+    return app
+
+
+def fetch(path: str, max_bytes: int = 1024 * 1024):
+    async def scenario():
+        runner = web.AppRunner(make_app())
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        client = HTTPClient()
+        try:
+            port = runner.addresses[0][1]
+            return await client.fetch_image("GET", f"http://127.0.0.1:{port}{path}", max_bytes=max_bytes)
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    return asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("path", ["/image", "/streamed"])
+def test_image_is_read_whole(path):
+    response = fetch(path)
+    assert response.status_code == 200
+    assert type(response.content) is bytes
+    assert response.content == PNG
+
+
+@pytest.mark.parametrize("path", ["/image", "/streamed"])
+def test_body_over_the_cap_is_rejected(path):
+    with pytest.raises(PayloadRejected, match="cap"):
+        fetch(path, max_bytes=100 * 1024)
+
+
+def test_wrong_content_type_is_rejected():
+    with pytest.raises(PayloadRejected, match="content type"):
+        fetch("/page")
+
+
+def test_body_that_is_not_an_image_is_rejected():
+    with pytest.raises(PayloadRejected, match="image format"):
+        fetch("/text")
+
+
+def test_error_body_is_truncated():
+    response = fetch("/busy")
+    assert response.status_code == 503
+    assert len(response.content) == 64 * 1024
@@ -0,0 +1,65 @@
+import asyncio
+import contextlib
+from types import SimpleNamespace
+
+from advanced_generation import AdvancedGenerationCommands
+
+
+def response(status_code, content=b"", headers=None):
+    return SimpleNamespace(status_code=status_code, content=content, headers=headers or {})
+
+
+def make_cog(fake_bot, monkeypatch, responses, attempt=None):
+    """Cog whose Hugging Face calls return `responses` in order, with instant parking"""
+    monkeypatch.setenv("HF_RETRY_BASE_DELAY", "0")
+    remaining = list(responses)
+
+    async def fetch_image(method, url, **kwargs):
+        return remaining.pop(0)
+
+    async def park(delay):
+        fake_bot.parked.append(delay)
+
+    @contextlib.asynccontextmanager
+    async def no_slot():
+        yield
+
+    fake_bot.parked = []
+    fake_bot.http_client = SimpleNamespace(fetch_image=fetch_image)
+    fake_bot.generation_queue = SimpleNamespace(attempt=attempt or no_slot, park=park)
+    return AdvancedGenerationCommands(fake_bot)
+
+
+def test_loading_model_is_retried_after_its_estimated_time(fake_bot, monkeypatch):
+    cog = make_cog(fake_bot, monkeypatch, [
+        response(503, b'{"estimated_time": 7.5}'),
+        response(200, b"image"),
+    ])
+    assert asyncio.run(cog.query_huggingface_api("https://hf/models/a", {})) == b"image"
+    assert fake_bot.parked == [7.5]
+
+
+def test_retry_after_header_is_honoured(fake_bot, monkeypatch):
+    cog = make_cog(fake_bot, monkeypatch, [
+        response(429, headers={"Retry-After": "3"}),
+        response(200, b"image"),
+    ])
+    assert asyncio.run(cog.query_huggingface_api("https://hf/models/a", {})) == b"image"
+    assert fake_bot.parked == [3.0]
+
+
+def test_other_errors_are_not_retried(fake_bot, monkeypatch):
+    cog = make_cog(fake_bot, monkeypatch, [response(400), response(200, b"image")])
+    assert asyncio.run(cog.query_huggingface_api("https://hf/models/a", {})) is None
+    assert fake_bot.parked == []
+
+
+def test_failed_slot_reacquire_is_not_blamed_on_the_model(fake_bot, monkeypatch):
+    @contextlib.asynccontextmanager
+    async def broken_slot():
+        raise RuntimeError("queue stopped")
+        yield
+
+    cog = make_cog(fake_bot, monkeypatch, [], attempt=broken_slot)
+    assert asyncio.run(cog.query_huggingface_api("https://hf/models/a", {})) is None
+    assert cog.model_health.models == {}
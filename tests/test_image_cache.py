@@ -0,0 +1,107 @@
+import asyncio
+import os
+
+import image_cache
+from image_cache import ImageCache
+
+
+def make_cache(monkeypatch, **env):
+    for name, value in env.items():
+        monkeypatch.setenv(name, str(value))
+    return ImageCache()
+
+
+def test_keys_ignore_case_and_spacing():
+    assert ImageCache.make_key("A  cute\tCat ") == ImageCache.make_key("a cute cat")
+    assert ImageCache.make_key("a cute cat") != ImageCache.make_key("a cute cat", negative_prompt="dogs")
+    assert ImageCache.make_key("a cute cat", width=512) != ImageCache.make_key("a cute cat", width=768)
+    assert ImageCache.make_key("a cute cat", seed=1) != ImageCache.make_key("a cute cat", seed=2)
+
+
+def test_least_recently_used_entry_is_evicted(monkeypatch):
+    async def scenario():
+        cache = make_cache(monkeypatch, IMAGE_CACHE_MAX_ENTRIES=2)
+        await cache.set("a", b"1")
+        await cache.set("b", b"2")
+        await cache.get("a")
+        await cache.set("c", b"3")
+        return [await cache.get(key) for key in "abc"], cache.stats()
+
+    images, stats = asyncio.run(scenario())
+    assert images == [b"1", None, b"3"]
+    assert stats["evictions"] == 1
+
+
+def test_memory_tier_keeps_to_its_byte_budget(monkeypatch):
+    async def scenario():
+        cache = make_cache(monkeypatch, IMAGE_CACHE_MAX_BYTES=10)
+        await cache.set("a", b"x" * 6)
+        await cache.set("b", b"x" * 6)
+        # Larger than the whole budget, so never kept
+        await cache.set("c", b"x" * 11)
+        return [await cache.get(key) for key in "abc"], cache.memory_bytes
+
+    images, memory_bytes = asyncio.run(scenario())
+    assert images == [None, b"x" * 6, None]
+    assert memory_bytes == 6
+
+
+def test_entries_expire(monkeypatch):
+    now = image_cache.time.time()
+
+    async def scenario():
+        cache = make_cache(monkeypatch, IMAGE_CACHE_TTL=60)
+        await cache.set("a", b"1")
+        monkeypatch.setattr(image_cache.time, "time", lambda: now + 61)
+        return await cache.get("a"), cache.stats()
+
+    image, stats = asyncio.run(scenario())
+    assert image is None
+    assert stats["misses"] == 1 and stats["memory_entries"] == 0
+
+
+def test_disk_hit_is_promoted_to_memory(monkeypatch, tmp_path):
+    async def scenario():
+        cache = make_cache(monkeypatch, IMAGE_CACHE_DIR=tmp_path)
+        await cache.start()
+        await cache.set("a", b"image")
+
+        restarted = make_cache(monkeypatch, IMAGE_CACHE_DIR=tmp_path)
+        await restarted.start()
+        image = await restarted.get("a")
+        return image, "a" in restarted.memory, restarted.stats()
+
+    image, promoted, stats = asyncio.run(scenario())
+    assert image == b"image" and promoted
+    assert stats["disk_hits"] == 1
+    assert os.listdir(tmp_path) == ["a.bin"]
+
+
+def test_disk_tier_keeps_to_its_byte_budget(monkeypatch, tmp_path):
+    async def scenario():
+        cache = make_cache(monkeypatch, IMAGE_CACHE_DIR=tmp_path, IMAGE_CACHE_DISK_MAX_BYTES=10)
+        await cache.start()
+        await cache.set("a", b"x" * 6)
+        await cache.set("b", b"x" * 6)
+        return cache.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["disk_bytes"] == 6
+    assert os.listdir(tmp_path) == ["b.bin"]
+
+
+def test_oversized_disk_tier_is_trimmed_at_startup(monkeypatch, tmp_path):
+    for age, key in enumerate(["new", "middle", "old"]):
+        path = tmp_path / f"{key}.bin"
+        path.write_bytes(b"x" * 6)
+        os.utime(path, (1000 - age, 1000 - age))
+
+    async def scenario():
+        cache = make_cache(monkeypatch, IMAGE_CACHE_DIR=tmp_path, IMAGE_CACHE_DISK_MAX_BYTES=12)
+        await cache.start()
+        return list(cache.disk_index), cache.disk_bytes
+
+    keys, disk_bytes = asyncio.run(scenario())
+    assert keys == ["middle", "new"]
+    assert disk_bytes == 12
+    assert sorted(os.listdir(tmp_path)) == ["middle.bin", "new.bin"]
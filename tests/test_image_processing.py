@@ -0,0 +1,50 @@
+import asyncio
+import io
+import os
+import sys
+
+from PIL import Image
+
+from image_processing import ImageProcessor, make_grid, make_thumbnail, process_image
+
+
+def noise_png(width: int, height: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.frombytes("RGB", (width, height), os.urandom(width * height * 3)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def loaded_modules():
+    return set(sys.modules)
+
+
+def test_process_image_fits_the_limit():
+    data = noise_png(512, 512)
+    output, _ = process_image(data, "WEBP", 85, 40, 60000)
+    assert len(output) <= 60000
+    assert Image.open(io.BytesIO(output)).format == "WEBP"
+
+
+def test_thumbnail_and_grid_sizes():
+    data = noise_png(300, 200)
+    thumbnail, _ = make_thumbnail(data, 64, "WEBP")
+    assert Image.open(io.BytesIO(thumbnail)).size == (64, 43)
+    grid, _ = make_grid([data] * 3, 100, "PNG", 85)
+    # Two tiles per row with a gap between them
+    assert Image.open(io.BytesIO(grid)).size == (208, 142)
+
+
+def test_workers_import_only_image_processing(fake_bot, monkeypatch):
+    monkeypatch.setenv("IMAGE_PROCESS_WORKERS", "1")
+
+    async def scenario():
+        processor = ImageProcessor(fake_bot)
+        await processor.start()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(processor.executor, loaded_modules)
+        finally:
+            await processor.stop()
+
+    modules = asyncio.run(scenario())
+    assert "PIL" in modules
+    assert not {"discord", "openai", "aiohttp", "chat", "hinata_bot"} & modules
@@ -0,0 +1,208 @@
+import asyncio
+
+import pytest
+
+from job_queue import (
+    BACKEND_POLLINATIONS, PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL, GenerationQueue, QueueFullError
+)
+
+
+def make_queue(fake_bot, monkeypatch, **env):
+    for name, value in env.items():
+        monkeypatch.setenv(name, str(value))
+    queue = GenerationQueue(fake_bot)
+    queue.start()
+    return queue
+
+
+def test_higher_priority_runs_first(fake_bot, monkeypatch):
+    async def scenario():
+        queue = make_queue(fake_bot, monkeypatch, GEN_MAX_WORKERS=1)
+        release = asyncio.Event()
+        finished = []
+
+        def job(name, wait=False):
+            async def factory():
+                if wait:
+                    await release.wait()
+                finished.append(name)
+                return name
+            return factory
+
+        blocker = await queue.submit(BACKEND_POLLINATIONS, job("blocker", wait=True))
+        await asyncio.sleep(0)
+        jobs = [
+            await queue.submit(BACKEND_POLLINATIONS, job("low"), PRIORITY_LOW),
+            await queue.submit(BACKEND_POLLINATIONS, job("normal"), PRIORITY_NORMAL),
+            await queue.submit(BACKEND_POLLINATIONS, job("high"), PRIORITY_HIGH),
+        ]
+        assert queue.position_label(jobs[2]) == "#1"
+        release.set()
+        await asyncio.gather(blocker, *jobs)
+        await queue.stop()
+        return finished
+
+    assert asyncio.run(scenario()) == ["blocker", "high", "normal", "low"]
+
+
+def test_full_queue_raises(fake_bot, monkeypatch):
+    async def scenario():
+        queue = make_queue(fake_bot, monkeypatch, GEN_MAX_WORKERS=1, GEN_MAX_QUEUE_DEPTH=1)
+        release = asyncio.Event()
+
+        async def factory():
+            await release.wait()
+            return b"image"
+
+        running = await queue.submit(BACKEND_POLLINATIONS, factory)
+        await asyncio.sleep(0)
+        waiting = await queue.submit(BACKEND_POLLINATIONS, factory)
+        with pytest.raises(QueueFullError):
+            await queue.submit(BACKEND_POLLINATIONS, factory)
+        release.set()
+        await asyncio.gather(running, waiting)
+        await queue.stop()
+
+    asyncio.run(scenario())
+
+
+def test_parked_job_frees_its_worker(fake_bot, monkeypatch):
+    async def scenario():
+        queue = make_queue(fake_bot, monkeypatch, GEN_MAX_WORKERS=1)
+        finished = []
+
+        async def retrying():
+            async with queue.attempt():
+                pass
+            # Waiting to retry hands the only worker to the next job
+            await queue.park(0.1)
+            async with queue.attempt():
+                finished.append("retrying")
+            return "retrying"
+
+        async def quick():
+            finished.append("quick")
+            return "quick"
+
+        first = await queue.submit(BACKEND_POLLINATIONS, retrying)
+        await asyncio.sleep(0)
+        second = await queue.submit(BACKEND_POLLINATIONS, quick)
+        results = await asyncio.gather(first, second)
+        # Both jobs are done and the worker was given back
+        assert queue.worker_semaphore._value == 1
+        await queue.stop()
+        return results, finished
+
+    results, finished = asyncio.run(scenario())
+    assert results == ["retrying", "quick"]
+    assert finished == ["quick", "retrying"]
+
+
+def test_failed_job_raises_to_waiter(fake_bot, monkeypatch):
+    async def scenario():
+        queue = make_queue(fake_bot, monkeypatch)
+
+        async def failing():
+            raise RuntimeError("upstream down")
+
+        job = await queue.submit(BACKEND_POLLINATIONS, failing)
+        with pytest.raises(RuntimeError):
+            await job
+        await queue.stop()
+
+    asyncio.run(scenario())
+
+
+def test_identical_requests_share_one_call(fake_bot, monkeypatch):
+    async def scenario():
+        queue = make_queue(fake_bot, monkeypatch)
+        release = asyncio.Event()
+        calls = []
+
+        async def factory():
+            calls.append(1)
+            await release.wait()
+            return b"image"
+
+        jobs = [await queue.submit(BACKEND_POLLINATIONS, factory, cache_key="cat") for _ in range(3)]
+        assert queue.stats()["coalesced"] == 2
+        release.set()
+        results = await asyncio.gather(*jobs)
+
+        # Once the flight lands, the same key starts a new one
+        again = await queue.submit(BACKEND_POLLINATIONS, factory, cache_key="cat")
+        await again
+        await queue.stop()
+        return results, len(calls)
+
+    results, calls = asyncio.run(scenario())
+    assert results == [b"image"] * 3
+    assert calls == 2
+
+
+def test_cancelled_follower_keeps_the_flight(fake_bot, monkeypatch):
+    async def scenario():
+        queue = make_queue(fake_bot, monkeypatch)
+        release = asyncio.Event()
+
+        async def factory():
+            await release.wait()
+            return b"image"
+
+        leader = await queue.submit(BACKEND_POLLINATIONS, factory, cache_key="cat")
+        follower = await queue.submit(BACKEND_POLLINATIONS, factory, cache_key="cat")
+        follower.future.cancel()
+        release.set()
+        result = await leader
+        await queue.stop()
+        return result
+
+    assert asyncio.run(scenario()) == b"image"
+
+
+def test_guilds_take_turns(fake_bot, monkeypatch):
+    async def scenario():
+        queue = make_queue(fake_bot, monkeypatch, GEN_MAX_WORKERS=1, GEN_GUILD_WEIGHTS="3:2")
+        release = asyncio.Event()
+        finished = []
+
+        def job(name):
+            async def factory():
+                await release.wait()
+                finished.append(name)
+            return factory
+
+        blocker = await queue.submit(BACKEND_POLLINATIONS, job("blocker"), guild_id=0)
+        await asyncio.sleep(0)
+        # Guild 1 bursts first, but guild 2 doesn't wait behind its whole burst; guild 3 has twice the share
+        jobs = [await queue.submit(BACKEND_POLLINATIONS, job(f"1-{index}"), guild_id=1) for index in range(3)]
+        jobs += [await queue.submit(BACKEND_POLLINATIONS, job("2-0"), guild_id=2)]
+        jobs += [await queue.submit(BACKEND_POLLINATIONS, job(f"3-{index}"), guild_id=3) for index in range(2)]
+        release.set()
+        await asyncio.gather(blocker, *jobs)
+        await queue.stop()
+        return finished
+
+    assert asyncio.run(scenario()) == ["blocker", "1-0", "2-0", "3-0", "3-1", "1-1", "1-2"]
+
+
+def test_guild_share_of_the_queue_is_capped(fake_bot, monkeypatch):
+    async def scenario():
+        queue = make_queue(fake_bot, monkeypatch, GEN_MAX_WORKERS=1, GEN_MAX_GUILD_QUEUE_DEPTH=2)
+        release = asyncio.Event()
+
+        async def factory():
+            await release.wait()
+
+        running = await queue.submit(BACKEND_POLLINATIONS, factory, guild_id=1)
+        await asyncio.sleep(0)
+        waiting = [await queue.submit(BACKEND_POLLINATIONS, factory, guild_id=1) for _ in range(2)]
+        with pytest.raises(QueueFullError):
+            await queue.submit(BACKEND_POLLINATIONS, factory, guild_id=1)
+        # Other guilds still get in
+        waiting.append(await queue.submit(BACKEND_POLLINATIONS, factory, guild_id=2))
+        release.set()
+        await asyncio.gather(running, *waiting)
+        await queue.stop()
+
+    asyncio.run(scenario())
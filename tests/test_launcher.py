@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+from launcher import BOT_SCRIPT, cluster_environment, parse_cluster_ids, per_cluster_path, shard_ranges
+
+
+def test_shards_split_into_contiguous_ranges():
+    assert shard_ranges(5, 2) == [[0, 1, 2], [3, 4]]
+
+
+def test_cluster_ids_are_parsed():
+    assert parse_cluster_ids("2, 3", 4) == [2, 3]
+
+
+@pytest.mark.parametrize("value", ["4", "0,-1", "one", ","])
+def test_invalid_cluster_ids_are_rejected(value):
+    with pytest.raises(ValueError, match="CLUSTER_IDS"):
+        parse_cluster_ids(value, 4)
+
+
+def test_per_cluster_path_keeps_the_extension():
+    assert per_cluster_path("logs/hinata.jsonl", 2) == "logs/hinata.cluster2.jsonl"
+    assert per_cluster_path("hinata", 0) == "hinata.cluster0"
+
+
+def test_clusters_never_share_ports_or_log_files(monkeypatch):
+    monkeypatch.setenv("METRICS_PORT", "9108")
+    monkeypatch.setenv("LOG_JSONL_PATH", "logs/hinata.jsonl")
+    monkeypatch.setenv("TRACE_JSONL_PATH", "logs/traces.jsonl")
+    ranges = shard_ranges(6, 3)
+    envs = [cluster_environment(cluster_id, 3, 6, shards) for cluster_id, shards in enumerate(ranges)]
+
+    for name in ("METRICS_PORT", "LOG_JSONL_PATH", "TRACE_JSONL_PATH"):
+        assert len({env[name] for env in envs}) == 3
+    assert envs[1]["METRICS_PORT"] == "9109"
+    assert envs[1]["LOG_JSONL_PATH"] == "logs/hinata.cluster1.jsonl"
+    assert envs[1]["SHARD_IDS"] == "2,3"
+    assert [env["SYNC_COMMANDS"] for env in envs] == ["true", "false", "false"]
+
+
+def test_disabled_metrics_stay_disabled(monkeypatch):
+    monkeypatch.setenv("METRICS_PORT", "0")
+    assert cluster_environment(1, 2, 2, [1])["METRICS_PORT"] == "0"
+
+
+def test_bot_script_does_not_depend_on_the_working_directory():
+    assert os.path.isabs(BOT_SCRIPT)
+    assert os.path.isfile(BOT_SCRIPT)
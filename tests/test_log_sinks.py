@@ -0,0 +1,176 @@
+import asyncio
+import gzip
+import json
+import os
+from types import SimpleNamespace
+
+import log_sinks
+from log_sinks import DiscordChannelSink, JSONLSink, LogRecord
+
+
+def record(description: str = "generated", timestamp: float = None) -> LogRecord:
+    record = LogRecord.create("Image Generated", description)
+    if timestamp is not None:
+        record.timestamp = timestamp
+    return record
+
+
+def make_jsonl_sink(monkeypatch, path, **env):
+    for name, value in env.items():
+        monkeypatch.setenv(name, str(value))
+    return JSONLSink(str(path))
+
+
+def write(sink: JSONLSink, *records: LogRecord):
+    async def scenario():
+        for item in records:
+            sink.emit(item)
+            await sink.flush()
+    asyncio.run(scenario())
+
+
+def segments(directory):
+    return sorted(name for name in os.listdir(directory) if name != "hinata.jsonl")
+
+
+def test_file_rotates_by_size(monkeypatch, tmp_path):
+    now = log_sinks.time.time()
+    line_size = len(json.dumps(record("a", now).to_dict(), ensure_ascii=False)) + 1
+    sink = make_jsonl_sink(monkeypatch, tmp_path / "hinata.jsonl", LOG_JSONL_MAX_BYTES=2 * line_size)
+    # Rotation is checked before each write, so a full file is rotated by the next one
+    write(sink, *(record(letter, now) for letter in "abcde"))
+    sink.file.close()
+    assert sink.rotations == 2
+    rotated = [[json.loads(line)["description"] for line in open(tmp_path / name)] for name in segments(tmp_path)]
+    assert rotated == [["a", "b"], ["c", "d"]]
+    assert [json.loads(line)["description"] for line in open(tmp_path / "hinata.jsonl")] == ["e"]
+
+
+def test_rotations_in_the_same_instant_keep_every_segment(monkeypatch, tmp_path):
+    frozen = log_sinks.datetime(2025, 1, 1)
+
+    class FrozenClock:
+        @staticmethod
+        def utcnow():
+            return frozen
+
+    monkeypatch.setattr(log_sinks, "datetime", FrozenClock)
+    sink = make_jsonl_sink(monkeypatch, tmp_path / "hinata.jsonl", LOG_JSONL_MAX_BYTES=1)
+    write(sink, *(record(str(index)) for index in range(4)))
+    sink.file.close()
+    assert sink.rotations == 3
+    assert segments(tmp_path) == [
+        "hinata.jsonl.20250101-000000-000000",
+        "hinata.jsonl.20250101-000000-000000-1",
+        "hinata.jsonl.20250101-000000-000000-2",
+    ]
+
+
+def test_file_rotates_by_age(monkeypatch, tmp_path):
+    now = log_sinks.time.time()
+    sink = make_jsonl_sink(monkeypatch, tmp_path / "hinata.jsonl", LOG_JSONL_ROTATE_SECONDS=60)
+    write(sink, record("old", now))
+    monkeypatch.setattr(log_sinks.time, "time", lambda: now + 61)
+    write(sink, record("new", now + 61))
+    sink.file.close()
+    assert sink.rotations == 1
+    assert [json.loads(line)["description"] for line in open(tmp_path / "hinata.jsonl")] == ["new"]
+
+
+def test_age_survives_a_restart(monkeypatch, tmp_path):
+    path = tmp_path / "hinata.jsonl"
+    now = log_sinks.time.time()
+    path.write_text(json.dumps(record("before restart", now - 120).to_dict()) + "\n")
+
+    # A fresh process reopening the file still rotates it once it is old enough
+    sink = make_jsonl_sink(monkeypatch, path, LOG_JSONL_ROTATE_SECONDS=60)
+    write(sink, record("first"), record("second"))
+    sink.file.close()
+    assert sink.rotations == 1
+    assert [json.loads(line)["description"] for line in open(path)] == ["second"]
+
+
+def test_rotated_segments_are_compressed(monkeypatch, tmp_path):
+    sink = make_jsonl_sink(monkeypatch, tmp_path / "hinata.jsonl", LOG_JSONL_MAX_BYTES=1, LOG_JSONL_COMPRESS="true")
+    write(sink, record("zipped"), record("current"))
+    sink.file.close()
+    rotated = segments(tmp_path)
+    assert len(rotated) == 1 and rotated[0].endswith(".gz")
+    with gzip.open(tmp_path / rotated[0], "rt", encoding="utf-8") as f:
+        assert json.loads(f.readline())["description"] == "zipped"
+
+
+class Channel:
+    def __init__(self, fail=False):
+        self.sends = []
+        self.fail = fail
+
+    async def send(self, embeds):
+        if self.fail:
+            raise OSError("connection reset")
+        self.sends.append(len(embeds))
+
+
+def make_discord_sink(monkeypatch, channel, **env):
+    for name, value in env.items():
+        monkeypatch.setenv(name, str(value))
+    return DiscordChannelSink(SimpleNamespace(get_channel=lambda channel_id: channel))
+
+
+def test_records_are_sent_ten_embeds_at_a_time(monkeypatch):
+    channel = Channel()
+
+    async def scenario():
+        sink = make_discord_sink(monkeypatch, channel, LOG_FLUSH_INTERVAL=0.01)
+        for index in range(25):
+            sink.emit(record(str(index)))
+        sink.start()
+        while sink.log_queue.qsize():
+            await asyncio.sleep(0.01)
+        await sink.stop()
+        return sink.stats()
+
+    stats = asyncio.run(scenario())
+    assert channel.sends == [10, 10, 5]
+    assert stats["sent"] == 25 and stats["batches"] == 3
+
+
+def test_full_queue_drops_new_records(monkeypatch):
+    async def scenario():
+        sink = make_discord_sink(monkeypatch, Channel(), LOG_QUEUE_SIZE=2)
+        for index in range(3):
+            sink.emit(record(str(index)))
+        return sink.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["queued"] == 2 and stats["overflowed"] == 1 and stats["backlog"] == 2
+
+
+def test_stop_ships_the_backlog(monkeypatch):
+    channel = Channel()
+
+    async def scenario():
+        # The flusher waits out a long interval, so only stop() can ship these
+        sink = make_discord_sink(monkeypatch, channel, LOG_FLUSH_INTERVAL=3600)
+        sink.start()
+        for index in range(12):
+            sink.emit(record(str(index)))
+        await asyncio.sleep(0)
+        await sink.stop()
+        return sink.stats()
+
+    stats = asyncio.run(scenario())
+    assert sum(channel.sends) == 12 and all(size <= 10 for size in channel.sends)
+    assert stats["sent"] == 12 and stats["backlog"] == 0
+
+
+def test_failed_send_counts_as_dropped(monkeypatch):
+    async def scenario():
+        sink = make_discord_sink(monkeypatch, Channel(fail=True))
+        for index in range(3):
+            sink.emit(record(str(index)))
+        await sink.stop()
+        return sink.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["dropped"] == 3 and stats["sent"] == 0
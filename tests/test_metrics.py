@@ -0,0 +1,36 @@
+from metrics import MetricsRegistry
+
+
+def test_exposition_format():
+    registry = MetricsRegistry()
+    registry.metrics = []
+    commands = registry.counter("commands_total", "Commands handled", ("command", "outcome"))
+    queue_depth = registry.gauge("queue_depth", "Jobs waiting")
+    latency = registry.histogram("latency_seconds", "Latency", ("backend",), buckets=(0.1, 1))
+
+    commands.inc(command="imagine", outcome="success")
+    commands.inc(2, command='say "hi"\\path\nnext', outcome="failure")
+    queue_depth.set(3)
+    latency.observe(0.05, backend="pollinations")
+    latency.observe(0.5, backend="pollinations")
+    latency.observe(7.25, backend="pollinations")
+    collected = []
+    registry.add_collector(lambda: collected.append(True))
+
+    assert registry.render() == (
+        "# HELP commands_total Commands handled\n"
+        "# TYPE commands_total counter\n"
+        'commands_total{command="imagine",outcome="success"} 1\n'
+        'commands_total{command="say \\"hi\\"\\\\path\\nnext",outcome="failure"} 2\n'
+        "# HELP queue_depth Jobs waiting\n"
+        "# TYPE queue_depth gauge\n"
+        "queue_depth 3\n"
+        "# HELP latency_seconds Latency\n"
+        "# TYPE latency_seconds histogram\n"
+        'latency_seconds_bucket{backend="pollinations",le="0.1"} 1\n'
+        'latency_seconds_bucket{backend="pollinations",le="1"} 2\n'
+        'latency_seconds_bucket{backend="pollinations",le="+Inf"} 3\n'
+        'latency_seconds_sum{backend="pollinations"} 7.8\n'
+        'latency_seconds_count{backend="pollinations"} 3\n'
+    )
+    assert collected == [True]
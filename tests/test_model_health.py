@@ -0,0 +1,64 @@
+import model_health
+from model_health import ModelHealthTracker
+
+
+def make_tracker(monkeypatch, **env):
+    for name, value in env.items():
+        monkeypatch.setenv(name, str(value))
+    return ModelHealthTracker()
+
+
+def test_circuit_opens_after_consecutive_failures(monkeypatch):
+    tracker = make_tracker(monkeypatch, HF_CIRCUIT_FAILURES=3, HF_CIRCUIT_COOLDOWN=60)
+    for _ in range(2):
+        tracker.record_failure("a")
+    assert tracker.is_available("a")
+    tracker.record_failure("a")
+    assert not tracker.is_available("a")
+    assert tracker.rank(["a", "b"]) == ["b"]
+
+
+def test_circuit_closes_after_cooldown(monkeypatch):
+    tracker = make_tracker(monkeypatch, HF_CIRCUIT_FAILURES=1, HF_CIRCUIT_COOLDOWN=60)
+    now = 1000.0
+    monkeypatch.setattr(model_health.time, "time", lambda: now)
+    tracker.record_failure("a")
+    assert not tracker.is_available("a")
+    now += 61
+    assert tracker.is_available("a")
+
+
+def test_success_resets_the_failure_streak(monkeypatch):
+    tracker = make_tracker(monkeypatch, HF_CIRCUIT_FAILURES=2)
+    tracker.record_failure("a")
+    tracker.record_success("a", 1.0)
+    tracker.record_failure("a")
+    assert tracker.is_available("a")
+
+
+def test_every_circuit_open_keeps_configured_order(monkeypatch):
+    tracker = make_tracker(monkeypatch, HF_CIRCUIT_FAILURES=1)
+    tracker.record_failure("a")
+    tracker.record_failure("b")
+    assert tracker.rank(["a", "b"]) == ["a", "b"]
+
+
+def test_rank_prefers_fast_reliable_models(monkeypatch):
+    tracker = make_tracker(monkeypatch, HF_DEFAULT_LATENCY=30, HF_CIRCUIT_FAILURES=10)
+    for _ in range(5):
+        tracker.record_success("slow", 20.0)
+        tracker.record_success("fast", 2.0)
+    # Half of flaky's calls fail, so its 2s median counts as 4s
+    for _ in range(5):
+        tracker.record_success("flaky", 2.0)
+        tracker.record_failure("flaky")
+    assert tracker.rank(["slow", "flaky", "fast", "unknown"]) == ["fast", "flaky", "slow", "unknown"]
+
+
+def test_loading_model_is_ranked_behind_by_its_load_time(monkeypatch):
+    tracker = make_tracker(monkeypatch, HF_CIRCUIT_FAILURES=10)
+    tracker.record_success("a", 1.0)
+    tracker.record_success("b", 5.0)
+    tracker.record_failure("a", loading_for=60)
+    assert tracker.is_loading("a")
+    assert tracker.rank(["a", "b"]) == ["b", "a"]
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from rate_limit import MemoryRateLimitBackend, Quota, RateLimiter, SQLiteRateLimitBackend
+
+
+def test_quota_parsing():
+    assert str(Quota.parse("5/60")) == "5/60s"
+    assert Quota.parse("3").seconds == 60
+    assert Quota.parse("0") is None
+    assert Quota.parse("") is None
+
+
+def test_bucket_refills_over_time():
+    backend = MemoryRateLimitBackend()
+    bucket = [("generate:user:1", 2, 1.0)]
+    assert backend.take_now(bucket, 1, now=0) == (None, 0.0)
+    assert backend.take_now(bucket, 1, now=0) == (None, 0.0)
+    assert backend.take_now(bucket, 1, now=0.5) == (0, 0.5)
+    assert backend.take_now(bucket, 1, now=1) == (None, 0.0)
+
+
+def test_refill_stops_at_capacity():
+    backend = MemoryRateLimitBackend()
+    bucket = [("generate:user:1", 2, 1.0)]
+    backend.take_now(bucket, 2, now=0)
+    # An hour idle still only buys a full bucket
+    assert backend.take_now(bucket, 2, now=3600) == (None, 0.0)
+    assert backend.take_now(bucket, 1, now=3600)[0] == 0
+
+
+def test_short_bucket_spends_nothing():
+    backend = MemoryRateLimitBackend()
+    user, guild = ("imgen:user:1", 3, 0.05), ("imgen:guild:9", 1, 0.05)
+    assert backend.take_now([user, guild], 1, now=0) == (None, 0.0)
+    index, retry_after = backend.take_now([user, guild], 1, now=0)
+    assert index == 1 and retry_after == pytest.approx(20)
+    # The user's bucket was not charged for the rejected request
+    assert backend.buckets["imgen:user:1"][0] == 2
+
+
+def test_limiter_charges_the_cost(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_IMGEN_USER", "4/60")
+    monkeypatch.setenv("RATE_LIMIT_IMGEN_GUILD", "0")
+
+    async def scenario():
+        limiter = RateLimiter(MemoryRateLimitBackend())
+        first = await limiter.check("imgen", user_id=1, guild_id=9, cost=3)
+        second = await limiter.check("imgen", user_id=1, guild_id=9, cost=3)
+        # A batch larger than the bucket is capped to a full bucket rather than never fitting
+        other = await limiter.check("imgen", user_id=2, guild_id=9, cost=10)
+        return first, second, other
+
+    first, second, other = asyncio.run(scenario())
+    assert first and not second and other
+    assert second.scope == "user"
+
+
+def test_sqlite_buckets_are_shared(tmp_path):
+    path = str(tmp_path / "ratelimit.db")
+    bucket = [("chat:user:1", 2, 0.001)]
+
+    async def scenario():
+        # Two backends on one file act like two shard processes
+        first, second = SQLiteRateLimitBackend(path), SQLiteRateLimitBackend(path)
+        await first.start()
+        await second.start()
+        try:
+            return [await first.take(bucket), await second.take(bucket), (await first.take(bucket))[0]]
+        finally:
+            await first.close()
+            await second.close()
+
+    assert asyncio.run(scenario()) == [(None, 0.0), (None, 0.0), 0]
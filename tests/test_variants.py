@@ -0,0 +1,68 @@
+import asyncio
+import contextlib
+import io
+from types import SimpleNamespace
+
+from PIL import Image
+
+from job_queue import BACKEND_POLLINATIONS, GenerationQueue
+from variants import send_variants
+
+
+def png(color) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class Processor:
+    async def thumbnail(self, data):
+        return png("white")
+
+    async def grid(self, images):
+        return png("black")
+
+
+class Interaction:
+    id = 1
+    user = guild = channel = None
+
+    def __init__(self):
+        self.edits = []
+        self.edited = asyncio.Event()
+        self.followup = SimpleNamespace(send=self.send)
+
+    async def send(self, embed=None, **kwargs):
+        pass
+
+    async def edit_original_response(self, embed=None, attachments=None, **kwargs):
+        self.edits.append((embed.title, embed.thumbnail.url, [file.filename for file in attachments or []]))
+        self.edited.set()
+
+
+def test_first_variant_is_previewed(fake_bot, monkeypatch):
+    async def scenario():
+        bot = fake_bot
+        bot.generation_queue = GenerationQueue(bot)
+        bot.generation_queue.start()
+        bot.image_processor = Processor()
+        bot.discord_logger = None
+        bot.track_discord = lambda operation: contextlib.nullcontext()
+        interaction = Interaction()
+
+        async def submit(seed):
+            async def factory():
+                # The second variant finishes once the first one is on screen
+                if seed % 2:
+                    await interaction.edited.wait()
+                return png("red")
+            return await bot.generation_queue.submit(BACKEND_POLLINATIONS, factory)
+
+        await send_variants(bot, interaction, "imgen", BACKEND_POLLINATIONS, "cats", 2, submit)
+        await bot.generation_queue.stop()
+        return interaction.edits
+
+    preview, final = asyncio.run(scenario())
+    assert preview == ("🎨 Generating 2 Images...", "attachment://preview.png", ["preview.png"])
+    assert final[0] == "✨ Images Generated!"
+    assert final[2] == ["hinata_imgen_1_grid.png"]
@@ -0,0 +1,289 @@
+import asyncio
+import contextvars
+import json
+import os
+import random
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from log_sinks import JSONLSink, LogSink
+
+# Span of the work running in the current task, inherited by tasks it spawns
+current_span: contextvars.ContextVar = contextvars.ContextVar("trace_span", default=None)
+
+
+class Span:
+    """A timed step of a request; spans sharing a trace_id form one waterfall"""
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None, sampled: bool = True,
+                 start_ns: Optional[int] = None, attributes: Optional[Dict] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status = "ok"
+        self.attributes = dict(attributes or {})
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.end_ns is None:
+            return None
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class Tracer:
+    """Creates spans and hands finished ones to exporters"""
+
+    def __init__(self):
+        self.sample_rate = float(os.getenv('TRACE_SAMPLE_RATE', '1'))
+        self.exporters: List[LogSink] = []
+        self.spans_finished = 0
+
+    def start_span(self, name: str, root: bool = False, parent: Optional[Span] = None,
+                   start_ns: Optional[int] = None, **attributes) -> Span:
+        """Create a span under the current one (or a new trace when root is set) without activating it"""
+        if parent is None and not root:
+            parent = current_span.get()
+
+        if parent is None:
+            trace_id = f"{random.getrandbits(128):032x}"
+            sampled = random.random() < self.sample_rate
+            return Span(name, trace_id, None, sampled, start_ns, attributes)
+        return Span(name, parent.trace_id, parent.span_id, parent.sampled, start_ns, attributes)
+
+    def finish(self, span: Span, end_ns: Optional[int] = None):
+        """End a span and export it"""
+        if span.end_ns is not None:
+            return
+        span.end_ns = end_ns or time.time_ns()
+        self.spans_finished += 1
+
+        if not span.sampled:
+            return
+        for exporter in self.exporters:
+            try:
+                exporter.emit(span)
+            except Exception as e:
+                print(f"Error exporting span to {exporter.name}: {e}")
+
+    @contextmanager
+    def span(self, name: str, root: bool = False, parent: Optional[Span] = None, **attributes):
+        """Run a block as the current span; works across awaits within the same task"""
+        span = self.start_span(name, root, parent, **attributes)
+        token = current_span.set(span)
+        try:
+            yield span
+        except asyncio.CancelledError:
+            span.status = "cancelled"
+            raise
+        except BaseException as e:
+            span.status = "error"
+            span.set_attribute("error", type(e).__name__)
+            raise
+        finally:
+            current_span.reset(token)
+            self.finish(span)
+
+    def record(self, name: str, duration: float, parent: Optional[Span] = None, **attributes):
+        """Export a span for a step that already happened and took duration seconds"""
+        if parent is None:
+            return
+        end_ns = time.time_ns()
+        span = self.start_span(name, parent=parent, start_ns=end_ns - int(duration * 1e9), **attributes)
+        self.finish(span, end_ns)
+
+    def stats(self) -> dict:
+        return {
+            "finished": self.spans_finished,
+            "exporters": {exporter.name: exporter.stats() for exporter in self.exporters},
+        }
+
+
+class OTLPSpanExporter(LogSink):
+    """Ships spans in batches to a local OpenTelemetry collector over OTLP/HTTP JSON"""
+    name = "otlp"
+
+    def __init__(self, bot, endpoint: str):
+        self.bot = bot
+        self.endpoint = endpoint
+        self.service_name = os.getenv('TRACE_SERVICE_NAME', 'hinata-bot')
+        self.flush_interval = float(os.getenv('TRACE_FLUSH_INTERVAL', '2'))
+        self.max_buffer = int(os.getenv('TRACE_BUFFER_SIZE', '10000'))
+
+        self.buffer: List[Span] = []
+        self.flusher_task: Optional[asyncio.Task] = None
+
+        # Counters
+        self.spans_sent = 0
+        self.spans_dropped = 0
+
+    def start(self):
+        """Start the periodic flusher"""
+        if self.flusher_task is None:
+            self.flusher_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Ship anything still buffered"""
+        if self.flusher_task:
+            self.flusher_task.cancel()
+            try:
+                await self.flusher_task
+            except asyncio.CancelledError:
+                pass
+            self.flusher_task = None
+        await self.flush()
+
+    def emit(self, span: Span):
+        if len(self.buffer) >= self.max_buffer:
+            self.spans_dropped += 1
+            return
+        self.buffer.append(span)
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.spans_sent,
+            "dropped": self.spans_dropped,
+            "buffered": len(self.buffer),
+        }
+
+    async def flush(self):
+        if not self.buffer:
+            return
+        spans, self.buffer = self.buffer, []
+        try:
+            response = await self.bot.http_client.post(self.endpoint, json=self._payload(spans))
+            if response.status_code >= 300:
+                raise Exception(f"HTTP {response.status_code}")
+            self.spans_sent += len(spans)
+        except Exception as e:
+            self.spans_dropped += len(spans)
+            print(f"Error exporting spans: {e}")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def _payload(self, spans: List[Span]) -> dict:
+        def attribute(key, value):
+            if isinstance(value, bool):
+                return {"key": key, "value": {"boolValue": value}}
+            if isinstance(value, int):
+                return {"key": key, "value": {"intValue": str(value)}}
+            if isinstance(value, float):
+                return {"key": key, "value": {"doubleValue": value}}
+            return {"key": key, "value": {"stringValue": str(value)}}
+
+        status_codes = {"ok": 1, "error": 2, "cancelled": 2}
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [attribute("service.name", self.service_name)]},
+                "scopeSpans": [{
+                    "scope": {"name": "hinata"},
+                    "spans": [{
+                        "traceId": span.trace_id,
+                        "spanId": span.span_id,
+                        "parentSpanId": span.parent_id or "",
+                        "name": span.name,
+                        "kind": 1,
+                        "startTimeUnixNano": str(span.start_ns),
+                        "endTimeUnixNano": str(span.end_ns),
+                        "attributes": [attribute(key, value) for key, value in span.attributes.items()],
+                        "status": {"code": status_codes.get(span.status, 0)},
+                    } for span in spans],
+                }],
+            }],
+        }
+
+
+async def setup(bot):
+    """Attach span exporters configured through the environment"""
+    jsonl_path = os.getenv('TRACE_JSONL_PATH')
+    if jsonl_path:
+        bot.tracer.exporters.append(JSONLSink(jsonl_path))
+
+    otlp_endpoint = os.getenv('TRACE_OTLP_ENDPOINT')
+    if otlp_endpoint:
+        bot.tracer.exporters.append(OTLPSpanExporter(bot, otlp_endpoint))
+
+    for exporter in bot.tracer.exporters:
+        exporter.start()
+
+
+async def teardown(bot):
+    """Flush and detach span exporters"""
+    for exporter in bot.tracer.exporters:
+        try:
+            await exporter.stop()
+        except Exception as e:
+            print(f"Error stopping {exporter.name} span exporter: {e}")
+    bot.tracer.exporters = []
+
+
+def print_waterfall(path: str, trace_id: Optional[str] = None):
+    """Print one trace (default: the slowest) from a span JSONL file as a waterfall"""
+    spans = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                spans.append(json.loads(line))
+
+    traces: Dict[str, List[dict]] = {}
+    for span in spans:
+        traces.setdefault(span["trace_id"], []).append(span)
+    if not traces:
+        print("No spans found")
+        return
+
+    if trace_id is None:
+        def root_duration(trace):
+            return max([span["duration_ms"] or 0 for span in traces[trace] if not span["parent_id"]] or [0])
+        trace_id = max(traces, key=root_duration)
+
+    trace = sorted(traces[trace_id], key=lambda span: span["start_ns"])
+    children: Dict[Optional[str], List[dict]] = {}
+    for span in trace:
+        children.setdefault(span["parent_id"], []).append(span)
+    trace_start = trace[0]["start_ns"]
+    known_ids = {span["span_id"] for span in trace}
+
+    print(f"trace {trace_id}")
+
+    def walk(span, depth):
+        offset_ms = (span["start_ns"] - trace_start) / 1e6
+        label = "  " * depth + span["name"]
+        print(f"{offset_ms:10.1f}ms {span['duration_ms']:10.1f}ms  {label}  [{span['status']}]")
+        for child in children.get(span["span_id"], []):
+            walk(child, depth + 1)
+
+    for span in trace:
+        if span["parent_id"] not in known_ids:
+            walk(span, 0)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python tracing.py spans.jsonl [trace_id]")
+        sys.exit(1)
+    print_waterfall(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
@@ -0,0 +1,189 @@
+import asyncio
+import io
+import random
+import time
+from typing import Awaitable, Callable, List
+
+import discord
+
+from http_client import sniff_image_format
+from image_processing import DEFAULT_GRID_TILE_SIZE, make_grid
+from job_queue import GenerationJob, QueueFullError
+
+MAX_VARIANTS = 4
+
+# Originals stay in memory until the buttons expire; interaction tokens last 15 minutes
+VARIANT_VIEW_TIMEOUT = 600
+
+
+class VariantView(discord.ui.View):
+    """One button per grid tile that sends that variant at full size"""
+
+    def __init__(self, bot, interaction: discord.Interaction, images: List[bytes], filename_prefix: str):
+        super().__init__(timeout=VARIANT_VIEW_TIMEOUT)
+        self.bot = bot
+        self.interaction = interaction
+        self.images = images
+        self.filename_prefix = filename_prefix
+        for index in range(len(images)):
+            button = discord.ui.Button(label=f"Image {index + 1}", emoji="🖼️", style=discord.ButtonStyle.secondary)
+            button.callback = self._sender(index)
+            self.add_item(button)
+
+    def _sender(self, index: int):
+        async def send_original(interaction: discord.Interaction):
+            image_bytes = self.images[index]
+            filename = f"{self.filename_prefix}_{index + 1}.{sniff_image_format(image_bytes) or 'png'}"
+            # Ephemeral, so anyone can grab a variant without flooding the channel
+            with self.bot.track_discord("upload"):
+                await interaction.response.send_message(
+                    file=discord.File(io.BytesIO(image_bytes), filename=filename), ephemeral=True
+                )
+        return send_original
+
+    async def on_timeout(self):
+        # Free the originals and grey the buttons out
+        self.images = []
+        for item in self.children:
+            item.disabled = True
+        try:
+            await self.interaction.edit_original_response(view=self)
+        except discord.HTTPException:
+            pass
+
+
+async def compose_grid(bot, images: List[bytes]) -> bytes:
+    """Grid of images from the process pool, or a thread when post-processing is disabled"""
+    if bot.image_processor:
+        return await bot.image_processor.grid(images)
+    loop = asyncio.get_running_loop()
+    output, _ = await loop.run_in_executor(None, make_grid, images, DEFAULT_GRID_TILE_SIZE, "WEBP", 85)
+    return output
+
+
+async def preview_first_variant(bot, interaction: discord.Interaction, embed: discord.Embed,
+                                futures: List[asyncio.Future]):
+    """Show the first finished variant as a thumbnail on the loading message while the rest generate"""
+    for next_done in asyncio.as_completed(futures):
+        try:
+            image = await next_done
+        except Exception:
+            continue
+        if not image:
+            continue
+        if all(future.done() for future in futures):
+            return
+        thumbnail = await bot.image_processor.thumbnail(image)
+        if all(future.done() for future in futures):
+            return
+        filename = f"preview.{sniff_image_format(thumbnail) or 'webp'}"
+        embed.set_thumbnail(url=f"attachment://{filename}")
+        with bot.track_discord("edit"):
+            await interaction.edit_original_response(
+                embed=embed, attachments=[discord.File(io.BytesIO(thumbnail), filename=filename)]
+            )
+        return
+
+
+async def send_variants(bot, interaction: discord.Interaction, command_name: str, backend: str, prompt: str,
+                        count: int, submit: Callable[[int], Awaitable[GenerationJob]], details: str = ""):
+    """Generate `count` seeded variants of a prompt concurrently and reply with a single grid
+
+    submit(seed) queues one variant. Seeds are consecutive from a random base,
+    so every run gives fresh options while each variant is still reproducible
+    and cached on its own.
+    """
+    started = time.perf_counter()
+    base_seed = random.randrange(2 ** 31)
+    jobs = []
+    for index in range(count):
+        try:
+            jobs.append(await submit(base_seed + index))
+        except QueueFullError:
+            # Make do with the variants that got a place in the queue
+            break
+
+    if not jobs:
+        busy_embed = discord.Embed(
+            title="⏳ I'm Busy!",
+            description="Too many images are being generated right now. Please try again in a moment!",
+            color=0xFF6B6B
+        )
+        busy_embed.set_footer(text="©️ 2025 Hinata. All rights reserved")
+        await interaction.followup.send(embed=busy_embed)
+        return
+
+    loading_embed = discord.Embed(
+        title=f"🎨 Generating {len(jobs)} Images...",
+        description=f"**Prompt:** {prompt}\n{details}"
+                    f"**Queue Position:** {bot.generation_queue.position_label(jobs[0])}\n\n"
+                    "Please wait while I create your images...",
+        color=0xFFD700
+    )
+    loading_embed.set_footer(text="©️ 2025 Hinata. All rights reserved")
+
+    with bot.track_discord("followup"):
+        await interaction.followup.send(embed=loading_embed)
+
+    futures = [asyncio.ensure_future(job) for job in jobs]
+    preview = None
+    if bot.image_processor and len(futures) > 1:
+        preview = asyncio.create_task(preview_first_variant(bot, interaction, loading_embed, futures))
+
+    try:
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        if preview:
+            # The preview must not land after (and overwrite) the final reply
+            preview.cancel()
+            await asyncio.gather(preview, return_exceptions=True)
+        images = [result for result in results if isinstance(result, bytes) and result]
+        if not images:
+            raise Exception("Failed to generate images")
+
+        grid = await compose_grid(bot, images)
+        description = f"**Prompt:** {prompt}\n{details}"
+        if len(images) < len(jobs):
+            description += f"**Note:** {len(jobs) - len(images)} of {len(jobs)} variants failed\n"
+        success_embed = discord.Embed(
+            title="✨ Images Generated!",
+            description=description + "\nPick an image below to get it at full size.",
+            color=0x00FF00
+        )
+        filename = f"hinata_{command_name}_{interaction.id}_grid.{sniff_image_format(grid) or 'webp'}"
+        success_embed.set_image(url=f"attachment://{filename}")
+        success_embed.set_footer(text="©️ 2025 Hinata. All rights reserved")
+
+        view = VariantView(bot, interaction, images, f"hinata_{command_name}_{interaction.id}")
+        file = discord.File(io.BytesIO(grid), filename=filename)
+        with bot.track_discord("upload"):
+            await interaction.edit_original_response(embed=success_embed, attachments=[file], view=view)
+
+        cached = all(job.cached for job in jobs)
+        latency = time.perf_counter() - started
+        bot.metrics.generation_latency.observe(
+            latency, command=command_name, backend=backend, outcome="cached" if cached else "success"
+        )
+        if bot.discord_logger:
+            await bot.discord_logger.log_image_generation(
+                interaction.user, interaction.guild, interaction.channel, prompt, True,
+                latency=latency, backend=backend, cache_hit=cached, size_bytes=len(grid)
+            )
+
+    except Exception:
+        error_embed = discord.Embed(
+            title="❌ Generation Failed",
+            description=f"Sorry, I couldn't generate images for: **{prompt}**\n\n"
+                        "Please try again with a different prompt.",
+            color=0xFF0000
+        )
+        error_embed.set_footer(text="©️ 2025 Hinata. All rights reserved")
+
+        with bot.track_discord("edit"):
+            await interaction.edit_original_response(embed=error_embed, attachments=[])
+        latency = time.perf_counter() - started
+        bot.metrics.generation_latency.observe(latency, command=command_name, backend=backend, outcome="failure")
+        if bot.discord_logger:
+            await bot.discord_logger.log_image_generation(
+                interaction.user, interaction.guild, interaction.channel, prompt, False,
+                latency=latency, backend=backend
+            )